@@ -0,0 +1,176 @@
+"""
+Campos sob medida nas respostas da API: ?fields=, ?omit= e ?expand=.
+
+- ?fields=id,nome,preco  mostra só esses campos
+- ?omit=descricao        mostra todos menos esses
+- ?expand=categoria      troca o id da relação pelo objeto completo
+
+Os campos escolhidos também limitam o SELECT (only()), então um campo
+que não vai na resposta não é lido do banco.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def _lista(texto):
+    return {parte.strip() for parte in (texto or '').split(',') if parte.strip()}
+
+
+def caminhos_no_banco(serializer, prefixo=''):
+    """
+    Caminhos de campos do model (ex.: 'nome', 'categoria__nome') lidos
+    pelos campos do serializer, incluindo serializers aninhados.
+    SerializerMethodField (source='*') lê as colunas declaradas em
+    `campos_rapidos` do serializer.
+    """
+    caminhos = set()
+    lidos_por_metodos = getattr(serializer, 'campos_rapidos', {})
+    for nome, campo in serializer.fields.items():
+        if campo.source == '*':
+            # colunas que o get_<campo> usa, se o serializer declarar
+            caminhos.update(prefixo + caminho for caminho in lidos_por_metodos.get(nome, ()))
+            continue
+        caminho = prefixo + campo.source.replace('.', '__')
+        if isinstance(campo, serializers.BaseSerializer):
+            caminhos |= caminhos_no_banco(campo, caminho + '__')
+        else:
+            caminhos.add(caminho)
+    return caminhos
+
+
+def _existe_no_banco(model, caminho):
+    for parte in caminho.split('__'):
+        if model is None:
+            return False
+        try:
+            campo = model._meta.get_field(parte)
+        except FieldDoesNotExist:
+            return False
+        if not campo.concrete:
+            return False
+        model = campo.related_model
+    return True
+
+
+class CamposDinamicosSerializerMixin:
+    """
+    Serializer que respeita os campos pedidos na requisição (ver
+    CamposDinamicosViewMixin, que coloca 'campos', 'omitir' e 'expandir'
+    no contexto).
+
+    `expansoes` = {'campo': SerializerDoObjetoCompleto}
+    """
+    expansoes = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # só o serializer principal (ou o filho da lista) filtra; um
+        # serializer aninhado recebe o mesmo contexto, mas mostra tudo
+        pai = self.parent
+        if isinstance(pai, serializers.ListSerializer):
+            pai = pai.parent
+        if pai is not None:
+            return fields
+
+        for nome in self.context.get('expandir', ()):
+            if nome in self.expansoes:
+                fields[nome] = self.expansoes[nome](read_only=True)
+        campos = self.context.get('campos')
+        omitir = self.context.get('omitir', ())
+        for nome in list(fields):
+            if (campos is not None and nome not in campos) or nome in omitir:
+                del fields[nome]
+        return fields
+
+
+class CamposDinamicosViewMixin:
+    """
+    Mixin para ViewSets: lê ?fields=, ?omit= e ?expand= nas ações de
+    leitura, repassa ao serializer e restringe o SELECT aos campos usados.
+    """
+    acoes_campos_dinamicos = ('list', 'retrieve')
+
+    def campos_pedidos(self):
+        """
+        {'campos': set ou None, 'omitir': set, 'expandir': set}, ou None se
+        a requisição não escolheu campos.
+        """
+        if not hasattr(self, '_campos_pedidos'):
+            self._campos_pedidos = self._ler_campos_pedidos()
+        return self._campos_pedidos
+
+    def _ler_campos_pedidos(self):
+        if self.action not in self.acoes_campos_dinamicos:
+            return None
+        parametros = self.request.query_params
+        campos = _lista(parametros.get('fields'))
+        omitir = _lista(parametros.get('omit'))
+        expandir = _lista(parametros.get('expand'))
+        if not (campos or omitir or expandir):
+            return None
+
+        serializer_class = self.get_serializer_class()
+        disponiveis = set(serializer_class().fields)
+        expansiveis = set(getattr(serializer_class, 'expansoes', {}))
+        erros = {}
+        for parametro, nomes, validos in (
+            ('fields', campos, disponiveis),
+            ('omit', omitir, disponiveis),
+            ('expand', expandir, expansiveis),
+        ):
+            invalidos = sorted(nomes - validos)
+            if invalidos:
+                erros[parametro] = (
+                    f'Campos inválidos: {", ".join(invalidos)}. '
+                    f'Use: {", ".join(sorted(validos))}.'
+                )
+        if erros:
+            raise ValidationError(erros)
+        return {'campos': campos or None, 'omitir': omitir, 'expandir': expandir}
+
+    def campo_na_resposta(self, nome):
+        pedidos = self.campos_pedidos()
+        if pedidos is None:
+            return True
+        return (pedidos['campos'] is None or nome in pedidos['campos']) and nome not in pedidos['omitir']
+
+    def get_serializer_context(self):
+        contexto = super().get_serializer_context()
+        pedidos = self.campos_pedidos()
+        if pedidos is not None:
+            contexto.update(pedidos)
+        return contexto
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.acoes_campos_dinamicos:
+            queryset = self.aplicar_campos(queryset)
+        return queryset
+
+    def campos_sempre_lidos(self):
+        """
+        Campos lidos mesmo fora da resposta (ex.: os da ordenação, usados
+        no cursor da paginação).
+        """
+        return ()
+
+    def aplicar_campos(self, queryset):
+        """
+        Lê do banco só as colunas dos campos que vão na resposta, e só faz
+        JOIN com as relações usadas (ex.: categoria em categoria_nome ou em
+        ?expand=categoria).
+        """
+        if self.campos_pedidos() is None:
+            return queryset
+        caminhos = caminhos_no_banco(self.get_serializer()) | set(self.campos_sempre_lidos())
+        if not all(_existe_no_banco(queryset.model, caminho) for caminho in caminhos):
+            # algum campo vem de uma property: melhor não adiar nada
+            return queryset
+
+        relacoes = {caminho.split('__')[0] for caminho in caminhos if '__' in caminho}
+        queryset = queryset.select_related(None)
+        if relacoes:
+            queryset = queryset.select_related(*relacoes)
+        # defer(None) desfaz os defer() anteriores, que o only() manteria
+        return queryset.defer(None).only('pk', *caminhos)
@@ -0,0 +1,224 @@
+"""
+Compressão das respostas da API (gzip, e brotli/zstd se instalados).
+
+- Escolhe a codificação pelo Accept-Encoding (respeitando q=0) e, no
+  empate, prefere br > zstd > gzip.
+- Só comprime tipos de texto (JSON, NDJSON, CSV...) acima de
+  COMPRESSAO_TAMANHO_MINIMO bytes; imagens e arquivos já compactados passam
+  direto, assim como respostas que já têm Content-Encoding.
+- HTML não é comprimido: a página da API navegável leva o token CSRF e,
+  comprimida, fica exposta ao BREACH.
+- Respostas em streaming (ex.: /produtos/exportar/) são comprimidas pedaço
+  a pedaço, sem juntar o corpo inteiro.
+- Com COMPRESSAO_CACHE, o corpo comprimido das respostas que vêm do
+  cache do catálogo (cabeçalho X-Cache) fica num cache próprio, indexado
+  pelo resumo do conteúdo: a mesma resposta não é comprimida de novo a
+  cada acerto. Respostas de usuários logados nunca entram nele.
+"""
+import hashlib
+import re
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depende do ambiente
+    zstandard = None
+
+TAMANHO_MINIMO_PADRAO = 1024
+# acima disso o corpo comprimido não vai para o cache
+TAMANHO_MAXIMO_CACHE_PADRAO = 256 * 1024
+
+TIPOS_COMPRIMIVEIS = re.compile(
+    r'^(text/(?!html)|application/(json|x-ndjson|javascript|xml|problem\+json)|image/svg\+xml)'
+)
+# "Cache-Control: no-transform" proíbe alterar o corpo
+SEM_TRANSFORMACAO = re.compile(r'\bno-transform\b')
+
+
+class _Gzip:
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def pedaco(self, dados):
+        # Z_SYNC_FLUSH entrega ao cliente o que já foi comprimido
+        return self.compressor.compress(dados) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def fim(self):
+        return self.compressor.flush()
+
+
+class _Brotli:
+    def __init__(self):
+        # qualidade 5: bom equilíbrio para conteúdo gerado a cada requisição
+        self.compressor = brotli.Compressor(quality=5)
+
+    def pedaco(self, dados):
+        return self.compressor.process(dados) + self.compressor.flush()
+
+    def fim(self):
+        return self.compressor.finish()
+
+
+class _Zstd:
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def pedaco(self, dados):
+        return self.compressor.compress(dados) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def fim(self):
+        return self.compressor.flush()
+
+
+def codificacoes_disponiveis():
+    """
+    Codificações suportadas, na ordem de preferência do servidor.
+    """
+    disponiveis = {}
+    if brotli is not None:
+        disponiveis['br'] = _Brotli
+    if zstandard is not None:
+        disponiveis['zstd'] = _Zstd
+    disponiveis['gzip'] = _Gzip
+    return disponiveis
+
+
+def escolher_codificacao(accept_encoding, disponiveis):
+    """
+    A codificação disponível com maior q no Accept-Encoding (empate: a
+    ordem de `disponiveis`), ou None.
+    """
+    pesos = {}
+    for parte in accept_encoding.split(','):
+        nome, _, parametros = parte.strip().partition(';')
+        nome = nome.strip().lower()
+        peso = 1.0
+        encontrado = re.search(r'q\s*=\s*([0-9.]+)', parametros)
+        if encontrado:
+            try:
+                peso = float(encontrado.group(1))
+            except ValueError:
+                peso = 0.0
+        if nome:
+            pesos[nome] = peso
+
+    melhor, melhor_peso = None, 0.0
+    for nome in disponiveis:
+        peso = pesos.get(nome, pesos.get('*', 0.0))
+        if peso > melhor_peso:
+            melhor, melhor_peso = nome, peso
+    return melhor
+
+
+def comprimir(classe, conteudo):
+    compressor = classe()
+    return compressor.pedaco(conteudo) + compressor.fim()
+
+
+def comprimir_streaming(classe, pedacos):
+    compressor = classe()
+    for pedaco in pedacos:
+        dados = compressor.pedaco(pedaco)
+        if dados:
+            yield dados
+    yield compressor.fim()
+
+
+async def comprimir_streaming_async(classe, pedacos):
+    compressor = classe()
+    async for pedaco in pedacos:
+        dados = compressor.pedaco(pedaco)
+        if dados:
+            yield dados
+    yield compressor.fim()
+
+
+class CompressaoMiddleware:
+    """
+    Comprime as respostas conforme o Accept-Encoding do cliente.
+
+    Configuração (settings):
+    - COMPRESSAO_TAMANHO_MINIMO: bytes a partir dos quais comprime (1024)
+    - COMPRESSAO_CACHE: alias do cache para os corpos comprimidos (None
+      desliga)
+    - COMPRESSAO_CACHE_TAMANHO_MAXIMO: maior corpo guardado no cache (256 KiB)
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.tamanho_minimo = getattr(settings, 'COMPRESSAO_TAMANHO_MINIMO', TAMANHO_MINIMO_PADRAO)
+        self.alias_cache = getattr(settings, 'COMPRESSAO_CACHE', None)
+        self.tamanho_maximo_cache = getattr(
+            settings, 'COMPRESSAO_CACHE_TAMANHO_MAXIMO', TAMANHO_MAXIMO_CACHE_PADRAO
+        )
+        self.disponiveis = codificacoes_disponiveis()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.processar(request, response)
+
+    def processar(self, request, response):
+        if not self.comprimivel(response):
+            return response
+
+        # o corpo muda conforme o Accept-Encoding, mesmo quando não comprime
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codificacao = escolher_codificacao(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.disponiveis)
+        if codificacao is None:
+            return response
+        classe = self.disponiveis[codificacao]
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = comprimir_streaming_async(classe, response.streaming_content)
+            else:
+                response.streaming_content = comprimir_streaming(classe, response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < self.tamanho_minimo:
+                return response
+            comprimido = self.comprimir_com_cache(codificacao, classe, response)
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response.headers['Content-Length'] = str(len(comprimido))
+
+        # o corpo não é mais byte a byte o mesmo: a ETag passa a ser fraca
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codificacao
+        return response
+
+    def comprimivel(self, response):
+        # 206: o Content-Range se refere ao corpo sem compressão
+        if response.has_header('Content-Encoding') or response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if SEM_TRANSFORMACAO.search(response.get('Cache-Control', '')):
+            return False
+        return bool(TIPOS_COMPRIMIVEIS.match(response.get('Content-Type', '')))
+
+    def comprimir_com_cache(self, codificacao, classe, response):
+        conteudo = response.content
+        # só o que já está no cache do catálogo (igual para todos os
+        # anônimos) se repete; o resto encheria o cache à toa
+        do_catalogo = response.status_code == 200 and response.has_header('X-Cache')
+        if not (self.alias_cache and do_catalogo) or len(conteudo) > self.tamanho_maximo_cache:
+            return comprimir(classe, conteudo)
+
+        cache = caches[self.alias_cache]
+        chave = f'compressao:{codificacao}:{hashlib.sha1(conteudo).hexdigest()}'
+        comprimido = cache.get(chave)
+        if comprimido is None:
+            comprimido = comprimir(classe, conteudo)
+            cache.set(chave, comprimido)
+        return comprimido
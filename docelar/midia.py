@@ -0,0 +1,176 @@
+"""
+Entrega dos arquivos de MEDIA_ROOT (imagens dos produtos) em produção.
+
+- O caminho pedido é validado para não sair de MEDIA_ROOT.
+- Com MIDIA_ENVIO = 'x-accel-redirect' (nginx) ou 'x-sendfile' (Apache,
+  lighttpd), o Django só confere o arquivo e o servidor web envia o
+  conteúdo (inclusive os Range).
+- Sem isso, responde com FileResponse, aceitando Range (um intervalo),
+  If-Range, If-Modified-Since e If-None-Match.
+- Arquivos com nome pelo hash do conteúdo (produtos/armazenamento.py) nunca
+  mudam: vão com Cache-Control "immutable" de um ano.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# produtos/ab/ab12...ef.jpg
+NOME_POR_CONTEUDO = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}\.[a-z0-9]+$')
+FAIXA = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+MAX_AGE_PADRAO = 3600
+TAMANHO_PEDACO = 64 * 1024
+
+
+def caminho_seguro(caminho):
+    """
+    Caminho absoluto de `caminho` dentro de MEDIA_ROOT, ou Http404.
+    """
+    caminho = posixpath.normpath(caminho).lstrip('/')
+    try:
+        completo = safe_join(settings.MEDIA_ROOT, caminho)
+    except SuspiciousFileOperation:
+        raise Http404('Arquivo não encontrado.')
+    # pastas, arquivos ocultos e uploads ainda em andamento não são servidos
+    if not os.path.isfile(completo) or os.path.basename(completo).startswith('.') or completo.endswith('.upload'):
+        raise Http404('Arquivo não encontrado.')
+    return caminho, completo
+
+
+def etag_do_arquivo(caminho, estado):
+    if NOME_POR_CONTEUDO.search(caminho):
+        # o próprio nome é o hash do conteúdo
+        return '"%s"' % os.path.splitext(os.path.basename(caminho))[0]
+    return 'W/"%x-%x"' % (int(estado.st_mtime), estado.st_size)
+
+
+def faixa_pedida(cabecalho, tamanho):
+    """
+    (inicio, fim) do Range "bytes=..." (fim incluso), None para enviar o
+    arquivo inteiro (sem Range, vários intervalos ou formato desconhecido)
+    ou False se o intervalo está fora do arquivo.
+    """
+    encontrado = FAIXA.match(cabecalho.replace(' ', ''))
+    if not encontrado:
+        return None
+    inicio, fim = encontrado.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        # bytes=-500: os últimos 500 bytes
+        quantidade = int(fim)
+        if quantidade == 0 or tamanho == 0:
+            return False
+        return max(tamanho - quantidade, 0), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return False
+    return inicio, fim
+
+
+def _ler_faixa(arquivo, inicio, quantidade):
+    with arquivo:
+        arquivo.seek(inicio)
+        while quantidade > 0:
+            pedaco = arquivo.read(min(TAMANHO_PEDACO, quantidade))
+            if not pedaco:
+                break
+            quantidade -= len(pedaco)
+            yield pedaco
+
+
+def _cabecalhos(response, caminho, estado, etag):
+    response.headers['Last-Modified'] = http_date(estado.st_mtime)
+    response.headers['ETag'] = etag
+    if NOME_POR_CONTEUDO.search(caminho):
+        response.headers['Cache-Control'] = CACHE_IMUTAVEL
+    else:
+        max_age = getattr(settings, 'MIDIA_MAX_AGE', MAX_AGE_PADRAO)
+        response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response
+
+
+def _nao_modificado(request, estado, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        # comparação fraca: W/"x" e "x" valem igual
+        pedidas = {valor.strip().removeprefix('W/') for valor in if_none_match.split(',')}
+        return '*' in pedidas or etag.removeprefix('W/') in pedidas
+    desde = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return desde is not None and int(estado.st_mtime) <= desde
+
+
+def _if_range_vale(request, estado, etag):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        # If-Range só aceita ETag forte
+        return not etag.startswith('W/') and if_range == etag
+    data = parse_http_date_safe(if_range)
+    return data is not None and int(estado.st_mtime) <= data
+
+
+@require_safe
+def servir_midia(request, caminho):
+    """
+    GET/HEAD de um arquivo de MEDIA_ROOT (ver a docstring do módulo).
+    """
+    caminho, completo = caminho_seguro(caminho)
+    estado = os.stat(completo)
+    etag = etag_do_arquivo(caminho, estado)
+    if _nao_modificado(request, estado, etag):
+        return _cabecalhos(HttpResponseNotModified(), caminho, estado, etag)
+
+    content_type, codificacao = mimetypes.guess_type(completo)
+    content_type = content_type or 'application/octet-stream'
+
+    envio = getattr(settings, 'MIDIA_ENVIO', None)
+    if envio:
+        response = HttpResponse(content_type=content_type)
+        if envio == 'x-accel-redirect':
+            # location "internal" do nginx apontando para MEDIA_ROOT
+            prefixo = getattr(settings, 'MIDIA_PREFIXO_INTERNO', '/_media/')
+            response.headers['X-Accel-Redirect'] = prefixo.rstrip('/') + '/' + caminho
+        elif envio == 'x-sendfile':
+            response.headers['X-Sendfile'] = completo
+        else:
+            raise ImproperlyConfigured("MIDIA_ENVIO deve ser 'x-accel-redirect' ou 'x-sendfile'.")
+        return _cabecalhos(response, caminho, estado, etag)
+
+    faixa = None
+    if 'HTTP_RANGE' in request.META and _if_range_vale(request, estado, etag):
+        faixa = faixa_pedida(request.META['HTTP_RANGE'], estado.st_size)
+    if faixa is False:
+        response = HttpResponse(status=416)
+        response.headers['Content-Range'] = f'bytes */{estado.st_size}'
+        return response
+
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response.headers['Content-Length'] = str(estado.st_size)
+    elif faixa is None:
+        response = FileResponse(open(completo, 'rb'), content_type=content_type)
+    else:
+        inicio, fim = faixa
+        response = StreamingHttpResponse(
+            _ler_faixa(open(completo, 'rb'), inicio, fim - inicio + 1), status=206, content_type=content_type
+        )
+        response.headers['Content-Range'] = f'bytes {inicio}-{fim}/{estado.st_size}'
+        response.headers['Content-Length'] = str(fim - inicio + 1)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if codificacao:
+        response.headers['Content-Encoding'] = codificacao
+    return _cabecalhos(response, caminho, estado, etag)
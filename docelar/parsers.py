@@ -0,0 +1,32 @@
+"""
+JSONParser que usa o orjson quando está instalado (ver renderers.py).
+"""
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from .renderers import JSONRapidoRenderer, orjson
+
+
+class JSONRapidoParser(JSONParser):
+    """
+    Lê o corpo com orjson.loads; se ele recusar, tenta o JSONParser padrão.
+    """
+    renderer_class = JSONRapidoRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        # o orjson só lê UTF-8 e não tem o modo não estrito (NaN, Infinity)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8') or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        conteudo = stream.read()
+        try:
+            return orjson.loads(conteudo)
+        except orjson.JSONDecodeError:
+            pass
+        # o json da biblioteca padrão aceita o que o orjson recusa (ex.:
+        # inteiros enormes) e gera a mensagem de erro de sempre
+        return super().parse(io.BytesIO(conteudo), media_type, parser_context)
@@ -0,0 +1,80 @@
+"""
+JSONRenderer mais rápido: usa o orjson quando está instalado e cai no
+JSONRenderer do DRF (json da biblioteca padrão) quando não está.
+
+A saída é a mesma do renderer padrão: JSON compacto, UTF-8 sem escapes,
+\\u2028/\\u2029 escapados e datas/Decimal convertidos pelo mesmo
+JSONEncoder do DRF. Pedidos com indentação (ex.: API navegável) e
+configurações que o orjson não reproduz vão para o renderer padrão, assim
+como os dados com floats que ele escreveria diferente: NaN/Infinity (o
+orjson grava null; o padrão recusa com STRICT_JSON ou grava NaN) e os que
+o json escreve com expoente (1e-05, 1e+16; o orjson grava 0.00001, 1e16).
+"""
+import datetime
+import uuid
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
+
+# datetime/date/time passam pelo JSONEncoder do DRF (o orjson formataria
+# diferente); chaves não-texto viram texto, como no json.dumps
+OPCOES_ORJSON = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+)
+# nessa faixa (e o zero) o json e o orjson escrevem o float igual
+MENOR_FLOAT_IGUAL = 1e-4
+MAIOR_FLOAT_IGUAL = 1e16
+# tipos que não são float nem guardam outros valores
+TIPOS_SEM_FLOAT = frozenset({
+    str, int, bool, type(None), Decimal, datetime.datetime, datetime.date, datetime.time, uuid.UUID,
+})
+
+
+def floats_iguais(dados):
+    """
+    False se algum float dos dados sairia diferente no orjson.
+    """
+    pendentes = [[dados]]
+    while pendentes:
+        atual = pendentes.pop()
+        valores = atual.values() if isinstance(atual, dict) else atual
+        # roda em toda resposta: o caso comum (só texto, números inteiros,
+        # datas...) é resolvido sem laço em Python
+        if set(map(type, valores)) <= TIPOS_SEM_FLOAT:
+            continue
+        for valor in valores:
+            if isinstance(valor, float):
+                # NaN não passa em nenhuma comparação
+                if valor and not MENOR_FLOAT_IGUAL <= abs(valor) < MAIOR_FLOAT_IGUAL:
+                    return False
+            elif isinstance(valor, (dict, list, tuple)):
+                pendentes.append(valor)
+    return True
+
+
+class JSONRapidoRenderer(JSONRenderer):
+    """
+    Mesmo JSON do JSONRenderer, gerado pelo orjson quando possível.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact or self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ) is not None or not floats_iguais(data):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=OPCOES_ORJSON)
+        except (TypeError, orjson.JSONEncodeError):
+            # ex.: inteiros maiores que 64 bits, que o json aceita
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # mesmo escape do JSONRenderer, para continuar um subconjunto de JavaScript
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
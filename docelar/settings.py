@@ -70,6 +70,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ),
+    # JSON com orjson quando instalado (mesma saída do JSONRenderer padrão)
+    'DEFAULT_RENDERER_CLASSES': (
+        'docelar.renderers.JSONRapidoRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'docelar.parsers.JSONRapidoParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 # 5 pontos - logout via API (mudar BlacklistAfterRotation para True)
 SIMPLE_JWT = {
@@ -101,6 +111,8 @@ SIMPLE_JWT = {
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware', # <--- ADICIONE ESTA LINHA AQUI
+    # gzip/brotli/zstd nas respostas (ver docelar/middleware.py)
+    'docelar.middleware.CompressaoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -170,6 +182,67 @@ DATABASES = {
 }
 
 
+# Cache
+# 'catalogo' guarda as respostas anônimas de /produtos/ e /categorias/
+# (ver produtos/cache.py). TIMEOUT é o TTL em segundos e MAX_ENTRIES limita
+# o número de respostas guardadas, para a memória ficar previsível.
+# Em produção, com vários processos, use um backend compartilhado
+# (Redis/Memcached) para a invalidação valer para todos.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalogo': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalogo',
+        'TIMEOUT': int(os.environ.get('CATALOGO_CACHE_TTL', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CATALOGO_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+    # corpos comprimidos (docelar/middleware.py); no máximo
+    # MAX_ENTRIES × COMPRESSAO_CACHE_TAMANHO_MAXIMO bytes (25 MiB)
+    'compressao': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'compressao',
+        'TIMEOUT': int(os.environ.get('CATALOGO_CACHE_TTL', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('COMPRESSAO_CACHE_MAX_ENTRIES', 100)),
+        },
+    },
+}
+
+# Compressão das respostas (docelar/middleware.py): só acima deste tamanho,
+# e os corpos comprimidos das respostas do cache do catálogo ficam no cache
+# 'compressao' (vazio desliga)
+COMPRESSAO_TAMANHO_MINIMO = int(os.environ.get('COMPRESSAO_TAMANHO_MINIMO', 1024))
+COMPRESSAO_CACHE = os.environ.get('COMPRESSAO_CACHE', 'compressao') or None
+COMPRESSAO_CACHE_TAMANHO_MAXIMO = 256 * 1024
+
+# Arquivos de mídia (docelar/midia.py). Atrás do nginx, use
+# MIDIA_ENVIO=x-accel-redirect e uma location "internal" em
+# MIDIA_PREFIXO_INTERNO apontando para MEDIA_ROOT; no Apache/lighttpd,
+# MIDIA_ENVIO=x-sendfile. Vazio: o Django envia o arquivo.
+MIDIA_ENVIO = os.environ.get('MIDIA_ENVIO') or None
+MIDIA_PREFIXO_INTERNO = os.environ.get('MIDIA_PREFIXO_INTERNO', '/_media/')
+# Cache-Control dos arquivos sem hash no nome (segundos)
+MIDIA_MAX_AGE = int(os.environ.get('MIDIA_MAX_AGE', 3600))
+
+# Limites das faixas de preço em GET /produtos/facetas/ (R$)
+PRODUTOS_FAIXAS_PRECO = [0, 100, 500, 1000, 5000]
+
+# GET /produtos/em-alta/: em quantas horas um favorito passa a valer metade
+# (ver produtos/tendencias.py e o comando calcular_tendencias)
+PRODUTOS_TENDENCIA_MEIA_VIDA = int(os.environ.get('PRODUTOS_TENDENCIA_MEIA_VIDA', 72))
+# Eventos de favorito (e edições de produto, em conteudo.py) mais novos que
+# isso (segundos) ficam para a próxima execução: no PostgreSQL um evento de
+# id menor ainda pode estar numa transação aberta. Precisa ser maior que a
+# transação mais longa que grava favoritos ou produtos (e que a diferença de
+# relógio entre os servidores).
+PRODUTOS_EVENTOS_MARGEM = int(os.environ.get('PRODUTOS_EVENTOS_MARGEM', 60))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
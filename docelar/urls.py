@@ -14,10 +14,13 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from .midia import servir_midia
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -30,5 +33,9 @@ urlpatterns = [
 
 # 10 pontos - upload de imagens
 # Isso permite acessar http://localhost:8000/media/nome_da_foto.jpg
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# (também em produção, ver docelar/midia.py; com MEDIA_URL em outro
+# domínio/CDN, quem serve é ele)
+if not re.match(r'^(https?:)?//', settings.MEDIA_URL):
+    urlpatterns += [
+        re_path(r'^%s(?P<caminho>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), servir_midia, name='midia'),
+    ]
@@ -1,5 +1,17 @@
 from django.contrib import admin
 from .models import Produto, Categoria
 # Register your models here.
-admin.site.register(Produto)
-admin.site.register(Categoria)
\ No newline at end of file
+
+
+@admin.register(Produto)
+class ProdutoAdmin(admin.ModelAdmin):
+    list_display = ['nome', 'marca', 'preco', 'categoria', 'ativo']
+    list_filter = ['ativo', 'categoria']
+    search_fields = ['nome', 'marca']
+
+    def get_queryset(self, request):
+        # mesma consulta da API: categoria vem junto no SELECT da listagem
+        return super().get_queryset(request).para_listagem()
+
+
+admin.site.register(Categoria)
@@ -1,6 +1,27 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def garantir_indice_busca(sender, using, **kwargs):
+    """
+    Recria os triggers da busca textual caso alguma migration tenha
+    reconstruído a tabela 'produtos' (o SQLite apaga os triggers junto).
+    """
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+    from .busca import criar_indice
+
+    connection = connections[using]
+    aplicadas = MigrationRecorder(connection).applied_migrations()
+    if ('produtos', '0002_busca_textual') in aplicadas:
+        criar_indice(connection)
 
 
 class ProdutosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'produtos'
+
+    def ready(self):
+        from . import signals  # noqa: F401 (registra os receivers)
+
+        post_migrate.connect(garantir_indice_busca, sender=self)
@@ -0,0 +1,93 @@
+"""
+Armazenamento das imagens de produto pelo conteúdo (SHA-256).
+
+Cada arquivo é gravado como <pasta>/<2 primeiros do hash>/<hash>.<ext>,
+então a mesma foto enviada para vários produtos vira um único arquivo e
+os nomes nunca colidem. O hash é calculado enquanto o upload é copiado
+para um arquivo temporário, em pedaços, sem ler o arquivo inteiro para a
+memória.
+
+Como um arquivo pode ser de vários produtos, nada é apagado quando a
+imagem muda: o comando limpar_midia remove os que ninguém usa mais.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def nome_por_conteudo(nome, resumo):
+    """
+    'produtos/foto.JPG' + resumo -> 'produtos/ab/ab12...ef.jpg'
+
+    Nomes derivados de um arquivo já gravado (ex.: as variantes,
+    'produtos/ab/ab12...ef_thumb.webp') voltam para a pasta de cima.
+    """
+    pasta, arquivo = os.path.split(nome)
+    subpasta = os.path.basename(pasta)
+    if len(subpasta) == 2 and arquivo.startswith(subpasta):
+        pasta = os.path.dirname(pasta)
+    extensao = os.path.splitext(nome)[1].lower()
+    return os.path.join(pasta, resumo[:2], resumo + extensao).replace('\\', '/')
+
+
+@deconstructible
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """
+    FileSystemStorage que ignora o nome enviado e grava pelo hash do
+    conteúdo. Se o arquivo já existe, só devolve o nome dele.
+    """
+
+    def _save(self, name, content):
+        pasta = self.path(os.path.dirname(name))
+        os.makedirs(pasta, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(pasta, self.directory_permissions_mode)
+
+        # copia para um temporário na mesma pasta (o os.replace no final
+        # não muda de disco) calculando o hash no caminho
+        resumo = hashlib.sha256()
+        descritor, temporario = tempfile.mkstemp(dir=pasta, suffix='.upload')
+        try:
+            with os.fdopen(descritor, 'wb') as destino:
+                for pedaco in content.chunks():
+                    resumo.update(pedaco)
+                    destino.write(pedaco)
+
+            nome = nome_por_conteudo(name, resumo.hexdigest())
+            caminho = self.path(nome)
+            if os.path.exists(caminho):
+                os.remove(temporario)
+                # renova a data: o limpar_midia não apaga arquivos recentes,
+                # mesmo que o produto novo ainda não esteja no banco
+                os.utime(caminho)
+                return nome
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporario, self.file_permissions_mode)
+            # atômico: dois uploads iguais ao mesmo tempo gravam o mesmo conteúdo
+            os.replace(temporario, caminho)
+            return nome
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def get_available_name(self, name, max_length=None):
+        # o nome final sai do hash; não precisa de sufixo para não colidir
+        return name
+
+    def arquivos(self, pasta=''):
+        """
+        Todos os arquivos abaixo de `pasta` (nomes relativos ao storage).
+        """
+        try:
+            diretorios, arquivos = self.listdir(pasta)
+        except FileNotFoundError:
+            return
+        for arquivo in arquivos:
+            yield f'{pasta}/{arquivo}' if pasta else arquivo
+        for diretorio in diretorios:
+            yield from self.arquivos(f'{pasta}/{diretorio}' if pasta else diretorio)
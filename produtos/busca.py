@@ -0,0 +1,206 @@
+"""
+Busca textual de produtos (nome, marca e descrição).
+
+No SQLite usamos uma tabela virtual FTS5 ligada à tabela 'produtos'
+(external content) e mantida por triggers. No PostgreSQL usamos um índice
+GIN sobre o to_tsvector dos mesmos campos, e outro só do nome normalizado
+para o filtro ?nome= (buscar_no_nome).
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+
+from .normalizacao import normalizar
+
+TABELA = 'produtos'
+TABELA_FTS = 'produtos_fts'
+INDICE_POSTGRES = 'produtos_busca_gin'
+INDICE_NOME_POSTGRES = 'produtos_nome_gin'
+
+# Pesos do bm25 para (nome, marca, descricao): nome pesa mais que descrição
+PESOS_BM25 = (10.0, 5.0, 1.0)
+
+SQLITE_TABELA = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5(
+        nome, marca, descricao,
+        content='{TABELA}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}(rowid, nome, marca, descricao)
+        VALUES (new.id, new.nome, new.marca, new.descricao);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, nome, marca, descricao)
+        VALUES ('delete', old.id, old.nome, old.marca, old.descricao);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF nome, marca, descricao ON {TABELA} BEGIN
+        INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, nome, marca, descricao)
+        VALUES ('delete', old.id, old.nome, old.marca, old.descricao);
+        INSERT INTO {TABELA_FTS}(rowid, nome, marca, descricao)
+        VALUES (new.id, new.nome, new.marca, new.descricao);
+    END
+    """,
+]
+
+
+def documento_postgres(tabela=''):
+    """
+    Expressão to_tsvector indexada no PostgreSQL. Nas consultas as colunas
+    vão qualificadas com a tabela (a categoria também tem 'descricao').
+    """
+    prefixo = f'{tabela}.' if tabela else ''
+    return (
+        f"to_tsvector('portuguese', coalesce({prefixo}nome, '') || ' ' || "
+        f"coalesce({prefixo}marca, '') || ' ' || coalesce({prefixo}descricao, ''))"
+    )
+
+
+def documento_nome_postgres(tabela=''):
+    """
+    Palavras do nome normalizado (já sem acento e minúsculo), sem stemming
+    ('simple'): o mesmo que a coluna nome do FTS5 no SQLite.
+    """
+    prefixo = f'{tabela}.' if tabela else ''
+    return f"to_tsvector('simple', {prefixo}nome_normalizado)"
+
+
+def termos(texto):
+    """
+    Quebra o texto digitado em palavras, descartando qualquer caractere
+    que tenha significado especial na sintaxe do FTS5 ou do tsquery.
+    """
+    return re.findall(r'\w+', texto or '')
+
+
+def criar_indice(connection):
+    """
+    Cria (se não existir) o índice de busca textual e o popula com os
+    produtos já cadastrados.
+
+    Pode ser chamada mais de uma vez: no SQLite, quando uma migration
+    recria a tabela 'produtos' os triggers somem junto, então eles são
+    recriados aqui e o índice é reconstruído.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{TABELA_FTS}_%'],
+            )
+            if cursor.fetchone()[0] == len(SQLITE_TRIGGERS):
+                return
+            cursor.execute(SQLITE_TABELA)
+            for sql in SQLITE_TRIGGERS:
+                cursor.execute(sql)
+            # reconstrói o índice a partir do conteúdo atual da tabela
+            cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {INDICE_POSTGRES} '
+                f'ON {TABELA} USING GIN ({documento_postgres()})'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {INDICE_NOME_POSTGRES} '
+                f'ON {TABELA} USING GIN ({documento_nome_postgres()})'
+            )
+
+
+def remover_indice(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TABELA_FTS}_{sufixo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABELA_FTS}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {INDICE_POSTGRES}')
+            cursor.execute(f'DROP INDEX IF EXISTS {INDICE_NOME_POSTGRES}')
+
+
+def buscar(queryset, texto):
+    """
+    Filtra o queryset de produtos pelos termos de busca e anota a
+    'relevancia' de cada resultado (quanto menor, mais relevante).
+
+    Cada termo é buscado como prefixo ("note" encontra "notebook") e todos
+    os termos precisam aparecer em nome, marca ou descrição.
+    """
+    palavras = termos(texto)
+    if not palavras:
+        return queryset.none()
+
+    connection = connections[queryset.db]
+    tabela = connection.ops.quote_name(TABELA)
+
+    if connection.vendor == 'sqlite':
+        consulta = ' '.join(f'"{palavra}"*' for palavra in palavras)
+        pesos = ', '.join(str(peso) for peso in PESOS_BM25)
+        encontrados = RawSQL(f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s', (consulta,))
+        # bm25() já é negativo: quanto menor, mais relevante
+        relevancia = RawSQL(
+            f'SELECT bm25({TABELA_FTS}, {pesos}) FROM {TABELA_FTS} '
+            f'WHERE {TABELA_FTS} MATCH %s AND rowid = {tabela}.id',
+            (consulta,),
+        )
+        queryset = queryset.filter(id__in=encontrados)
+    elif connection.vendor == 'postgresql':
+        consulta = ' & '.join(f'{palavra}:*' for palavra in palavras)
+        documento = documento_postgres(tabela)
+        tsquery = "to_tsquery('portuguese', %s)"
+        queryset = queryset.filter(
+            RawSQL(f'{documento} @@ {tsquery}', (consulta,), output_field=BooleanField())
+        )
+        relevancia = RawSQL(f'-ts_rank({documento}, {tsquery})', (consulta,))
+    else:
+        # Outros bancos: sem índice textual, cai no LIKE em cada campo
+        for palavra in palavras:
+            queryset = queryset.filter(
+                Q(nome__icontains=palavra) | Q(marca__icontains=palavra) | Q(descricao__icontains=palavra)
+            )
+        return queryset
+
+    return queryset.annotate(relevancia=relevancia).order_by('relevancia', 'nome', 'id')
+
+
+def buscar_no_nome(queryset, texto):
+    """
+    Filtro ?nome=: cada palavra é buscada como prefixo de uma palavra do
+    nome ("note" encontra "Notebook", "book" não), sem diferenciar acentos
+    e maiúsculas.
+
+    A mesma regra em todos os bancos: no SQLite pela coluna nome do FTS5,
+    no PostgreSQL pelo índice GIN de documento_nome_postgres (um LIKE
+    '%...%' não usaria índice nenhum). Nos outros, sem índice, uma
+    expressão regular no nome_normalizado.
+    """
+    palavras = termos(texto)
+    if not palavras:
+        return queryset.none()
+
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        consulta = 'nome : ({})'.format(' '.join(f'"{palavra}"*' for palavra in palavras))
+        encontrados = RawSQL(f'SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s', (consulta,))
+        return queryset.filter(id__in=encontrados)
+    # fora do FTS5, as palavras comparadas com o nome normalizado
+    palavras = termos(normalizar(texto))
+    if connection.vendor == 'postgresql':
+        consulta = ' & '.join(f'{palavra}:*' for palavra in palavras)
+        documento = documento_nome_postgres(connection.ops.quote_name(TABELA))
+        return queryset.filter(
+            RawSQL(f"{documento} @@ to_tsquery('simple', %s)", (consulta,), output_field=BooleanField())
+        )
+    for palavra in palavras:
+        # começo do nome ou depois de um caractere que não é letra/número
+        queryset = queryset.filter(nome_normalizado__regex=rf'(^|[^a-z0-9]){palavra}')
+    return queryset
@@ -0,0 +1,140 @@
+"""
+Cache das leituras anônimas do catálogo (produtos e categorias).
+
+As chaves levam a "versão do catálogo", um contador incrementado a cada
+alteração em Produto ou Categoria (ver signals.py). Ao mudar a versão,
+todas as respostas antigas deixam de ser encontradas e expiram sozinhas
+pelo TTL, sem precisar apagar chave por chave.
+
+Configuração em settings.CACHES['catalogo'] (TIMEOUT = TTL em segundos,
+OPTIONS.MAX_ENTRIES = tamanho máximo).
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from rest_framework.response import Response
+
+ALIAS = 'catalogo'
+CHAVE_VERSAO = 'catalogo:versao'
+CHAVE_ACERTOS = 'catalogo:acertos'
+CHAVE_FALHAS = 'catalogo:falhas'
+
+
+def cache_catalogo():
+    return caches[ALIAS]
+
+
+def versao_catalogo():
+    """
+    Versão atual do catálogo. Se a chave sumiu (expulsa pelo limite de
+    tamanho), recomeça a partir do relógio, que é sempre maior do que
+    qualquer versão anterior: assim nunca volta a servir respostas velhas.
+    """
+    cache = cache_catalogo()
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, time.time_ns(), None)
+        versao = cache.get(CHAVE_VERSAO)
+    return versao
+
+
+def invalidar_catalogo(**kwargs):
+    """
+    Incrementa a versão do catálogo. Aceita **kwargs para poder ser
+    ligada direto nos signals do Django.
+    """
+    cache = cache_catalogo()
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, time.time_ns(), None)
+
+
+def _contar(chave):
+    cache = cache_catalogo()
+    cache.add(chave, 0, None)
+    try:
+        cache.incr(chave)
+    except ValueError:
+        cache.set(chave, 1, None)
+
+
+def estatisticas():
+    """
+    Acertos e falhas do cache do catálogo desde que o cache foi criado.
+    """
+    cache = cache_catalogo()
+    acertos = cache.get(CHAVE_ACERTOS, 0)
+    falhas = cache.get(CHAVE_FALHAS, 0)
+    total = acertos + falhas
+    return {
+        'acertos': acertos,
+        'falhas': falhas,
+        'taxa_acerto': acertos / total if total else 0.0,
+    }
+
+
+def parametros_normalizados(query_params):
+    """
+    Query string em ordem alfabética e sem parâmetros vazios, para que
+    ?a=1&b=2 e ?b=2&a=1 caiam na mesma chave.
+    """
+    pares = sorted(
+        (chave, valor)
+        for chave, valores in query_params.lists()
+        for valor in valores
+        if valor != ''
+    )
+    return urlencode(pares)
+
+
+def chave_resposta(prefixo, *partes):
+    """
+    Chave de cache versionada. O resumo (sha1) mantém a chave curta
+    mesmo com query strings grandes (o memcached limita em 250 bytes).
+    """
+    resumo = hashlib.sha1('|'.join(str(parte) for parte in partes).encode()).hexdigest()
+    return f'catalogo:{versao_catalogo()}:{prefixo}:{resumo}'
+
+
+class CacheCatalogoMixin:
+    """
+    Mixin para ViewSets do catálogo: list e retrieve de usuários anônimos
+    são servidos do cache. Usuários logados sempre vão ao banco, porque a
+    resposta deles tem dados próprios (ex.: is_favorito).
+
+    A resposta leva o cabeçalho X-Cache: HIT ou MISS.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.resposta_em_cache(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.resposta_em_cache(super().retrieve, request, *args, **kwargs)
+
+    def resposta_em_cache(self, metodo, request, *args, **kwargs):
+        if request.user and request.user.is_authenticated:
+            return metodo(request, *args, **kwargs)
+
+        cache = cache_catalogo()
+        # o host entra na chave porque os links de paginação são absolutos
+        chave = chave_resposta(
+            self.basename,
+            request.build_absolute_uri('/'),
+            self.action,
+            kwargs.get(self.lookup_url_kwarg or self.lookup_field, ''),
+            parametros_normalizados(request.query_params),
+        )
+        dados = cache.get(chave)
+        if dados is not None:
+            _contar(CHAVE_ACERTOS)
+            return Response(dados, headers={'X-Cache': 'HIT'})
+
+        _contar(CHAVE_FALHAS)
+        response = metodo(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(chave, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,117 @@
+"""
+GET condicional (ETag / Last-Modified) para os ViewSets do catálogo.
+
+Os validadores saem de uma única consulta agregada sobre o queryset já
+filtrado: MAX(atualizado) e COUNT(id). Se o cliente manda If-None-Match ou
+If-Modified-Since e nada mudou, a resposta é 304 sem serializar nada.
+
+Last-Modified só vai no detalhe que não depende do usuário: numa lista, um
+item apagado ou desativado diminui o COUNT sem mudar o MAX(atualizado), e
+os favoritos do usuário mudam o is_favorito sem mudar data nenhuma do
+produto. Nesses casos só a ETag (que inclui os dois) vale.
+"""
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .cache import cache_catalogo, chave_resposta, parametros_normalizados
+
+
+class RespostaCondicionalMixin:
+    """
+    Mixin para ViewSets: list e retrieve enviam ETag e Last-Modified e
+    respondem 304 quando o cliente já tem a versão atual.
+
+    `campos_atualizacao` são os campos de data cujo máximo indica a última
+    alteração (ex.: a categoria, que aparece em categoria_nome).
+    """
+    campos_atualizacao = ('atualizado',)
+
+    def list(self, request, *args, **kwargs):
+        return self.resposta_condicional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.resposta_condicional(super().retrieve, request, *args, **kwargs)
+
+    def resposta_condicional(self, metodo, request, *args, **kwargs):
+        validadores = self.validadores(request, kwargs)
+        if validadores is None:
+            return metodo(request, *args, **kwargs)
+
+        etag, ultima_alteracao, do_usuario = validadores
+        nao_modificado = get_conditional_response(
+            request._request, etag=etag, last_modified=ultima_alteracao
+        )
+        response = nao_modificado or metodo(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if ultima_alteracao is not None:
+                response['Last-Modified'] = http_date(ultima_alteracao)
+            # guarda, mas sempre revalida com o servidor
+            patch_cache_control(response, no_cache=True)
+            # login por sessão vem no cookie
+            patch_vary_headers(response, ['Authorization', 'Cookie'] if do_usuario else ['Authorization'])
+        return response
+
+    def validadores(self, request, kwargs):
+        """
+        Retorna (etag, timestamp da última alteração ou None, se a resposta
+        depende do usuário) ou None se o objeto pedido não existe (o
+        retrieve segue e responde 404).
+
+        O agregado do catálogo fica no cache sob a versão do catálogo, então
+        requisições repetidas não voltam ao banco. Só a parte do usuário
+        (seus favoritos, que mudam o is_favorito) é consultada sempre.
+        """
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        pk = kwargs.get(lookup, '')
+        parametros = parametros_normalizados(request.query_params)
+        chave = chave_resposta('validadores', self.basename, self.action, pk, parametros)
+
+        cache = cache_catalogo()
+        agregado = cache.get(chave)
+        if agregado is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            if pk:
+                try:
+                    queryset = queryset.filter(**{self.lookup_field: pk})
+                except (TypeError, ValueError, ValidationError):
+                    return None
+            agregado = queryset.order_by().aggregate(
+                total=Count('id'),
+                **{f'ultima_{i}': Max(campo) for i, campo in enumerate(self.campos_atualizacao)},
+            )
+            cache.set(chave, agregado)
+
+        if pk and not agregado['total']:
+            return None
+
+        datas = [
+            valor for nome, valor in agregado.items()
+            if nome.startswith('ultima_') and valor is not None
+        ]
+        versao_do_usuario = self.versao_do_usuario(request)
+        ultima_alteracao = None
+        if datas and self.action == 'retrieve' and not versao_do_usuario:
+            ultima_alteracao = int(max(datas).timestamp())
+
+        partes = [
+            self.basename, self.action, pk, parametros,
+            request.build_absolute_uri('/'),
+            agregado['total'],
+            *(valor.isoformat() for valor in datas),
+            versao_do_usuario,
+        ]
+        resumo = hashlib.sha1('|'.join(str(parte) for parte in partes).encode()).hexdigest()
+        return quote_etag(resumo), ultima_alteracao, bool(versao_do_usuario)
+
+    def versao_do_usuario(self, request):
+        """
+        Parte da ETag que depende do usuário logado. Por padrão nenhuma;
+        se não for vazia, a resposta não leva Last-Modified e varia com o
+        Cookie.
+        """
+        return ''
@@ -0,0 +1,243 @@
+"""
+Produtos parecidos pelo texto (GET /produtos/{id}/relacionados/?modo=conteudo),
+úteis quando o produto tem poucos favoritos para os relacionados.py.
+
+Cada produto ativo vira um vetor TF-IDF dos termos de nome, marca e
+descrição:
+
+- termos: o texto normalizado (sem acento, minúsculas), em palavras de 2
+  ou mais caracteres, fora das STOPWORDS;
+- tf: 1 + log(soma dos PESOS do termo nos campos do produto);
+- idf: log((1 + N) / (1 + produtos com o termo)) + 1, só para termos de
+  pelo menos MIN_PRODUTOS produtos (os outros não aproximam ninguém);
+- os vetores têm norma 1, então o cosseno é o produto escalar.
+
+Os vizinhos saem de X[linhas] @ X[colunas].T em blocos de linhas e de
+colunas: a memória depende do tamanho dos blocos, não do catálogo (nem de
+termos que aparecem em quase todos os produtos), e de cada bloco de
+colunas só os K melhores de cada linha (argpartition) seguem.
+
+O vocabulário (termo e idf) fica em TermoConteudo. Sem --completo, o
+comando calcular_relacionados_conteudo recalcula só os produtos criados ou
+editados desde a última execução, com esse vocabulário (termos novos ficam
+de fora). As listas dos outros produtos, e o vocabulário, só mudam no
+próximo --completo (ex.: uma vez por dia). O incremental ainda lê e quebra
+em termos o texto de todos os produtos ativos, porque os vizinhos de um
+produto alterado podem ser qualquer um deles; o que ele economiza é a
+comparação (e a gravação) das listas que não mudaram.
+
+A próxima execução começa no horizonte (agora - PRODUTOS_EVENTOS_MARGEM,
+ver tendencias.horizonte), não em agora: um produto salvo numa transação
+que só termina depois da leitura tem `atualizado` anterior a ela e ficaria
+de fora para sempre. Os editados dentro da margem são recalculados de novo
+na execução seguinte.
+"""
+import re
+
+from django.db import transaction
+
+from .models import Checkpoint, Produto, ProdutoRelacionado, TermoConteudo
+from .normalizacao import normalizar
+from .relacionados import LIMITE_INCREMENTAL, gravar, k_maiores, np, sparse
+from .tendencias import horizonte
+
+CHECKPOINT = 'conteudo'
+K = 20
+# cada multiplicação gera TAMANHO_BLOCO × TAMANHO_BLOCO_COLUNAS pontuações
+# (float32): 20 MB com os valores padrão
+TAMANHO_BLOCO = 500
+TAMANHO_BLOCO_COLUNAS = 10000
+MIN_PRODUTOS = 2
+# peso de cada ocorrência do termo, por campo
+PESOS = {'nome': 2.0, 'marca': 1.5, 'descricao': 1.0}
+CAMPOS = tuple(PESOS)
+
+TERMO = re.compile(r'[a-z0-9]+')
+# já sem acento, como sai do normalizar()
+STOPWORDS = frozenset('''
+    a ao aos aquela aquelas aquele aqueles aquilo as ate apos com como da das de dela delas
+    dele deles depois do dos e ela elas ele eles em entre era eram essa essas esse esses esta
+    estas este estes estao eu foi foram ha isso isto ja lhe lhes mais mas me mesmo meu meus
+    minha minhas muito na nao nas nem no nos nossa nossas nosso nossos num numa o os ou para
+    pela pelas pelo pelos por pra pro qual quando que quem se sem ser seu seus so sua suas
+    tambem te tem ter teu tua um uma umas uns voce voces cada todo toda todos todas tudo
+    alem ainda onde sobre muita muitos muitas sao seja sendo tao
+'''.split())
+
+
+def termos(texto):
+    """
+    'Caneca de Cerâmica 350ml' -> ['caneca', 'ceramica', '350ml']
+    """
+    return [
+        termo[:50] for termo in TERMO.findall(normalizar(texto))
+        if len(termo) > 1 and termo not in STOPWORDS
+    ]
+
+
+def matriz_termos(textos, vocabulario=None):
+    """
+    Matriz CSR produto × termo com a soma dos pesos de cada termo, para
+    `textos` = [(nome, marca, descricao), ...]. Sem `vocabulario` ({termo:
+    coluna}), cria um com todos os termos encontrados; com ele, ignora os
+    termos que não estão lá. Retorna (matriz, vocabulario).
+    """
+    novo = vocabulario is None
+    vocabulario = {} if novo else vocabulario
+    linhas, colunas, pesos = [], [], []
+    for linha, campos in enumerate(textos):
+        for texto, peso in zip(campos, PESOS.values()):
+            for termo in termos(texto):
+                coluna = vocabulario.setdefault(termo, len(vocabulario)) if novo else vocabulario.get(termo)
+                if coluna is not None:
+                    linhas.append(linha)
+                    colunas.append(coluna)
+                    pesos.append(peso)
+    matriz = sparse.csr_matrix(
+        (np.array(pesos, dtype=np.float32), (linhas, colunas)),
+        shape=(len(textos), len(vocabulario)),
+    )
+    return matriz, vocabulario
+
+
+def calcular_idf(contagem):
+    """
+    idf de cada coluna da matriz de termos; 0 para os termos em menos de
+    MIN_PRODUTOS produtos.
+    """
+    produtos_com_termo = np.bincount(contagem.indices, minlength=contagem.shape[1])
+    idf = np.log((1 + contagem.shape[0]) / (1 + produtos_com_termo)) + 1
+    idf[produtos_com_termo < MIN_PRODUTOS] = 0
+    return idf.astype(np.float32)
+
+
+def vetores(contagem, idf):
+    """
+    Vetores TF-IDF com norma 1 (linhas sem nenhum termo ficam zeradas).
+    """
+    tfidf = contagem.copy()
+    tfidf.data = (1 + np.log(tfidf.data)) * idf[tfidf.indices]
+    tfidf.eliminate_zeros()
+    normas = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+    normas[normas == 0] = 1
+    return (sparse.diags(1 / normas) @ tfidf).tocsr().astype(np.float32)
+
+
+def vizinhos(matriz, ids_produtos, linhas=None, k=K, tamanho_bloco=TAMANHO_BLOCO,
+             tamanho_bloco_colunas=TAMANHO_BLOCO_COLUNAS):
+    """
+    Gera, bloco a bloco, os K vizinhos de cada linha em `linhas` (todas se
+    None) como arrays (produto_id, relacionado_id, posicao, pontuacao).
+    """
+    linhas = np.arange(matriz.shape[0]) if linhas is None else np.asarray(linhas)
+    # CSC: escolher as colunas (termos) de um bloco é barato
+    blocos_colunas = [
+        (inicio, matriz[inicio:inicio + tamanho_bloco_colunas].tocsc())
+        for inicio in range(0, matriz.shape[0], tamanho_bloco_colunas)
+    ]
+    for inicio in range(0, len(linhas), tamanho_bloco):
+        bloco = linhas[inicio:inicio + tamanho_bloco]
+        parte = matriz[bloco]
+        # só os termos que aparecem no bloco contam; com eles a parte vira
+        # densa (esparsa × densa é mais rápida que esparsa × esparsa)
+        termos_bloco = np.unique(parte.indices)
+        densa = parte[:, termos_bloco].toarray().T
+        candidatos = []
+        for inicio_colunas, colunas_bloco in blocos_colunas:
+            # resultado denso: com termos comuns quase todos os pares têm
+            # algo em comum, e o argpartition por linha é bem mais rápido
+            # que ordenar os pares de uma matriz esparsa
+            semelhancas = np.ascontiguousarray((colunas_bloco[:, termos_bloco] @ densa).T)
+            # o próprio produto não entra
+            proprios = bloco - inicio_colunas
+            dentro = (proprios >= 0) & (proprios < semelhancas.shape[1])
+            semelhancas[np.flatnonzero(dentro), proprios[dentro]] = 0
+            quantos = min(k, semelhancas.shape[1])
+            melhores = np.argpartition(-semelhancas, quantos - 1, axis=1)[:, :quantos]
+            pontuacoes = np.take_along_axis(semelhancas, melhores, axis=1).ravel()
+            positivos = pontuacoes > 0
+            candidatos.append((
+                np.repeat(np.arange(len(bloco)), quantos)[positivos],
+                melhores.ravel()[positivos] + inicio_colunas,
+                pontuacoes[positivos],
+            ))
+        resultado = [np.concatenate(partes) for partes in zip(*candidatos)]
+        resultado_linhas, colunas, pontuacoes, posicoes = k_maiores(*resultado, ids_produtos, k)
+        yield ids_produtos[bloco[resultado_linhas]], ids_produtos[colunas], posicoes, pontuacoes
+
+
+def _produtos():
+    produtos = list(Produto.objects.ativos().order_by('id').values_list('id', 'atualizado', *CAMPOS))
+    ids_produtos = np.array([produto[0] for produto in produtos], dtype=np.int64)
+    return produtos, ids_produtos
+
+
+def _refazer_vocabulario(textos):
+    contagem, vocabulario = matriz_termos(textos)
+    idf = calcular_idf(contagem)
+    usados = np.flatnonzero(idf)
+    TermoConteudo.objects.all().delete()
+    TermoConteudo.objects.bulk_create(
+        [TermoConteudo(termo=termo, idf=float(idf[coluna])) for termo, coluna in vocabulario.items() if idf[coluna]],
+        batch_size=1000,
+    )
+    return contagem[:, usados], idf[usados]
+
+
+def _vocabulario_salvo():
+    salvo = list(TermoConteudo.objects.order_by('termo').values_list('termo', 'idf'))
+    vocabulario = {termo: coluna for coluna, (termo, _) in enumerate(salvo)}
+    return vocabulario, np.array([idf for _, idf in salvo], dtype=np.float32)
+
+
+def atualizar(completo=False, k=K, tamanho_bloco=TAMANHO_BLOCO, progresso=None):
+    """
+    Recalcula os vizinhos pelo texto de todos os produtos ativos
+    (`completo`, refazendo o vocabulário) ou só dos criados e editados
+    desde a última execução. Retorna quantos produtos foram recalculados.
+    """
+    # o que mudou antes disso já está gravado (e é lido abaixo)
+    limite = horizonte()
+    with transaction.atomic():
+        # select_for_update: duas execuções ao mesmo tempo não se misturam
+        Checkpoint.objects.get_or_create(nome=CHECKPOINT)
+        checkpoint = Checkpoint.objects.select_for_update().get(nome=CHECKPOINT)
+        produtos, ids_produtos = _produtos()
+        textos = [produto[2:] for produto in produtos]
+
+        linhas = None
+        if not completo and checkpoint.referencia is not None and TermoConteudo.objects.exists():
+            linhas = np.array(
+                [linha for linha, produto in enumerate(produtos) if produto[1] >= checkpoint.referencia],
+                dtype=np.int64,
+            )
+            if len(linhas) > LIMITE_INCREMENTAL:
+                linhas = None
+
+        if linhas is None:
+            ProdutoRelacionado.objects.filter(modo=ProdutoRelacionado.CONTEUDO).delete()
+            contagem, idf = _refazer_vocabulario(textos)
+        else:
+            # desativados desde a última execução só perdem a própria lista
+            desativados = Produto.objects.filter(ativo=False, atualizado__gte=checkpoint.referencia)
+            ProdutoRelacionado.objects.filter(
+                modo=ProdutoRelacionado.CONTEUDO, produto__in=desativados.values('id'),
+            ).delete()
+            ProdutoRelacionado.objects.filter(
+                modo=ProdutoRelacionado.CONTEUDO, produto_id__in=ids_produtos[linhas].tolist(),
+            ).delete()
+            vocabulario, idf = _vocabulario_salvo()
+            contagem, _ = matriz_termos(textos, vocabulario)
+
+        total = len(produtos) if linhas is None else len(linhas)
+        feitos = 0
+        if total and contagem.shape[1]:
+            for bloco in vizinhos(vetores(contagem, idf), ids_produtos, linhas, k, tamanho_bloco):
+                gravar(ProdutoRelacionado.CONTEUDO, *bloco)
+                feitos = min(feitos + tamanho_bloco, total)
+                if progresso:
+                    progresso(feitos, total)
+
+        checkpoint.referencia = limite
+        checkpoint.save()
+    return total
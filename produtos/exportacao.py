@@ -0,0 +1,146 @@
+"""
+Exportação do catálogo em NDJSON (um produto JSON por linha) ou CSV.
+
+Os produtos são lidos com values().iterator(), em blocos (cursor no
+servidor no PostgreSQL, fetchmany no SQLite), e cada bloco é convertido e
+enviado antes de ler o próximo. Assim a memória usada não depende do
+tamanho do catálogo.
+"""
+import csv
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+FORMATOS = {
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'produtos.ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'produtos.csv'),
+}
+
+# nome na exportação -> campo no values()
+CAMPOS = {
+    'id': 'id',
+    'nome': 'nome',
+    'marca': 'marca',
+    'preco': 'preco',
+    'descricao': 'descricao',
+    'ativo': 'ativo',
+    'categoria': 'categoria_id',
+    'categoria_nome': 'categoria__nome',
+    'imagem': 'imagem',
+    'criado': 'criado',
+    'atualizado': 'atualizado',
+}
+
+# produtos lidos do banco (e enviados ao cliente) por vez
+TAMANHO_BLOCO = 2000
+
+
+def data_desde(texto):
+    """
+    Lê ?desde= como data e hora ISO (2024-05-01T10:00:00Z) ou só a data.
+    Sem fuso, vale o fuso do projeto.
+    """
+    if not texto:
+        return None
+    try:
+        valor = parse_datetime(texto)
+        if valor is None:
+            dia = parse_date(texto)
+            valor = datetime(dia.year, dia.month, dia.day) if dia else None
+    except ValueError:
+        valor = None
+    if valor is None:
+        raise ValidationError({'desde': 'Informe uma data ISO 8601, ex.: 2024-05-01T10:00:00Z.'})
+    if timezone.is_naive(valor):
+        valor = timezone.make_aware(valor)
+    return valor
+
+
+def _texto(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def linhas_ndjson(registros):
+    for registro in registros:
+        yield json.dumps(registro, ensure_ascii=False, default=_texto) + '\n'
+
+
+class _Eco:
+    """
+    "Arquivo" que só devolve o que recebe: o csv.writer formata a linha e
+    ela é enviada direto, sem acumular num buffer.
+    """
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(registros):
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(list(CAMPOS))
+    for registro in registros:
+        yield escritor.writerow([
+            '' if registro[campo] is None else _texto(registro[campo]) for campo in CAMPOS
+        ])
+
+
+def registros(queryset, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Gera os produtos como dicts com os nomes de CAMPOS, em ordem de id.
+    """
+    valores = queryset.order_by('id').values(*CAMPOS.values())
+    for linha in valores.iterator(chunk_size=tamanho_bloco):
+        yield {nome: linha[campo] for nome, campo in CAMPOS.items()}
+
+
+def em_blocos(linhas, tamanho=TAMANHO_BLOCO):
+    """
+    Junta as linhas em pedaços maiores, para não mandar um pedaço por
+    produto para o servidor web.
+    """
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= tamanho:
+            yield ''.join(bloco).encode()
+            bloco = []
+    if bloco:
+        yield ''.join(bloco).encode()
+
+
+def compactar_gzip(pedacos):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for pedaco in pedacos:
+        dados = compressor.compress(pedaco)
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+def resposta_exportacao(queryset, formato, gzip=False):
+    """
+    StreamingHttpResponse com o queryset exportado no formato pedido.
+    Nada é consultado até o servidor começar a enviar a resposta.
+    """
+    content_type, nome_arquivo = FORMATOS[formato]
+    gerador = linhas_ndjson if formato == 'ndjson' else linhas_csv
+    conteudo = em_blocos(gerador(registros(queryset)))
+    if gzip:
+        conteudo = compactar_gzip(conteudo)
+
+    response = StreamingHttpResponse(conteudo, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    response['Vary'] = 'Accept-Encoding'
+    if gzip:
+        response['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,90 @@
+"""
+Contagens por faceta (marca, categoria e faixa de preço) para a busca.
+
+Cada faceta é uma única consulta agrupada sobre o queryset já filtrado,
+então o custo não depende de trazer os produtos para o Python.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from rest_framework.exceptions import ValidationError
+
+# Limites das faixas de preço: [0, 100) [100, 500) ... [5000, ∞)
+FAIXAS_PRECO_PADRAO = [0, 100, 500, 1000, 5000]
+LIMITE_MARCAS = 50
+# cada faixa é um COUNT(...) FILTER a mais no SELECT
+LIMITE_FAIXAS = 20
+
+
+def faixas_preco(texto=None):
+    """
+    Lê os limites das faixas de preço de '?faixas=0,100,500' ou, se não
+    vier nada, de settings.PRODUTOS_FAIXAS_PRECO.
+    """
+    if not texto:
+        limites = getattr(settings, 'PRODUTOS_FAIXAS_PRECO', FAIXAS_PRECO_PADRAO)
+        return [Decimal(str(limite)) for limite in limites]
+    try:
+        limites = [Decimal(parte.strip()) for parte in texto.split(',') if parte.strip()]
+    except InvalidOperation:
+        raise ValidationError({'faixas': 'Informe números separados por vírgula.'})
+    # Decimal aceita NaN e Infinity, que não servem de limite
+    if not all(limite.is_finite() for limite in limites):
+        raise ValidationError({'faixas': 'Informe números separados por vírgula.'})
+    if len(limites) > LIMITE_FAIXAS:
+        raise ValidationError({'faixas': f'Informe no máximo {LIMITE_FAIXAS} limites.'})
+    if not limites or any(a >= b for a, b in zip(limites, limites[1:])):
+        raise ValidationError({'faixas': 'Os limites devem estar em ordem crescente.'})
+    return limites
+
+
+def calcular_facetas(queryset, limites):
+    """
+    Retorna as contagens por marca, categoria e faixa de preço dos
+    produtos do queryset (3 consultas, uma por faceta).
+    """
+    base = queryset.order_by()
+
+    # Agrupa pela marca normalizada ("Sony" e "SONY" contam juntas) e
+    # mostra uma das grafias originais
+    marcas = (
+        base.values('marca_normalizada')
+        .annotate(total=Count('id'), nome_marca=Max('marca'))
+        .order_by('-total', 'marca_normalizada')[:LIMITE_MARCAS]
+    )
+    categorias = (
+        base.values('categoria_id', 'categoria__nome')
+        .annotate(total=Count('id'))
+        .order_by('-total', 'categoria__nome')
+    )
+
+    # Uma contagem filtrada por faixa, todas no mesmo SELECT
+    faixas = []
+    for i, minimo in enumerate(limites):
+        maximo = limites[i + 1] if i + 1 < len(limites) else None
+        filtro = Q(preco__gte=minimo)
+        if maximo is not None:
+            filtro &= Q(preco__lt=maximo)
+        faixas.append((minimo, maximo, filtro))
+    contagens = base.aggregate(
+        total=Count('id'),
+        **{f'faixa_{i}': Count('id', filter=filtro) for i, (_, _, filtro) in enumerate(faixas)},
+    )
+
+    return {
+        'total': contagens['total'],
+        'marcas': [{'marca': m['nome_marca'], 'total': m['total']} for m in marcas],
+        'categorias': [
+            {'id': c['categoria_id'], 'nome': c['categoria__nome'], 'total': c['total']}
+            for c in categorias
+        ],
+        'precos': [
+            {
+                'min': f'{minimo:.2f}',
+                'max': f'{maximo:.2f}' if maximo is not None else None,
+                'total': contagens[f'faixa_{i}'],
+            }
+            for i, (minimo, maximo, _) in enumerate(faixas)
+        ],
+    }
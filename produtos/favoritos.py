@@ -0,0 +1,150 @@
+"""
+Favoritar e desfavoritar com um INSERT ou DELETE só, direto na tabela do
+M2M Usuario.favoritos.
+
+- favoritar: INSERT ... SELECT dos produtos ativos, com ON CONFLICT DO
+  NOTHING (repetir a requisição não dá erro nem duplica) e RETURNING dos
+  que entraram agora.
+- desfavoritar: DELETE ... RETURNING dos que saíram.
+
+Os dois retornam os IDs realmente alterados, e servem tanto para um
+produto quanto para uma lista. SQLite (3.35+) e PostgreSQL aceitam esse
+SQL; nos outros bancos o ORM faz o mesmo em mais consultas.
+
+Na mesma transação, Produto.total_favoritos é atualizado com F() e cada
+alteração vira um EventoFavorito (usados em tendencias.py). As alterações
+feitas pelo ORM, como usuario.favoritos.add(), fazem o mesmo pelo
+m2m_changed em signals.py.
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from usuarios.models import Usuario
+
+from .models import EventoFavorito, Produto
+
+
+def _tabela():
+    through = Usuario.favoritos.through
+    return (
+        through,
+        connection.ops.quote_name(through._meta.db_table),
+        connection.ops.quote_name(through._meta.get_field('usuario').column),
+        connection.ops.quote_name(through._meta.get_field('produto').column),
+        connection.ops.quote_name(through._meta.get_field('criado').column),
+    )
+
+
+def _sql_direto():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def favoritar(usuario, ids):
+    """
+    Coloca os produtos `ids` (só os ativos) nos favoritos do usuário e
+    retorna o conjunto dos que não estavam lá.
+    """
+    ids = list(ids)
+    if not ids:
+        return set()
+    through, tabela, coluna_usuario, coluna_produto, coluna_criado = _tabela()
+    if not _sql_direto():
+        novos = set(Produto.objects.ativos().filter(id__in=ids).exclude(favoritados=usuario)
+                    .values_list('id', flat=True))
+        with transaction.atomic():
+            through.objects.bulk_create(
+                [through(usuario_id=usuario.pk, produto_id=id_produto) for id_produto in novos],
+                ignore_conflicts=True,
+            )
+            ajustar_totais(novos, 1)
+            registrar_eventos([(usuario.pk, id_produto) for id_produto in novos], EventoFavorito.FAVORITOU)
+        return novos
+
+    produtos = connection.ops.quote_name(Produto._meta.db_table)
+    marcadores = ', '.join(['%s'] * len(ids))
+    # o WHERE no SELECT é obrigatório no SQLite para o ON CONFLICT não ser
+    # lido como parte do SELECT
+    sql = (
+        f'INSERT INTO {tabela} ({coluna_usuario}, {coluna_produto}, {coluna_criado}) '
+        f'SELECT %s, id, %s FROM {produtos} WHERE id IN ({marcadores}) AND ativo '
+        f'ON CONFLICT ({coluna_usuario}, {coluna_produto}) DO NOTHING '
+        f'RETURNING {coluna_produto}'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, [usuario.pk, timezone.now(), *ids])
+        novos = {linha[0] for linha in cursor.fetchall()}
+        ajustar_totais(novos, 1)
+        registrar_eventos([(usuario.pk, id_produto) for id_produto in novos], EventoFavorito.FAVORITOU)
+    return novos
+
+
+def desfavoritar(usuario, ids):
+    """
+    Tira os produtos `ids` dos favoritos do usuário e retorna o conjunto
+    dos que estavam lá.
+    """
+    ids = list(ids)
+    if not ids:
+        return set()
+    through, tabela, coluna_usuario, coluna_produto, _ = _tabela()
+    if not _sql_direto():
+        linhas = through.objects.filter(usuario_id=usuario.pk, produto_id__in=ids)
+        with transaction.atomic():
+            removidos = set(linhas.values_list('produto_id', flat=True))
+            linhas.delete()
+            ajustar_totais(removidos, -1)
+            registrar_eventos([(usuario.pk, id_produto) for id_produto in removidos], EventoFavorito.DESFAVORITOU)
+        return removidos
+
+    marcadores = ', '.join(['%s'] * len(ids))
+    sql = (
+        f'DELETE FROM {tabela} WHERE {coluna_usuario} = %s AND {coluna_produto} IN ({marcadores}) '
+        f'RETURNING {coluna_produto}'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, [usuario.pk, *ids])
+        removidos = {linha[0] for linha in cursor.fetchall()}
+        ajustar_totais(removidos, -1)
+        registrar_eventos([(usuario.pk, id_produto) for id_produto in removidos], EventoFavorito.DESFAVORITOU)
+    return removidos
+
+
+def ajustar_totais(ids, delta):
+    """
+    Soma `delta` ao total_favoritos dos produtos `ids` direto no banco
+    (F()), sem ler o valor atual nem tocar em 'atualizado'.
+    """
+    if not ids:
+        return 0
+    # nunca abaixo de zero, mesmo se o contador estiver defasado
+    return Produto.objects.filter(id__in=ids).update(
+        total_favoritos=Greatest(F('total_favoritos') + delta, Value(0))
+    )
+
+
+def registrar_eventos(pares, tipo):
+    """
+    Grava um EventoFavorito por (usuario_id, produto_id) num INSERT só.
+    """
+    agora = timezone.now()
+    eventos = [
+        EventoFavorito(usuario_id=usuario_id, produto_id=produto_id, tipo=tipo, criado=agora)
+        for usuario_id, produto_id in pares
+    ]
+    if eventos:
+        EventoFavorito.objects.bulk_create(eventos)
+
+
+def recontar_favoritos(produtos=None):
+    """
+    Recalcula total_favoritos pela tabela de favoritos num UPDATE só, e
+    retorna quantos produtos estavam com o total errado.
+    """
+    produtos = Produto.objects.all() if produtos is None else produtos
+    total = Coalesce(Subquery(
+        Usuario.favoritos.through.objects.filter(produto_id=OuterRef('pk')).order_by()
+        .values('produto_id').annotate(total=Count('*')).values('total')
+    ), 0)
+    return produtos.exclude(total_favoritos=total).update(total_favoritos=total)
@@ -0,0 +1,138 @@
+"""
+Variantes das imagens de produto (miniatura, card e tamanho cheio) em
+WebP e JPEG, geradas com o Pillow e gravadas no mesmo storage do
+original (que dá a cada arquivo o nome do hash do conteúdo).
+
+Os nomes gravados ficam em Produto.imagem_variantes, no formato
+{'thumb': {'webp': 'produtos/ab/ab12...ef.webp', 'jpeg': '...'}, ...}.
+Arquivos antigos não são apagados aqui, pois podem ser de outro produto
+com a mesma foto: ver o comando limpar_midia.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# nome -> (largura, altura) máximas; a imagem nunca é ampliada
+VARIANTES_PADRAO = {
+    'thumb': (160, 160),
+    'card': (480, 480),
+    'full': (1200, 1200),
+}
+
+# formato -> (extensão, opções do Image.save)
+FORMATOS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variantes_configuradas():
+    return getattr(settings, 'PRODUTOS_VARIANTES_IMAGEM', VARIANTES_PADRAO)
+
+
+def storage_imagens():
+    from .models import Produto
+    return Produto._meta.get_field('imagem').storage
+
+
+def nome_variante(nome_imagem, variante, formato):
+    base, _ = os.path.splitext(nome_imagem)
+    return f'{base}_{variante}.{FORMATOS[formato][0]}'
+
+
+def _para_jpeg(imagem):
+    """
+    JPEG não tem transparência: o fundo transparente vira branco.
+    """
+    if imagem.mode in ('RGBA', 'LA') or (imagem.mode == 'P' and 'transparency' in imagem.info):
+        imagem = imagem.convert('RGBA')
+        fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+        fundo.paste(imagem, mask=imagem.getchannel('A'))
+        return fundo
+    return imagem.convert('RGB')
+
+
+def gerar_variantes(nome_imagem, storage=None):
+    """
+    Gera todas as variantes da imagem `nome_imagem` (nome no storage) e
+    retorna o dicionário salvo em Produto.imagem_variantes.
+
+    Não usa o banco, então pode rodar em outro processo (ver o comando
+    gerar_variantes_imagens).
+    """
+    storage = storage or storage_imagens()
+    with storage.open(nome_imagem, 'rb') as arquivo:
+        original = Image.open(arquivo)
+        # respeita a rotação da câmera (EXIF) antes de redimensionar
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info or 'A' in original.mode else 'RGB')
+
+    variantes = {}
+    for variante, tamanho in variantes_configuradas().items():
+        reduzida = original.copy()
+        reduzida.thumbnail(tamanho, Image.Resampling.LANCZOS)
+        variantes[variante] = {}
+        for formato, (_, opcoes) in FORMATOS.items():
+            nome = nome_variante(nome_imagem, variante, formato)
+            # o nome vem do original (pelo conteúdo): se já existe, é a
+            # mesma variante, talvez em uso por outro produto com a mesma
+            # foto. Nunca apaga nem regrava (o arquivo sumiria por um tempo)
+            if storage.exists(nome):
+                variantes[variante][formato] = nome
+                continue
+            imagem = _para_jpeg(reduzida) if formato == 'jpeg' else reduzida
+            buffer = io.BytesIO()
+            imagem.save(buffer, **opcoes)
+            # no ArmazenamentoPorConteudo, conteúdo igual devolve o arquivo
+            # que já existe
+            variantes[variante][formato] = storage.save(nome, ContentFile(buffer.getvalue()))
+    return variantes
+
+
+def variantes_existentes(produto):
+    """
+    Variantes já geradas para a mesma imagem em outro produto (mesmo
+    conteúdo = mesmo nome no storage), ou None.
+    """
+    from .models import Produto
+    return (
+        Produto.objects.filter(imagem=produto.imagem.name).exclude(pk=produto.pk)
+        .exclude(imagem_variantes={})
+        .values_list('imagem_variantes', flat=True).first()
+    )
+
+
+def atualizar_variantes(produto):
+    """
+    Gera as variantes da imagem atual do produto e salva em
+    imagem_variantes. Se outro produto já tem a mesma imagem, reaproveita
+    as variantes dele sem abrir a imagem.
+    """
+    if produto.imagem:
+        produto.imagem_variantes = variantes_existentes(produto) or gerar_variantes(produto.imagem.name)
+    else:
+        produto.imagem_variantes = {}
+    produto.save(update_fields=['imagem_variantes'])
+
+
+def urls_variantes(variantes, request=None, storage=None):
+    """
+    {'thumb': {'webp': url, 'jpeg': url}, ...} com URLs absolutas quando
+    há request (como o campo imagem do serializer), ou None.
+    """
+    if not variantes:
+        return None
+    storage = storage or storage_imagens()
+    urls = {}
+    for variante, formatos in variantes.items():
+        urls[variante] = {}
+        for formato, nome in formatos.items():
+            url = storage.url(nome)
+            urls[variante][formato] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,187 @@
+"""
+Importação em massa de produtos a partir de CSV ou JSON Lines.
+
+O arquivo é lido linha a linha e os produtos são gravados em lotes com
+bulk_create (um INSERT por lote, cada lote na sua transação), então a
+memória usada não cresce com o tamanho do arquivo.
+
+Usado pelo comando `import_produtos` e por POST /produtos/importar/.
+"""
+import csv
+import json
+import time
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .cache import invalidar_catalogo
+from .models import Categoria, Produto
+from .normalizacao import normalizar
+from .serializers import ImportacaoProdutoSerializer
+
+FORMATOS = ('csv', 'jsonl')
+
+
+def ler_csv(arquivo):
+    """
+    Gera (número da linha, dados) para cada linha de um CSV com cabeçalho.
+    """
+    leitor = csv.DictReader(arquivo)
+    for registro in leitor:
+        yield leitor.line_num, registro
+
+
+def ler_jsonl(arquivo):
+    """
+    Gera (número da linha, dados) para cada linha de um arquivo JSON Lines.
+    Linhas com JSON inválido geram dados=None.
+    """
+    for numero, linha in enumerate(arquivo, start=1):
+        if not linha.strip():
+            continue
+        try:
+            dados = json.loads(linha)
+        except ValueError:
+            dados = None
+        yield numero, dados if isinstance(dados, dict) else None
+
+
+def ler_linhas(arquivo, formato):
+    if formato == 'csv':
+        return ler_csv(arquivo)
+    if formato == 'jsonl':
+        return ler_jsonl(arquivo)
+    raise ValueError(f'Formato inválido: {formato}. Use: {", ".join(FORMATOS)}.')
+
+
+def formato_do_arquivo(nome):
+    """
+    Deduz o formato pela extensão do arquivo (.csv, .jsonl ou .ndjson).
+    """
+    nome = (nome or '').lower()
+    if nome.endswith('.csv'):
+        return 'csv'
+    if nome.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
+
+
+class ImportadorProdutos:
+    """
+    Valida e grava produtos em lotes.
+
+    - tamanho_lote: produtos por bulk_create/transação
+    - criar_categorias: cria as categorias que ainda não existem (senão a
+      linha vira erro)
+    - max_erros: quantos erros detalhados guardar (os demais só são contados)
+    - progresso: função chamada a cada lote com o resultado parcial
+    """
+
+    def __init__(self, tamanho_lote=1000, criar_categorias=True, max_erros=100, progresso=None):
+        self.tamanho_lote = tamanho_lote
+        self.criar_categorias = criar_categorias
+        self.max_erros = max_erros
+        self.progresso = progresso
+        # um único serializer reaproveitado em todas as linhas
+        self.validador = ImportacaoProdutoSerializer()
+        # nome normalizado -> id, carregado uma vez
+        self.categorias = dict(Categoria.objects.values_list('nome_normalizado', 'id'))
+        # nome normalizado -> nome, das categorias que o lote atual vai criar
+        self.categorias_novas = {}
+
+    def importar(self, linhas):
+        """
+        Importa as linhas de ler_csv/ler_jsonl e retorna o resumo:
+        processadas, importadas, total_erros, erros, segundos e
+        linhas_por_segundo.
+        """
+        self.resultado = {'processadas': 0, 'importadas': 0, 'total_erros': 0, 'erros': []}
+        inicio = time.perf_counter()
+        lote = []
+
+        try:
+            for numero, dados in linhas:
+                self.resultado['processadas'] += 1
+                item = self.montar_produto(numero, dados)
+                if item is not None:
+                    lote.append(item)
+                if len(lote) >= self.tamanho_lote:
+                    self.gravar(lote)
+                    lote = []
+            if lote:
+                self.gravar(lote)
+        finally:
+            # bulk_create não dispara post_save, então invalida uma vez aqui;
+            # no finally, para os lotes já gravados aparecerem mesmo se um
+            # lote seguinte (ou a leitura do arquivo) falhar
+            if self.resultado['importadas']:
+                invalidar_catalogo()
+
+        segundos = time.perf_counter() - inicio
+        self.resultado['segundos'] = round(segundos, 3)
+        self.resultado['linhas_por_segundo'] = (
+            round(self.resultado['processadas'] / segundos, 1) if segundos else 0.0
+        )
+        return self.resultado
+
+    def montar_produto(self, numero, dados):
+        """
+        Valida a linha e retorna (produto, categoria nova ou None), ou None
+        se a linha tem erro.
+        """
+        if dados is None:
+            self.registrar_erro(numero, {'linha': ['JSON inválido.']})
+            return None
+
+        # célula vazia no CSV equivale a campo não informado
+        dados = {
+            campo: valor for campo, valor in dados.items()
+            if campo is not None and valor not in ('', None)
+        }
+        try:
+            validados = self.validador.run_validation(dados)
+            chave = self.categoria(validados.pop('categoria', None))
+        except serializers.ValidationError as erro:
+            self.registrar_erro(numero, erro.detail)
+            return None
+        if chave in self.categorias_novas:
+            return Produto(**validados), chave
+        return Produto(categoria_id=self.categorias.get(chave), **validados), None
+
+    def categoria(self, nome):
+        """
+        Nome normalizado da categoria (None sem categoria). As que não
+        existem ficam em categorias_novas e só são criadas no gravar(), na
+        transação do lote: se o lote falhar, não sobram categorias vazias.
+        """
+        if not nome:
+            return None
+        chave = normalizar(nome)
+        if chave not in self.categorias and chave not in self.categorias_novas:
+            if not self.criar_categorias:
+                raise serializers.ValidationError({'categoria': [f'Categoria "{nome}" não existe.']})
+            self.categorias_novas[chave] = nome.strip()
+        return chave
+
+    def registrar_erro(self, numero, detalhe):
+        self.resultado['total_erros'] += 1
+        if len(self.resultado['erros']) < self.max_erros:
+            self.resultado['erros'].append({'linha': numero, 'erros': detalhe})
+
+    def gravar(self, lote):
+        """
+        Grava o lote de (produto, categoria nova) numa transação, junto com
+        as categorias novas.
+        """
+        novas, self.categorias_novas = self.categorias_novas, {}
+        with transaction.atomic():
+            criadas = {chave: Categoria.objects.create(nome=nome).id for chave, nome in novas.items()}
+            for produto, chave in lote:
+                if chave is not None:
+                    produto.categoria_id = criadas[chave]
+            Produto.objects.bulk_create([produto for produto, _ in lote])
+        # só depois do commit: com rollback, o id não existiria mais
+        self.categorias.update(criadas)
+        self.resultado['importadas'] += len(lote)
+        if self.progresso:
+            self.progresso(self.resultado)
@@ -0,0 +1,195 @@
+"""
+Leitura rápida das listagens: monta a resposta direto das linhas do
+values(), sem instanciar models nem passar pelo to_representation de
+cada campo do serializer.
+
+Os conversores de cada campo (Decimal -> texto, datetime -> ISO, caminho
+da imagem -> URL) são escolhidos uma vez por requisição a partir dos
+campos do próprio serializer, então o JSON sai idêntico ao do
+ProdutoSerializer (inclusive ?fields=/?omit=). Campos que não sabemos
+converter (ex.: ?expand=categoria) fazem a view voltar ao caminho normal.
+"""
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import empty
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+# marca de campo que não entra na resposta
+OMITIR = object()
+
+
+class _Linha(dict):
+    """
+    Linha do values() que também aceita linha.campo, para chamar os
+    get_<campo> dos SerializerMethodField.
+    """
+
+    def __getattr__(self, nome):
+        try:
+            return self[nome]
+        except KeyError:
+            raise AttributeError(nome)
+
+
+def _identidade(valor):
+    return valor
+
+
+def _conversor_decimal(campo):
+    coerce_to_string = getattr(campo, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or campo.localize or getattr(campo, 'normalize_output', False):
+        return None
+
+    def converter(valor):
+        return '{:f}'.format(campo.quantize(valor))
+    return converter
+
+
+def _conversor_data_hora(campo):
+    if getattr(campo, 'format', api_settings.DATETIME_FORMAT).lower() != ISO_8601:
+        return None
+    fuso = getattr(campo, 'timezone', campo.default_timezone())
+
+    def converter(valor):
+        if fuso is not None:
+            valor = valor.astimezone(fuso) if timezone.is_aware(valor) else timezone.make_aware(valor, fuso)
+        texto = valor.isoformat()
+        if texto.endswith('+00:00'):
+            texto = texto[:-6] + 'Z'
+        return texto
+    return converter
+
+
+def _conversor_arquivo(campo, campo_modelo, request):
+    if not getattr(campo, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+        return lambda valor: valor or None
+    storage = campo_modelo.storage
+
+    def converter(valor):
+        # arquivo vazio ('') sai como null, como no FileField
+        if not valor:
+            return None
+        url = storage.url(valor)
+        return request.build_absolute_uri(url) if request is not None else url
+    return converter
+
+
+class LeituraRapida:
+    """
+    Conversão das linhas do values() no mesmo formato do serializer.
+
+    Use LeituraRapida.compilar(serializer): retorna None se algum campo
+    não tiver conversor. `caminhos` são os campos a pedir no values().
+    """
+
+    def __init__(self, campos, caminhos):
+        # [(nome na resposta, caminho no values(), conversor, nome do método,
+        #   relação no caminho, valor quando a relação é nula)]
+        self.campos = campos
+        self.caminhos = caminhos
+
+    @classmethod
+    def compilar(cls, serializer):
+        model = serializer.Meta.model
+        request = serializer.context.get('request')
+        metodos_rapidos = getattr(serializer, 'campos_rapidos', {})
+        campos, caminhos = [], set()
+
+        for nome, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            if isinstance(campo, serializers.SerializerMethodField):
+                if nome not in metodos_rapidos:
+                    return None
+                caminhos.update(metodos_rapidos[nome])
+                campos.append((nome, None, None, campo.method_name, None, None))
+                continue
+
+            caminho = campo.source.replace('.', '__')
+            if isinstance(campo, (serializers.BaseSerializer, serializers.HyperlinkedRelatedField)):
+                return None
+            if isinstance(campo, serializers.PrimaryKeyRelatedField):
+                if campo.pk_field is not None:
+                    return None
+                conversor = _identidade
+            elif isinstance(campo, serializers.DecimalField):
+                conversor = _conversor_decimal(campo)
+            elif isinstance(campo, serializers.DateTimeField):
+                conversor = _conversor_data_hora(campo)
+            elif isinstance(campo, serializers.FileField):
+                conversor = _conversor_arquivo(campo, model._meta.get_field(campo.source), request)
+            elif isinstance(campo, (serializers.CharField, serializers.IntegerField,
+                                    serializers.BooleanField, serializers.ReadOnlyField)):
+                conversor = _identidade
+            else:
+                return None
+            if conversor is None:
+                return None
+            if '__' in caminho:
+                # relação nula (ex.: produto sem categoria): o serializer
+                # devolve null ou omite o campo
+                if campo.default is not empty:
+                    return None
+                relacao = caminho.split('__')[0]
+                caminhos.add(relacao)
+                sem_relacao = None if campo.allow_null else OMITIR
+            else:
+                relacao = sem_relacao = None
+            campos.append((nome, caminho, conversor, None, relacao, sem_relacao))
+            caminhos.add(caminho)
+
+        return cls(campos, sorted(caminhos))
+
+    def converter(self, linhas, serializer):
+        """
+        Converte as linhas do values(). Os SerializerMethodField chamam o
+        get_<campo> do `serializer` informado (o que tem o contexto da
+        página, ex.: favoritos_ids).
+        """
+        metodos = {
+            campo[3]: getattr(serializer, campo[3]) for campo in self.campos if campo[3]
+        }
+        resultado = []
+        for linha in linhas:
+            item = {}
+            for nome, caminho, conversor, metodo, relacao, sem_relacao in self.campos:
+                if metodo is not None:
+                    item[nome] = metodos[metodo](_Linha(linha))
+                    continue
+                if relacao is not None and linha[relacao] is None:
+                    if sem_relacao is not OMITIR:
+                        item[nome] = sem_relacao
+                    continue
+                valor = linha[caminho]
+                item[nome] = None if valor is None else conversor(valor)
+            resultado.append(item)
+        return resultado
+
+
+class LeituraRapidaMixin:
+    """
+    Mixin para ViewSets: o list lê values() e usa a LeituraRapida quando
+    todos os campos do serializer têm conversor; senão segue o list normal.
+    """
+    leitura_rapida = True
+
+    def list(self, request, *args, **kwargs):
+        rapida = LeituraRapida.compilar(self.get_serializer()) if self.leitura_rapida else None
+        if rapida is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # os campos da ordenação vão junto: o cursor da paginação usa
+        sempre_lidos = getattr(self, 'campos_sempre_lidos', tuple)()
+        linhas = queryset.values(*dict.fromkeys([*rapida.caminhos, *sempre_lidos]))
+
+        page = self.paginate_queryset(linhas)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(rapida.converter(page, serializer.child))
+
+        linhas = list(linhas)
+        serializer = self.get_serializer(linhas, many=True)
+        return Response(rapida.converter(linhas, serializer.child))
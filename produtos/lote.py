@@ -0,0 +1,75 @@
+"""
+Alteração e soft delete de produtos em lote.
+
+Em vez de um get_object() + save() por produto, os IDs são conferidos com
+um SELECT e alterados com UPDATEs por conjunto (WHERE id IN (...)), em
+blocos para não passar do limite de parâmetros do SQLite. IDs que pedem
+as mesmas alterações vão no mesmo UPDATE.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import invalidar_catalogo
+from .models import Produto
+
+# IDs por SELECT/UPDATE (o SQLite antigo aceita no máximo 999 parâmetros)
+TAMANHO_BLOCO = 500
+
+
+def blocos(ids, tamanho=TAMANHO_BLOCO):
+    for inicio in range(0, len(ids), tamanho):
+        yield ids[inicio:inicio + tamanho]
+
+
+def ids_existentes(queryset, ids):
+    """
+    Quais dos IDs pedidos estão no queryset (ex.: os produtos ativos).
+    """
+    encontrados = set()
+    for bloco in blocos(ids):
+        encontrados.update(queryset.filter(id__in=bloco).values_list('id', flat=True))
+    return encontrados
+
+
+def atualizar_produtos(queryset, alteracoes_por_id):
+    """
+    Aplica as alterações já validadas, {id: {campo: valor}}, nos produtos
+    do queryset, preenchendo `atualizado` (o update() não passa pelo
+    auto_now). Retorna {id: 'atualizado' ou 'nao_encontrado'}.
+    """
+    ids = list(alteracoes_por_id)
+    encontrados = ids_existentes(queryset, ids)
+
+    # agrupa os IDs que recebem exatamente as mesmas alterações
+    grupos = {}
+    for id_produto in ids:
+        if id_produto in encontrados:
+            chave = tuple(sorted(alteracoes_por_id[id_produto].items()))
+            grupos.setdefault(chave, []).append(id_produto)
+
+    agora = timezone.now()
+    with transaction.atomic():
+        for chave, ids_grupo in grupos.items():
+            for bloco in blocos(ids_grupo):
+                Produto.objects.filter(id__in=bloco).update(**dict(chave), atualizado=agora)
+
+    if encontrados:
+        # update() não dispara post_save, então invalida o cache aqui
+        invalidar_catalogo()
+    return {
+        id_produto: 'atualizado' if id_produto in encontrados else 'nao_encontrado'
+        for id_produto in ids
+    }
+
+
+def desativar_produtos(queryset, ids):
+    """
+    Soft delete em lote, como o perform_destroy: marca ativo=False.
+    Retorna {id: 'desativado' ou 'nao_encontrado'}.
+    """
+    return {
+        id_produto: 'desativado' if resultado == 'atualizado' else resultado
+        for id_produto, resultado in atualizar_produtos(
+            queryset, {id_produto: {'ativo': False} for id_produto in ids}
+        ).items()
+    }
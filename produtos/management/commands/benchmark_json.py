@@ -0,0 +1,73 @@
+# para rodar o comando: python manage.py benchmark_json
+# ou: python manage.py benchmark_json --produtos 1000 --repeticoes 50
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from docelar.renderers import JSONRapidoRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = 'Compara o JSONRenderer do DRF com o JSONRapidoRenderer numa página de produtos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type=int, default=1000, help='Produtos no payload')
+        parser.add_argument('--repeticoes', type=int, default=50)
+
+    def handle(self, *args, **options):
+        """
+        Monta um payload no formato da listagem de produtos (com preço em
+        Decimal e datas com fuso) e mede quantos produtos por segundo cada
+        renderer converte em JSON. Confere antes que as saídas são iguais.
+        """
+        payload = self.payload(options['produtos'])
+        repeticoes = options['repeticoes']
+
+        padrao, rapido = JSONRenderer(), JSONRapidoRenderer()
+        if padrao.render(payload) != rapido.render(payload):
+            raise CommandError('Os dois renderers geraram JSON diferente.')
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson não instalado: o renderer rápido usa o json padrão.'))
+
+        tamanho = len(padrao.render(payload))
+        self.stdout.write(f"Payload: {options['produtos']} produtos, {tamanho / 1024:.0f} KiB")
+        taxa_padrao = self.medir(padrao, payload, repeticoes)
+        taxa_rapido = self.medir(rapido, payload, repeticoes)
+        self.stdout.write(f'JSONRenderer (json):       {taxa_padrao:>12,.0f} produtos/s')
+        self.stdout.write(f'JSONRapidoRenderer:        {taxa_rapido:>12,.0f} produtos/s')
+        self.stdout.write(self.style.SUCCESS(f'Ganho: {taxa_rapido / taxa_padrao:.1f}x'))
+
+    def medir(self, renderer, payload, repeticoes):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            renderer.render(payload)
+        return len(payload['results']) * repeticoes / (time.perf_counter() - inicio)
+
+    def payload(self, quantidade):
+        agora = timezone.now()
+        return {
+            'count': quantidade,
+            'next': None,
+            'previous': None,
+            'results': [
+                {
+                    'id': i,
+                    'categoria_nome': 'Eletrônicos',
+                    'is_favorito': i % 7 == 0,
+                    'nome': f'Produto {i} com acentuação',
+                    'marca': 'Marca',
+                    'preco': Decimal(f'{i % 5000}.90'),
+                    'descricao': 'Descrição do produto com mais de vinte caracteres. ' * 3,
+                    'imagem': f'http://localhost:8000/media/produtos/{i}.jpg',
+                    'ativo': True,
+                    'criado': agora - timedelta(days=i),
+                    'atualizado': agora,
+                    'categoria': 1,
+                }
+                for i in range(1, quantidade + 1)
+            ],
+        }
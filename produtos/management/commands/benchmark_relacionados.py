@@ -0,0 +1,93 @@
+# para rodar o comando: python manage.py benchmark_relacionados
+# ou: python manage.py benchmark_relacionados --usuarios 100000 --produtos 100000 --favoritos 20
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from produtos import relacionados
+from produtos.relacionados import np
+
+
+class Command(BaseCommand):
+    help = 'Mede o cálculo de produtos relacionados com favoritos sintéticos (em memória, sem banco)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=100_000)
+        parser.add_argument('--produtos', type=int, default=100_000)
+        parser.add_argument('--favoritos', type=int, default=20, help='Média de favoritos por usuário')
+        parser.add_argument('--alterados', type=float, default=1.0,
+                            help='Porcentagem de produtos recalculados na atualização incremental')
+        parser.add_argument('--k', type=int, default=relacionados.K)
+        parser.add_argument('--bloco', type=int, default=relacionados.TAMANHO_BLOCO)
+        parser.add_argument('--semente', type=int, default=42)
+
+    def handle(self, *args, **options):
+        """
+        Sorteia favoritos com popularidade de cauda longa (poucos produtos
+        com muitos favoritos) e mede: montagem da matriz, cálculo completo
+        e cálculo só dos produtos alterados, com o pico de memória de cada
+        etapa. Confere que o incremental dá o mesmo que o completo.
+        """
+        if not relacionados.dependencias_instaladas():
+            raise CommandError('numpy e scipy são necessários: pip install numpy scipy')
+        rng = np.random.default_rng(options['semente'])
+        usuarios, produtos = self.favoritos_sinteticos(rng, options['usuarios'], options['produtos'],
+                                                       options['favoritos'])
+        self.stdout.write(f"{options['usuarios']:,} usuários × {options['produtos']:,} produtos, "
+                          f'{len(usuarios):,} favoritos sorteados')
+        k, bloco = options['k'], options['bloco']
+
+        (matriz, ids_produtos), segundos, pico = self.medir(
+            lambda: relacionados.matriz_favoritos(usuarios, produtos))
+        self.linha('Matriz esparsa', segundos, pico, f'{matriz.nnz:,} favoritos únicos')
+
+        def completo():
+            return self.juntar(relacionados.vizinhos(matriz, ids_produtos, k=k, tamanho_bloco=bloco))
+        resultado, segundos, pico = self.medir(completo)
+        self.linha('Completo', segundos, pico, f'{len(ids_produtos) / segundos:,.0f} produtos/s, '
+                                               f'{len(resultado[0]):,} linhas')
+
+        # incremental: só os usuários dos produtos alterados, com o total de
+        # favoritos de cada produto vindo de fora (como no banco)
+        quantidade = max(1, int(len(ids_produtos) * options['alterados'] / 100))
+        colunas = np.sort(rng.choice(len(ids_produtos), size=quantidade, replace=False))
+        contagens = np.asarray(matriz.sum(axis=0)).ravel()
+
+        def incremental():
+            linhas = np.unique(matriz.tocsc()[:, colunas].indices)
+            parcial = matriz[linhas]
+            return self.juntar(relacionados.vizinhos(parcial, ids_produtos, colunas, contagens, k, bloco))
+        parcial, segundos, pico = self.medir(incremental)
+        self.linha(f'Incremental ({quantidade:,})', segundos, pico, f'{quantidade / segundos:,.0f} produtos/s')
+
+        esperado = np.isin(resultado[0], ids_produtos[colunas])
+        if not all(np.array_equal(a[esperado], b) for a, b in zip(resultado[:3], parcial[:3])) \
+                or not np.allclose(resultado[3][esperado], parcial[3]):
+            raise CommandError('O cálculo incremental deu resultado diferente do completo.')
+        self.stdout.write(self.style.SUCCESS('Incremental confere com o completo.'))
+
+    def favoritos_sinteticos(self, rng, total_usuarios, total_produtos, media):
+        # popularidade ~ 1 / (posição + 10) ** 0.9
+        pesos = 1 / (np.arange(total_produtos) + 10) ** 0.9
+        pesos /= pesos.sum()
+        por_usuario = np.maximum(rng.poisson(media, size=total_usuarios), 1)
+        usuarios = np.repeat(np.arange(total_usuarios), por_usuario)
+        produtos = rng.choice(total_produtos, size=len(usuarios), p=pesos)
+        # ids embaralhados: o mais popular não é o produto 1
+        return usuarios, rng.permutation(total_produtos)[produtos] + 1
+
+    def juntar(self, blocos):
+        return tuple(np.concatenate(partes) for partes in zip(*blocos))
+
+    def medir(self, funcao):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        segundos = time.perf_counter() - inicio
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return resultado, segundos, pico
+
+    def linha(self, etapa, segundos, pico, detalhe):
+        self.stdout.write(f'{etapa:<22} {segundos:>7.2f}s  pico {pico / 2 ** 20:>7.0f} MiB  {detalhe}')
@@ -0,0 +1,80 @@
+# para rodar o comando: python manage.py benchmark_serializacao
+# ou: python manage.py benchmark_serializacao --tamanhos 10,100,1000 --repeticoes 20
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from produtos.leitura_rapida import LeituraRapida
+from produtos.models import Produto
+from produtos.serializers import ProdutoSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compara linhas/s do ProdutoSerializer com a leitura rápida (values())'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanhos', default='10,100,1000', help='Tamanhos de página, separados por vírgula')
+        parser.add_argument('--repeticoes', type=int, default=10)
+
+    def handle(self, *args, **options):
+        """
+        Para cada tamanho de página, lê e serializa os produtos pelos dois
+        caminhos e mostra linhas/s de cada um. Se o banco tiver menos
+        produtos que o maior tamanho, cria produtos de teste numa transação
+        que é desfeita no final.
+        """
+        try:
+            tamanhos = [int(t) for t in options['tamanhos'].split(',') if t.strip()]
+        except ValueError:
+            raise CommandError('Use --tamanhos com números separados por vírgula, ex.: 10,100,1000')
+        repeticoes = options['repeticoes']
+
+        request = Request(APIRequestFactory().get('/produtos/', HTTP_HOST='localhost'))
+        contexto = {'request': request, 'favoritos_ids': set()}
+
+        with transaction.atomic():
+            self.garantir_produtos(max(tamanhos))
+            rapida = LeituraRapida.compilar(ProdutoSerializer(context=contexto))
+            queryset = Produto.objects.ativos().order_by('nome', 'id')
+
+            self.stdout.write(f"{'página':>8} {'serializer (linhas/s)':>22} {'rápida (linhas/s)':>18} {'ganho':>7}")
+            for tamanho in tamanhos:
+                def normal():
+                    produtos = list(queryset.para_listagem()[:tamanho])
+                    return ProdutoSerializer(produtos, many=True, context=contexto).data
+
+                def leitura_rapida():
+                    linhas = list(queryset.values(*rapida.caminhos)[:tamanho])
+                    return rapida.converter(linhas, ProdutoSerializer(context=contexto))
+
+                if JSONRenderer().render(normal()) != JSONRenderer().render(leitura_rapida()):
+                    raise CommandError(f'As duas saídas diferem na página de {tamanho}.')
+
+                taxa_normal = self.medir(normal, tamanho, repeticoes)
+                taxa_rapida = self.medir(leitura_rapida, tamanho, repeticoes)
+                self.stdout.write(
+                    f'{tamanho:>8} {taxa_normal:>22,.0f} {taxa_rapida:>18,.0f} {taxa_rapida / taxa_normal:>6.1f}x'
+                )
+
+            # desfaz os produtos de teste
+            transaction.set_rollback(True)
+
+    def medir(self, funcao, tamanho, repeticoes):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao()
+        return tamanho * repeticoes / (time.perf_counter() - inicio)
+
+    def garantir_produtos(self, quantidade):
+        faltam = quantidade - Produto.objects.ativos().count()
+        if faltam > 0:
+            self.stdout.write(f'Criando {faltam} produtos de teste (desfeitos no final)...')
+            Produto.objects.bulk_create(
+                Produto(nome=f'Produto de teste {i}', marca='Marca', preco=f'{i % 5000}.90',
+                        descricao='Produto criado só para o benchmark de serialização')
+                for i in range(faltam)
+            )
@@ -0,0 +1,39 @@
+# para rodar o comando: python manage.py calcular_relacionados_conteudo
+# rodar periodicamente, ex. no cron a cada 15 minutos e completo de madrugada:
+# */15 * * * * cd /caminho/do/projeto && python manage.py calcular_relacionados_conteudo
+# 0 4 * * * cd /caminho/do/projeto && python manage.py calcular_relacionados_conteudo --completo
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from produtos import conteudo, relacionados
+
+
+class Command(BaseCommand):
+    help = 'Calcula os produtos de GET /produtos/{id}/relacionados/?modo=conteudo pelo texto (TF-IDF)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true',
+                            help='Refaz o vocabulário e recalcula todos os produtos')
+        parser.add_argument('--k', type=int, default=conteudo.K,
+                            help='Relacionados guardados por produto')
+        parser.add_argument('--bloco', type=int, default=conteudo.TAMANHO_BLOCO,
+                            help='Produtos calculados por multiplicação de matrizes')
+
+    def handle(self, *args, **options):
+        """
+        Sem --completo, recalcula só os produtos criados ou editados depois
+        da última execução, com o vocabulário já gravado.
+        """
+        if not relacionados.dependencias_instaladas():
+            raise CommandError('numpy e scipy são necessários: pip install numpy scipy')
+        if options['k'] < 1 or options['bloco'] < 1:
+            raise CommandError('--k e --bloco devem ser maiores que zero.')
+
+        inicio = time.perf_counter()
+        total = conteudo.atualizar(
+            completo=options['completo'], k=options['k'], tamanho_bloco=options['bloco'],
+            progresso=lambda feitos, total: self.stdout.write(f'{feitos}/{total} produtos'),
+        )
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{total} produtos recalculados em {segundos:.1f}s'))
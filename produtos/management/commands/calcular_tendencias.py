@@ -0,0 +1,35 @@
+# para rodar o comando: python manage.py calcular_tendencias
+# rodar periodicamente, ex. no cron a cada 5 minutos:
+# */5 * * * * cd /caminho/do/projeto && python manage.py calcular_tendencias
+import time
+
+from django.core.management.base import BaseCommand
+
+from produtos import tendencias
+
+
+class Command(BaseCommand):
+    help = 'Soma os eventos de favorito novos nas pontuações de GET /produtos/em-alta/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=tendencias.TAMANHO_LOTE,
+                            help='Eventos somados por transação')
+        parser.add_argument('--reiniciar', action='store_true',
+                            help='Apaga as pontuações e recalcula a partir do primeiro evento')
+
+    def handle(self, *args, **options):
+        """
+        Continua do último evento processado (checkpoint); cada lote grava
+        as pontuações e o checkpoint juntos, então parar no meio não soma
+        nada duas vezes.
+        """
+        if options['reiniciar']:
+            tendencias.reiniciar()
+            self.stdout.write('Pontuações apagadas; recalculando desde o primeiro evento.')
+
+        inicio = time.perf_counter()
+        total = tendencias.processar_eventos(
+            options['lote'], progresso=lambda total: self.stdout.write(f'{total} eventos processados')
+        )
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'{total} eventos novos somados em {segundos:.1f}s'))
@@ -0,0 +1,90 @@
+# para rodar o comando: python manage.py gerar_variantes_imagens
+# ou: python manage.py gerar_variantes_imagens --todos --processos 4
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from produtos.cache import invalidar_catalogo
+from produtos.imagens import gerar_variantes
+from produtos.models import Produto
+
+
+def _iniciar_processo():
+    # com "spawn" (Windows/macOS) o processo filho começa sem o Django carregado
+    django.setup()
+
+
+def _gerar(nome_imagem):
+    try:
+        return nome_imagem, gerar_variantes(nome_imagem), None
+    except Exception as erro:  # arquivo sumido, imagem corrompida...
+        return nome_imagem, None, f'{type(erro).__name__}: {erro}'
+
+
+class Command(BaseCommand):
+    help = 'Gera as variantes (thumb/card/full) das imagens de produtos já cadastradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true',
+                            help='Regera também as imagens que já têm variantes')
+        parser.add_argument('--processos', type=int, default=os.cpu_count() or 1,
+                            help='Processos em paralelo (padrão: número de CPUs)')
+        parser.add_argument('--lote', type=int, default=100, help='Produtos gravados por UPDATE')
+
+    def handle(self, *args, **options):
+        """
+        Redimensiona as imagens em vários processos (o Pillow usa CPU) e
+        grava o resultado no banco em lotes, pelo processo principal.
+        """
+        produtos = Produto.objects.exclude(imagem='').exclude(imagem__isnull=True)
+        if not options['todos']:
+            produtos = produtos.filter(imagem_variantes={})
+        # produtos com a mesma foto têm o mesmo arquivo: cada imagem é
+        # processada uma vez só
+        pendentes = defaultdict(list)
+        for id_produto, imagem in produtos.values_list('id', 'imagem'):
+            pendentes[imagem].append(id_produto)
+        if not pendentes:
+            self.stdout.write('Nenhuma imagem sem variantes.')
+            return
+
+        self.stdout.write(f"Gerando variantes de {len(pendentes)} imagens com {options['processos']} processos...")
+        inicio = time.perf_counter()
+        lote, geradas, erros = [], 0, 0
+
+        # os processos filhos não podem herdar a conexão aberta com o banco
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['processos'], initializer=_iniciar_processo) as executor:
+            tarefas = [executor.submit(_gerar, imagem) for imagem in pendentes]
+            for tarefa in as_completed(tarefas):
+                imagem, variantes, erro = tarefa.result()
+                if erro:
+                    erros += 1
+                    ids = ', '.join(map(str, pendentes[imagem]))
+                    self.stderr.write(f'{imagem} (produtos {ids}): {erro}')
+                    continue
+                lote.extend(Produto(id=id_produto, imagem_variantes=variantes) for id_produto in pendentes[imagem])
+                if len(lote) >= options['lote']:
+                    geradas += self.gravar(lote)
+                    lote = []
+        if lote:
+            geradas += self.gravar(lote)
+
+        if geradas:
+            # bulk_update não dispara post_save
+            invalidar_catalogo()
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(pendentes) - erros} imagens processadas para {geradas} produtos ({erros} erros) '
+            f'em {segundos:.1f}s - {(len(pendentes) - erros) / segundos:.1f} imagens/s'
+        ))
+
+    def gravar(self, lote):
+        Produto.objects.bulk_update(lote, ['imagem_variantes'])
+        self.stdout.write(f'{len(lote)} produtos atualizados')
+        return len(lote)
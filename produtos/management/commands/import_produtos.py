@@ -0,0 +1,62 @@
+# para rodar o comando: python manage.py import_produtos catalogo.csv
+# ou: cat catalogo.jsonl | python manage.py import_produtos - --formato jsonl
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from produtos.importacao import FORMATOS, ImportadorProdutos, formato_do_arquivo, ler_linhas
+
+
+class Command(BaseCommand):
+    help = 'Importa produtos de um arquivo CSV ou JSON Lines, em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo ou "-" para ler da entrada padrão')
+        parser.add_argument('--formato', choices=FORMATOS, help='Padrão: deduzido pela extensão')
+        parser.add_argument('--lote', type=int, default=1000, help='Produtos por INSERT/transação')
+        parser.add_argument('--sem-criar-categorias', action='store_true',
+                            help='Trata categoria inexistente como erro em vez de criá-la')
+        parser.add_argument('--max-erros', type=int, default=100,
+                            help='Quantos erros detalhados mostrar no final')
+
+    def handle(self, *args, **options):
+        """
+        Lê o arquivo linha a linha, valida cada produto com as regras do
+        ProdutoSerializer e grava em lotes com bulk_create, mostrando o
+        progresso a cada lote e a velocidade (linhas/s) no final.
+        """
+        caminho = options['arquivo']
+        formato = options['formato'] or formato_do_arquivo(caminho)
+        if formato is None:
+            raise CommandError('Não foi possível deduzir o formato; use --formato csv ou jsonl.')
+
+        importador = ImportadorProdutos(
+            tamanho_lote=options['lote'],
+            criar_categorias=not options['sem_criar_categorias'],
+            max_erros=options['max_erros'],
+            progresso=self.mostrar_progresso,
+        )
+
+        if caminho == '-':
+            resultado = importador.importar(ler_linhas(sys.stdin, formato))
+        else:
+            try:
+                with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+                    resultado = importador.importar(ler_linhas(arquivo, formato))
+            except OSError as erro:
+                raise CommandError(f'Não foi possível abrir {caminho}: {erro}')
+
+        for erro in resultado['erros']:
+            self.stderr.write(f"Linha {erro['linha']}: {erro['erros']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importados {resultado['importadas']} de {resultado['processadas']} produtos "
+            f"({resultado['total_erros']} erros) em {resultado['segundos']}s "
+            f"- {resultado['linhas_por_segundo']} linhas/s"
+        ))
+
+    def mostrar_progresso(self, resultado):
+        self.stdout.write(
+            f"{resultado['processadas']} linhas lidas, {resultado['importadas']} importadas, "
+            f"{resultado['total_erros']} erros"
+        )
@@ -0,0 +1,67 @@
+# para rodar o comando: python manage.py limpar_midia --simular
+# ou: python manage.py limpar_midia --apagar-imagens-de-inativos
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from produtos.models import Produto
+
+
+class Command(BaseCommand):
+    help = 'Apaga as imagens (e variantes) de produtos que nenhum produto usa mais'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Só lista o que seria apagado')
+        parser.add_argument('--idade-minima', type=int, default=60,
+                            help='Minutos desde a gravação antes de um arquivo poder ser apagado')
+        parser.add_argument('--apagar-imagens-de-inativos', action='store_true',
+                            help='ATENÇÃO: tira a imagem dos produtos desativados (soft delete) e apaga '
+                                 'os arquivos; reativar o produto não traz a imagem de volta')
+
+    def handle(self, *args, **options):
+        """
+        Junta os nomes usados em Produto.imagem e imagem_variantes e apaga
+        os outros arquivos da pasta de imagens. Arquivos gravados há menos
+        de --idade-minima minutos ficam: podem ser de um upload cujo produto
+        ainda não foi salvo. Produtos desativados continuam usando as suas
+        imagens (podem ser reativados), a não ser com
+        --apagar-imagens-de-inativos.
+        """
+        campo = Produto._meta.get_field('imagem')
+        storage = campo.storage
+
+        if options['apagar_imagens_de_inativos'] and not options['simular']:
+            liberados = Produto.objects.filter(ativo=False).exclude(imagem='').exclude(imagem__isnull=True)
+            total = liberados.update(imagem='', imagem_variantes={})
+            self.stdout.write(f'{total} produtos desativados ficaram sem imagem')
+
+        usados = set()
+        produtos = Produto.objects.all()
+        if options['apagar_imagens_de_inativos']:
+            produtos = produtos.filter(ativo=True)
+        for imagem, variantes in produtos.values_list('imagem', 'imagem_variantes').iterator(chunk_size=2000):
+            if imagem:
+                usados.add(imagem)
+            for formatos in (variantes or {}).values():
+                usados.update(formatos.values())
+
+        limite = timezone.now() - timedelta(minutes=options['idade_minima'])
+        pasta = campo.upload_to.strip('/')
+        apagados, liberados_bytes = 0, 0
+        for nome in storage.arquivos(pasta):
+            if nome in usados or storage.get_modified_time(nome) > limite:
+                continue
+            tamanho = storage.size(nome)
+            if options['simular']:
+                self.stdout.write(f'Apagaria {nome} ({tamanho} bytes)')
+            else:
+                storage.delete(nome)
+            apagados += 1
+            liberados_bytes += tamanho
+
+        verbo = 'seriam apagados' if options['simular'] else 'apagados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{apagados} arquivos {verbo} ({liberados_bytes / 1024 / 1024:.1f} MiB), '
+            f'{len(usados)} em uso'
+        ))
@@ -0,0 +1,16 @@
+# para rodar o comando: python manage.py recontar_favoritos
+from django.core.management.base import BaseCommand
+
+from produtos.favoritos import recontar_favoritos
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Produto.total_favoritos a partir da tabela de favoritos'
+
+    def handle(self, *args, **options):
+        """
+        Corrige o contador num UPDATE só (ex.: depois de alterar a tabela de
+        favoritos por SQL ou de um delete() em massa de usuários).
+        """
+        corrigidos = recontar_favoritos()
+        self.stdout.write(self.style.SUCCESS(f'{corrigidos} produtos com total_favoritos corrigido'))
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def criar_indice(apps, schema_editor):
+    from produtos.busca import criar_indice
+    criar_indice(schema_editor.connection)
+
+
+def remover_indice(apps, schema_editor):
+    from produtos.busca import remover_indice
+    remover_indice(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    """
+    Índice de busca textual (FTS5 no SQLite, GIN/tsvector no PostgreSQL)
+    sobre nome, marca e descrição, já populado com os produtos existentes.
+    """
+
+    dependencies = [
+        ('produtos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
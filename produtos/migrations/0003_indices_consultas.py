@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:10
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0002_busca_textual'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['nome', 'id'], name='produtos_ativo_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(django.db.models.functions.text.Lower('marca'), models.F('nome'), models.F('id'), condition=models.Q(('ativo', True)), name='produtos_ativo_marca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['categoria', 'nome', 'id'], name='produtos_ativo_cat_nome_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0004_categoria_atualizado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['preco', 'id'], name='produtos_ativo_preco_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['criado', 'id'], name='produtos_ativo_criado_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:17
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalizar(texto):
+    # cópia de produtos.normalizacao.normalizar, congelada para a migration
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def preencher(apps, schema_editor):
+    Categoria = apps.get_model('produtos', 'Categoria')
+    Produto = apps.get_model('produtos', 'Produto')
+
+    categorias = list(Categoria.objects.only('id', 'nome'))
+    for categoria in categorias:
+        categoria.nome_normalizado = normalizar(categoria.nome)
+    Categoria.objects.bulk_update(categorias, ['nome_normalizado'], batch_size=500)
+
+    produtos = Produto.objects.only('id', 'nome', 'marca').order_by('id')
+    lote = []
+    for produto in produtos.iterator(chunk_size=2000):
+        produto.nome_normalizado = normalizar(produto.nome)
+        produto.marca_normalizada = normalizar(produto.marca)
+        lote.append(produto)
+        if len(lote) == 2000:
+            Produto.objects.bulk_update(lote, ['nome_normalizado', 'marca_normalizada'])
+            lote = []
+    Produto.objects.bulk_update(lote, ['nome_normalizado', 'marca_normalizada'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0005_indices_ordenacao'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='produtos_ativo_marca_idx',
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='nome_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='marca_normalizada',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='produto',
+            name='nome_normalizado',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(preencher, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['marca_normalizada', 'nome', 'id'], name='produtos_ativo_marca_norm_idx'),
+        ),
+    ]
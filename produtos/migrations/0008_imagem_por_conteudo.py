@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:39
+
+import produtos.armazenamento
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0007_imagem_variantes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='produto',
+            name='imagem',
+            field=models.ImageField(blank=True, null=True, storage=produtos.armazenamento.ArmazenamentoPorConteudo(), upload_to='produtos/'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def contar(apps, schema_editor):
+    Produto = apps.get_model('produtos', 'Produto')
+    Favorito = apps.get_model('usuarios', 'Usuario').favoritos.through
+    total = (
+        Favorito.objects.filter(produto_id=OuterRef('pk')).order_by()
+        .values('produto_id').annotate(total=Count('*')).values('total')
+    )
+    Produto.objects.update(total_favoritos=Coalesce(Subquery(total), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0008_imagem_por_conteudo'),
+        ('usuarios', '0004_favoritos_indice_produto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='total_favoritos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['-total_favoritos', 'id'], name='produtos_ativo_favoritos_idx'),
+        ),
+        migrations.RunPython(contar, migrations.RunPython.noop),
+    ]
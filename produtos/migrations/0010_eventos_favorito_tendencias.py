@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0009_total_favoritos'),
+        ('usuarios', '0005_favorito'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Checkpoint',
+            fields=[
+                ('nome', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('referencia', models.DateTimeField(blank=True, null=True)),
+                ('atualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TendenciaProduto',
+            fields=[
+                ('produto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tendencia', serialize=False, to='produtos.produto')),
+                ('pontuacao', models.FloatField(default=0)),
+            ],
+            options={
+                'db_table': 'produtos_tendencias',
+                'indexes': [models.Index(fields=['-pontuacao'], name='produtos_tendencia_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='EventoFavorito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.SmallIntegerField(choices=[(1, 'Favoritou'), (-1, 'Desfavoritou')])),
+                ('criado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='produtos.produto')),
+                ('usuario', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='usuarios.usuario')),
+            ],
+            options={
+                'verbose_name': 'Evento de favorito',
+                'verbose_name_plural': 'Eventos de favorito',
+                'db_table': 'produtos_eventos_favorito',
+                'indexes': [models.Index(fields=['produto', 'criado'], name='produtos_evento_prod_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0010_eventos_favorito_tendencias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProdutoRelacionado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao', models.PositiveSmallIntegerField()),
+                ('pontuacao', models.FloatField()),
+                ('produto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='produtos.produto')),
+                ('relacionado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relacionado_em', to='produtos.produto')),
+            ],
+            options={
+                'db_table': 'produtos_relacionados',
+                'unique_together': {('produto', 'posicao')},
+            },
+        ),
+    ]
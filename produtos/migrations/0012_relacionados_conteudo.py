@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0011_produtos_relacionados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermoConteudo',
+            fields=[
+                ('termo', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('idf', models.FloatField()),
+            ],
+            options={
+                'db_table': 'produtos_termos_conteudo',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='produtorelacionado',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='produtorelacionado',
+            name='modo',
+            field=models.SmallIntegerField(choices=[(1, 'Favoritos em comum'), (2, 'Nome, marca e descrição')], default=1),
+        ),
+        migrations.AlterUniqueTogether(
+            name='produtorelacionado',
+            unique_together={('produto', 'modo', 'posicao')},
+        ),
+    ]
@@ -1,11 +1,86 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from .armazenamento import ArmazenamentoPorConteudo
+from .normalizacao import normalizar
 
 # Create your models here.
 
+
+class NormalizadoQuerySet(models.QuerySet):
+    """
+    Mantém as colunas normalizadas (ver Model.campos_normalizados) também
+    nas operações em lote, que não passam pelo save() do model.
+    """
+
+    def _campos_normalizados(self, campos):
+        mapa = self.model.campos_normalizados
+        return [mapa[campo] for campo in campos if campo in mapa]
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.normalizar_campos()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.normalizar_campos()
+        fields = list(fields) + self._campos_normalizados(fields)
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        # Só dá para normalizar valores literais; expressões (F(), Concat...)
+        # não passam por aqui e precisam atualizar a coluna por conta própria
+        for origem, destino in self.model.campos_normalizados.items():
+            if isinstance(kwargs.get(origem), str) and destino not in kwargs:
+                kwargs[destino] = normalizar(kwargs[origem])
+        return super().update(**kwargs)
+
+    update.alters_data = True
+
+
+class NormalizadoMixin(models.Model):
+    """
+    Model com colunas de busca normalizadas (sem acento, minúsculas), que
+    são preenchidas a partir dos campos de texto em todo save().
+
+    campos_normalizados = {'campo de texto': 'coluna normalizada'}
+    """
+    campos_normalizados = {}
+
+    class Meta:
+        abstract = True
+
+    def normalizar_campos(self):
+        for origem, destino in self.campos_normalizados.items():
+            setattr(self, destino, normalizar(getattr(self, origem)))
+
+    def save(self, *args, **kwargs):
+        self.normalizar_campos()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                destino for origem, destino in self.campos_normalizados.items()
+                if origem in update_fields
+            }
+        super().save(*args, **kwargs)
+
+
 # 15 pontos - categorias
-class Categoria(models.Model):
+class Categoria(NormalizadoMixin):
     nome = models.CharField(max_length=50, unique=True, verbose_name="Nome da Categoria")
     descricao = models.TextField(blank=True, null=True, verbose_name="Descrição")
+    # usado no Last-Modified/ETag de categorias e de produtos (categoria_nome)
+    atualizado = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+    # nome sem acentos/minúsculo, usado nos filtros (ver normalizacao.py)
+    nome_normalizado = models.CharField(max_length=255, default='', editable=False, db_index=True)
+
+    campos_normalizados = {'nome': 'nome_normalizado'}
+
+    objects = NormalizadoQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Categoria"
@@ -13,8 +88,35 @@ class Categoria(models.Model):
 
     def __str__(self):
         return self.nome
-    
-class Produto(models.Model):
+
+
+class ProdutoQuerySet(NormalizadoQuerySet):
+    """
+    Consultas de produto compartilhadas pela API e pelo admin.
+    """
+
+    def ativos(self):
+        """
+        Apenas produtos que não sofreram soft delete.
+        """
+        return self.filter(ativo=True)
+
+    def para_listagem(self):
+        """
+        Já traz a categoria no mesmo SELECT (usada em categoria_nome),
+        evitando uma consulta por produto, e adia as colunas que nenhum
+        serializer de produto usa.
+        """
+        return self.select_related('categoria').defer(
+            'nome_normalizado',
+            'marca_normalizada',
+            'categoria__descricao',
+            'categoria__nome_normalizado',
+            'categoria__atualizado',
+        )
+
+
+class Produto(NormalizadoMixin):
 
     # 15 pontos - categorias
     categoria = models.ForeignKey(
@@ -49,19 +151,85 @@ class Produto(models.Model):
     )
     # Campo para Upload de Imagem (Extra de 10pts)
     # Requer: pip install Pillow
-    imagem = models.ImageField(upload_to='produtos/', null=True, blank=True)
+    # Gravada pelo hash do conteúdo: a mesma foto em vários produtos é um
+    # arquivo só (ver armazenamento.py e o comando limpar_midia)
+    imagem = models.ImageField(upload_to='produtos/', storage=ArmazenamentoPorConteudo(), null=True, blank=True)
+    # Miniatura/card/tamanho cheio em WebP e JPEG (ver imagens.py)
+    imagem_variantes = models.JSONField(default=dict, blank=True, editable=False)
     # Campo para Soft Delete (Extra de 10pts)
     ativo = models.BooleanField(default=True)
+    # Quantos usuários favoritaram. Só muda por UPDATE com F() (ver
+    # favoritos.py e signals.py); recontar: python manage.py recontar_favoritos
+    total_favoritos = models.PositiveIntegerField(default=0, editable=False)
     
     # Campos de auditoria
     criado = models.DateTimeField(auto_now_add=True)
     atualizado = models.DateTimeField(auto_now=True)
 
+    # Versões sem acentos/minúsculas de nome e marca, usadas nos filtros
+    # (?marca=jbl audio encontra "JBL Áudio"); ver normalizacao.py. O
+    # ?nome= usa os índices de busca (ver busca.buscar_no_nome)
+    nome_normalizado = models.CharField(max_length=255, default='', editable=False)
+    marca_normalizada = models.CharField(max_length=255, default='', editable=False)
+
+    campos_normalizados = {'nome': 'nome_normalizado', 'marca': 'marca_normalizada'}
+
+    objects = ProdutoQuerySet.as_manager()
+
     class Meta:
         db_table = 'produtos'
         verbose_name = 'Produto'
         verbose_name_plural = 'Produtos'
         ordering = ['nome'] # Ordenação padrão
+        # Índices parciais (só produtos ativos), no formato das consultas da API:
+        # toda consulta filtra ativo=True e ordena por nome (com id de desempate)
+        indexes = [
+            models.Index(
+                fields=['nome', 'id'],
+                condition=Q(ativo=True),
+                name='produtos_ativo_nome_idx',
+            ),
+            # ?marca= compara pela marca normalizada
+            models.Index(
+                fields=['marca_normalizada', 'nome', 'id'],
+                condition=Q(ativo=True),
+                name='produtos_ativo_marca_norm_idx',
+            ),
+            models.Index(
+                fields=['categoria', 'nome', 'id'],
+                condition=Q(ativo=True),
+                name='produtos_ativo_cat_nome_idx',
+            ),
+            # ?ordering=preco/-preco e ?preco_min/?preco_max
+            models.Index(
+                fields=['preco', 'id'],
+                condition=Q(ativo=True),
+                name='produtos_ativo_preco_idx',
+            ),
+            # ?ordering=criado/-criado
+            models.Index(
+                fields=['criado', 'id'],
+                condition=Q(ativo=True),
+                name='produtos_ativo_criado_idx',
+            ),
+            # GET /produtos/mais-favoritados/
+            models.Index(
+                fields=['-total_favoritos', 'id'],
+                condition=Q(ativo=True),
+                name='produtos_ativo_favoritos_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Um save() completo gravaria o total_favoritos lido antes e
+        # perderia os favoritos feitos nesse meio tempo: ele fica de fora
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            adiados = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name != 'total_favoritos' and campo.attname not in adiados
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         """
@@ -70,4 +238,96 @@ class Produto(models.Model):
 
         :return: string
         """
-        return f'{self.nome} ({self.marca}) - R$ {self.preco}'
\ No newline at end of file
+        return f'{self.nome} ({self.marca}) - R$ {self.preco}'
+
+
+class EventoFavorito(models.Model):
+    """
+    Registro de cada vez que um produto foi favoritado ou desfavoritado.
+    Só recebe INSERTs (ver favoritos.py); o comando calcular_tendencias lê
+    os eventos novos pela ordem do id.
+    """
+    FAVORITOU = 1
+    DESFAVORITOU = -1
+    TIPOS = [(FAVORITOU, 'Favoritou'), (DESFAVORITOU, 'Desfavoritou')]
+
+    # o evento fica mesmo se o usuário for apagado
+    usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.SET_NULL, null=True, related_name='+')
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='+')
+    tipo = models.SmallIntegerField(choices=TIPOS)
+    criado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'produtos_eventos_favorito'
+        verbose_name = 'Evento de favorito'
+        verbose_name_plural = 'Eventos de favorito'
+        indexes = [
+            # histórico de um produto por período
+            models.Index(fields=['produto', 'criado'], name='produtos_evento_prod_idx'),
+        ]
+
+
+class TendenciaProduto(models.Model):
+    """
+    Pontuação "em alta" de um produto: soma dos eventos de favorito com
+    peso que cai pela metade a cada meia-vida (ver tendencias.py).
+    """
+    produto = models.OneToOneField(Produto, on_delete=models.CASCADE, primary_key=True, related_name='tendencia')
+    # valor na data de referência do Checkpoint 'tendencias'
+    pontuacao = models.FloatField(default=0)
+
+    class Meta:
+        db_table = 'produtos_tendencias'
+        indexes = [
+            models.Index(fields=['-pontuacao'], name='produtos_tendencia_idx'),
+        ]
+
+
+class Checkpoint(models.Model):
+    """
+    Até onde um processamento periódico já foi (ex.: último evento de
+    favorito somado nas tendências), para a próxima execução continuar dali.
+    """
+    nome = models.CharField(max_length=50, primary_key=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    referencia = models.DateTimeField(null=True, blank=True)
+    atualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.nome}: {self.ultimo_id}'
+
+
+class ProdutoRelacionado(models.Model):
+    """
+    Um dos K produtos mais parecidos com `produto`, pelos usuários que
+    favoritaram os dois ("quem favoritou este também favoritou",
+    relacionados.py) ou pelo texto (conteudo.py). Gravado só pelos comandos
+    calcular_relacionados e calcular_relacionados_conteudo.
+    """
+    FAVORITOS = 1
+    CONTEUDO = 2
+    MODOS = [(FAVORITOS, 'Favoritos em comum'), (CONTEUDO, 'Nome, marca e descrição')]
+
+    # sem índice próprio: o do unique_together (produto, modo, posicao) já serve
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='+', db_index=False)
+    relacionado = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='relacionado_em')
+    modo = models.SmallIntegerField(choices=MODOS, default=FAVORITOS)
+    posicao = models.PositiveSmallIntegerField()
+    # cosseno entre os dois produtos (0 a 1)
+    pontuacao = models.FloatField()
+
+    class Meta:
+        db_table = 'produtos_relacionados'
+        unique_together = [('produto', 'modo', 'posicao')]
+
+
+class TermoConteudo(models.Model):
+    """
+    Vocabulário dos vetores TF-IDF de conteudo.py: cada termo com o seu
+    idf. Refeito a cada cálculo completo; os incrementais usam o que está aqui.
+    """
+    termo = models.CharField(max_length=50, primary_key=True)
+    idf = models.FloatField()
+
+    class Meta:
+        db_table = 'produtos_termos_conteudo'
@@ -0,0 +1,16 @@
+import unicodedata
+
+
+def normalizar(texto):
+    """
+    Forma usada nas buscas: sem acentos, em minúsculas (casefold) e com os
+    espaços repetidos reduzidos a um só.
+
+    >>> normalizar('  Eletrônicos   e  INFORMÁTICA ')
+    'eletronicos e informatica'
+    """
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
@@ -0,0 +1,142 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class ProdutoPageNumberPagination(PageNumberPagination):
+    """
+    Paginação por número de página (?page=), com ?page_size= limitado.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ProdutoCursorPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) para rolagem infinita.
+
+    Em vez de COUNT(*) + OFFSET, guarda no cursor os valores de ordenação do
+    último produto da página e busca os próximos com WHERE, por exemplo:
+    nome > 'x' OR (nome = 'x' AND id > 10). Assim a página 10.000 custa o
+    mesmo que a primeira.
+
+    A ordenação vem de `view.ordenacao_cursor` e precisa terminar num campo
+    único (o id), que serve de desempate entre produtos com o mesmo nome.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('nome', 'id')
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'ordenacao_cursor', self.ordering))
+
+        queryset = queryset.order_by(*self.ordering)
+        posicao = self.decode_cursor(request)
+        if posicao is not None:
+            try:
+                queryset = queryset.filter(self.filtro_apos(posicao))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # Busca um item a mais só para saber se existe próxima página
+        resultados = list(queryset[:self.page_size + 1])
+        self.tem_proxima = len(resultados) > self.page_size
+        self.page = resultados[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def filtro_apos(self, posicao):
+        """
+        Monta o filtro "vem depois de `posicao`" para a ordenação composta:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z)...
+        """
+        filtro = Q()
+        iguais = {}
+        for campo, valor in zip(self.ordering, posicao):
+            nome = campo.lstrip('-')
+            lookup = 'lt' if campo.startswith('-') else 'gt'
+            filtro |= Q(**iguais, **{f'{nome}__{lookup}': valor})
+            iguais[nome] = valor
+        return filtro
+
+    def get_next_link(self):
+        if not self.tem_proxima:
+            return None
+        ultimo = self.page[-1]
+        # a página pode ter models ou linhas do values() (leitura rápida)
+        if isinstance(ultimo, dict):
+            posicao = [ultimo[campo.lstrip('-')] for campo in self.ordering]
+        else:
+            posicao = [getattr(ultimo, campo.lstrip('-')) for campo in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(posicao))
+
+    def get_first_link(self):
+        url = remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return replace_query_param(url, 'paginacao', 'cursor')
+
+    def encode_cursor(self, posicao):
+        valores = [
+            valor.isoformat() if isinstance(valor, (date, datetime))
+            else str(valor) if isinstance(valor, Decimal)
+            else valor
+            for valor in posicao
+        ]
+        texto = json.dumps(valores, separators=(',', ':'))
+        return base64.urlsafe_b64encode(texto.encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            posicao = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (TypeError, ValueError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(posicao, list) or len(posicao) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return posicao
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'first': self.get_first_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'format': 'uri'},
+                'results': schema,
+            },
+        }
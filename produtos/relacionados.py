@@ -0,0 +1,210 @@
+"""
+Produtos relacionados: "quem favoritou este também favoritou".
+
+Os favoritos viram uma matriz esparsa usuário × produto (X, 1 =
+favoritou) e a semelhança entre dois produtos é o cosseno entre as
+colunas:
+
+    pontuacao(a, b) = comuns(a, b) / sqrt(favoritos(a) * favoritos(b))
+
+onde comuns = X.T @ X (usuários que favoritaram os dois). As linhas de
+X.T @ X são calculadas em blocos de produtos, então a memória depende do
+tamanho do bloco e não do catálogo. De cada linha ficam os K maiores,
+gravados em ProdutoRelacionado.
+
+O comando calcular_relacionados, sem --completo, só recalcula os produtos
+com eventos de favorito depois do Checkpoint 'relacionados', lendo só os
+favoritos dos usuários desses produtos. A pontuação que os outros têm com
+eles fica um pouco defasada até o próximo --completo (ex.: uma vez por dia).
+O checkpoint só avança até o horizonte dos eventos (ver
+tendencias.ultimo_evento_consolidado): um evento ainda em transação aberta
+entra na próxima execução.
+
+numpy e scipy só são necessários para calcular; o endpoint lê a tabela.
+"""
+from django.db import transaction
+
+from usuarios.models import Favorito
+
+from .models import Checkpoint, EventoFavorito, Produto, ProdutoRelacionado
+from .tendencias import ultimo_evento_consolidado
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover - depende do ambiente
+    np = sparse = None
+
+CHECKPOINT = 'relacionados'
+K = 20
+TAMANHO_BLOCO = 2000
+# com mais produtos alterados que isso, o cálculo completo sai mais barato
+# (e os IN (...) não passam do limite de parâmetros do banco)
+LIMITE_INCREMENTAL = 5000
+# ids por consulta em _contagens (abaixo do limite de parâmetros do SQLite)
+TAMANHO_LOTE_IDS = 900
+
+
+def dependencias_instaladas():
+    return np is not None and sparse is not None
+
+
+def matriz_favoritos(usuarios, produtos):
+    """
+    Matriz CSR usuário × produto dos pares (usuarios[i], produtos[i]) e os
+    ids dos produtos de cada coluna (em ordem crescente).
+    """
+    ids_usuarios, linhas = np.unique(usuarios, return_inverse=True)
+    ids_produtos, colunas = np.unique(produtos, return_inverse=True)
+    matriz = sparse.csr_matrix(
+        (np.ones(len(linhas), dtype=np.float32), (linhas, colunas)),
+        shape=(len(ids_usuarios), len(ids_produtos)),
+    )
+    # par repetido somaria 2
+    matriz.data[:] = 1
+    return matriz, ids_produtos
+
+
+def vizinhos(matriz, ids_produtos, colunas=None, contagens=None, k=K, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Gera, bloco a bloco, os K vizinhos de cada coluna em `colunas` (todas
+    se None) como arrays (produto_id, relacionado_id, posicao, pontuacao).
+
+    `contagens` são os favoritos de cada coluna; por padrão, a soma da
+    própria matriz (passar quando ela tem só parte dos usuários).
+    """
+    if contagens is None:
+        contagens = np.asarray(matriz.sum(axis=0)).ravel()
+    normas = np.sqrt(np.maximum(contagens, 1).astype(np.float64))
+    por_coluna = matriz.tocsc()
+    colunas = np.arange(matriz.shape[1]) if colunas is None else np.asarray(colunas)
+    for inicio in range(0, len(colunas), tamanho_bloco):
+        bloco = colunas[inicio:inicio + tamanho_bloco]
+        # comuns[i, j]: usuários que favoritaram bloco[i] e a coluna j
+        comuns = (por_coluna[:, bloco].T @ matriz).tocsr()
+        yield _maiores(comuns, bloco, normas, ids_produtos, k)
+
+
+def _maiores(comuns, bloco, normas, ids_produtos, k):
+    linhas = np.repeat(np.arange(len(bloco)), np.diff(comuns.indptr))
+    colunas = comuns.indices
+    # o próprio produto não entra
+    outros = colunas != bloco[linhas]
+    linhas, colunas = linhas[outros], colunas[outros]
+    pontuacoes = comuns.data[outros] / (normas[bloco[linhas]] * normas[colunas])
+    linhas, colunas, pontuacoes, posicoes = k_maiores(linhas, colunas, pontuacoes, ids_produtos, k)
+    return ids_produtos[bloco[linhas]], ids_produtos[colunas], posicoes, pontuacoes
+
+
+def k_maiores(linhas, colunas, pontuacoes, ids_produtos, k):
+    """
+    Dos pares (linhas[i], colunas[i]) com pontuacoes[i], só os K de maior
+    pontuação de cada linha, em ordem (empate: menor id). Retorna os três
+    arrays filtrados e a posição (1 a K) de cada par.
+    """
+    ordem = np.lexsort((ids_produtos[colunas], -pontuacoes, linhas))
+    linhas, colunas, pontuacoes = linhas[ordem], colunas[ordem], pontuacoes[ordem]
+    posicoes = np.arange(len(linhas)) - np.searchsorted(linhas, linhas)
+    ficam = posicoes < k
+    return linhas[ficam], colunas[ficam], pontuacoes[ficam], posicoes[ficam] + 1
+
+
+def _pares(favoritos):
+    pares = np.array(list(favoritos.values_list('usuario_id', 'produto_id')), dtype=np.int64)
+    return pares.reshape(-1, 2)
+
+
+def _contagens(ids_produtos):
+    """
+    Favoritos de cada produto em `ids_produtos`, lidos do contador
+    Produto.total_favoritos (sem contar a tabela de favoritos).
+    """
+    ids = ids_produtos.tolist()
+    totais = {}
+    for inicio in range(0, len(ids), TAMANHO_LOTE_IDS):
+        totais.update(
+            Produto.objects.filter(id__in=ids[inicio:inicio + TAMANHO_LOTE_IDS])
+            .values_list('id', 'total_favoritos')
+        )
+    return np.array([totais.get(id_produto) or 1 for id_produto in ids])
+
+
+def atualizar(completo=False, k=K, tamanho_bloco=TAMANHO_BLOCO, progresso=None):
+    """
+    Recalcula os relacionados de todos os produtos (`completo`) ou só dos
+    que tiveram favoritos alterados desde o checkpoint. Retorna quantos
+    produtos foram recalculados.
+    """
+    with transaction.atomic():
+        # select_for_update: duas execuções ao mesmo tempo não se misturam
+        Checkpoint.objects.get_or_create(nome=CHECKPOINT)
+        checkpoint = Checkpoint.objects.select_for_update().get(nome=CHECKPOINT)
+        ultimo_evento = ultimo_evento_consolidado(checkpoint.ultimo_id)
+        favoritos = Favorito.objects.filter(produto__ativo=True)
+
+        alterados = None
+        if not completo:
+            alterados = list(
+                EventoFavorito.objects.filter(id__gt=checkpoint.ultimo_id, id__lte=ultimo_evento)
+                .values_list('produto_id', flat=True).distinct()
+            )
+            if len(alterados) > LIMITE_INCREMENTAL:
+                alterados = None
+
+        if alterados is None:
+            ProdutoRelacionado.objects.filter(modo=ProdutoRelacionado.FAVORITOS).delete()
+        elif alterados:
+            # produtos desativados ou sem favoritos só perdem as linhas
+            ProdutoRelacionado.objects.filter(modo=ProdutoRelacionado.FAVORITOS, produto_id__in=alterados).delete()
+            # só os usuários que favoritaram algum dos alterados importam
+            favoritos = favoritos.filter(
+                usuario_id__in=Favorito.objects.filter(produto_id__in=alterados).values('usuario_id')
+            )
+
+        # alterados == []: nenhum evento novo
+        recalculados = 0 if alterados == [] else _recalcular(favoritos, alterados, k, tamanho_bloco, progresso)
+        checkpoint.ultimo_id = ultimo_evento
+        checkpoint.save()
+    return recalculados
+
+
+def _recalcular(favoritos, alterados, k, tamanho_bloco, progresso):
+    """
+    Grava os vizinhos dos produtos `alterados` (todos se None) a partir
+    dos `favoritos`. Retorna quantos produtos tinham favoritos.
+    """
+    pares = _pares(favoritos)
+    if not len(pares):
+        return 0
+    matriz, ids_produtos = matriz_favoritos(pares[:, 0], pares[:, 1])
+    if alterados is None:
+        colunas, contagens = np.arange(len(ids_produtos)), None
+    else:
+        colunas = np.flatnonzero(np.isin(ids_produtos, alterados))
+        contagens = _contagens(ids_produtos)
+
+    feitos = 0
+    for produtos, relacionados, posicoes, pontuacoes in vizinhos(
+        matriz, ids_produtos, colunas, contagens, k, tamanho_bloco
+    ):
+        gravar(ProdutoRelacionado.FAVORITOS, produtos, relacionados, posicoes, pontuacoes)
+        feitos = min(feitos + tamanho_bloco, len(colunas))
+        if progresso:
+            progresso(feitos, len(colunas))
+    return len(colunas)
+
+
+def gravar(modo, produtos, relacionados, posicoes, pontuacoes):
+    """
+    Grava os arrays de um bloco de vizinhos em ProdutoRelacionado.
+    """
+    ProdutoRelacionado.objects.bulk_create(
+        [
+            ProdutoRelacionado(produto_id=produto, relacionado_id=relacionado, modo=modo,
+                               posicao=posicao, pontuacao=pontuacao)
+            for produto, relacionado, posicao, pontuacao in zip(
+                produtos.tolist(), relacionados.tolist(), posicoes.tolist(), pontuacoes.tolist()
+            )
+        ],
+        batch_size=1000,
+    )
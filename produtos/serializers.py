@@ -1,18 +1,32 @@
 from rest_framework import serializers
+from docelar.campos import CamposDinamicosSerializerMixin
+from .imagens import urls_variantes
 from .models import Produto, Categoria
 
-class CategoriaSerializer(serializers.ModelSerializer):
+class CategoriaSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Categoria
-        fields = '__all__'
+        # todos os campos, menos a coluna interna de busca
+        exclude = ['nome_normalizado']
 
-class ProdutoSerializer(serializers.ModelSerializer):
+class ProdutoSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
 
     categoria_nome = serializers.ReadOnlyField(source='categoria.nome')
     is_favorito = serializers.SerializerMethodField()
+    # URLs das variantes da imagem (thumb/card/full em webp e jpeg)
+    imagens = serializers.SerializerMethodField()
+    # ?expand=categoria troca o id pelo objeto da categoria
+    expansoes = {'categoria': CategoriaSerializer}
+    # colunas lidas pelos get_<campo> (usadas no only() de ?fields= e na
+    # leitura rápida, ver leitura_rapida.py)
+    campos_rapidos = {'is_favorito': ['id'], 'imagens': ['imagem_variantes']}
     class Meta:
         model = Produto
-        fields = '__all__' # Pega todos os campos (nome, marca, preco, imagem, ativo...)
+        # Pega todos os campos (nome, marca, preco, imagem, ativo...),
+        # menos as colunas internas de busca. O total_favoritos muda sem
+        # mudar 'atualizado' (ETag/cache do catálogo), então só aparece no
+        # ranking (ProdutoRankingSerializer)
+        exclude = ['nome_normalizado', 'marca_normalizada', 'imagem_variantes', 'total_favoritos']
         read_only_fields = ['id', 'criado', 'atualizado']
 
     def get_is_favorito(self, obj):
@@ -20,12 +34,24 @@ class ProdutoSerializer(serializers.ModelSerializer):
         """
         Retorna True se o produto for favorito do usuário, False caso contrário.
         """
-        user = self.context.get('request').user
+        # A view já carrega os favoritos da página inteira de uma vez
+        favoritos_ids = self.context.get('favoritos_ids')
+        if favoritos_ids is not None:
+            return obj.id in favoritos_ids
+
+        request = self.context.get('request')
+        user = request.user if request else None
         if user and user.is_authenticated:
             # Verifica se o ID do produto está na lista de favoritos desse usuário
             return user.favoritos.filter(id=obj.id).exists()
         return False
 
+    def get_imagens(self, obj):
+        """
+        URLs das variantes da imagem ou None se ainda não foram geradas.
+        """
+        return urls_variantes(obj.imagem_variantes, self.context.get('request'))
+
     def validate_nome(self, value):
         """
         Validar nome do produto.
@@ -80,3 +106,59 @@ class ProdutoSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("A descrição deve ter no mínimo 20 caracteres")
         return value
     
+
+
+class ProdutoRankingSerializer(ProdutoSerializer):
+    """
+    Produto com o total de usuários que o favoritaram
+    (GET /produtos/mais-favoritados/).
+    """
+
+    class Meta(ProdutoSerializer.Meta):
+        exclude = ['nome_normalizado', 'marca_normalizada', 'imagem_variantes']
+
+
+class ProdutoTendenciaSerializer(ProdutoSerializer):
+    """
+    Produto com a pontuação "em alta" atual (GET /produtos/em-alta/). A view
+    anota pontuacao_tendencia e passa no contexto o 'fator_tendencia' que a
+    leva da data de referência para agora (ver tendencias.py).
+    """
+    pontuacao = serializers.SerializerMethodField()
+
+    def get_pontuacao(self, obj):
+        return round(obj.pontuacao_tendencia * self.context['fator_tendencia'], 4)
+
+
+class ProdutoRelacionadoSerializer(ProdutoSerializer):
+    """
+    Produto relacionado a outro (GET /produtos/{id}/relacionados/), com a
+    pontuação anotada pela view (pontuacao_relacionado, de 0 a 1).
+    """
+    pontuacao = serializers.SerializerMethodField()
+
+    def get_pontuacao(self, obj):
+        return round(obj.pontuacao_relacionado, 4)
+
+
+class ImportacaoProdutoSerializer(ProdutoSerializer):
+    """
+    Valida uma linha de importação com as mesmas regras do ProdutoSerializer
+    (validate_nome, validate_marca...). A categoria vem pelo nome e é
+    resolvida pelo importador (ver importacao.py).
+    """
+    categoria_nome = None
+    is_favorito = None
+    imagens = None
+    categoria = serializers.CharField(required=False, allow_blank=True, max_length=50)
+
+    class Meta:
+        model = Produto
+        fields = ['nome', 'marca', 'preco', 'descricao', 'ativo', 'categoria']
+
+
+class FavoritosLoteSerializer(serializers.Serializer):
+    """
+    Corpo de PUT/DELETE /produtos/favoritos/: {"ids": [1, 2, 3]}.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000)
@@ -0,0 +1,60 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from usuarios.models import Usuario
+
+from .cache import invalidar_catalogo
+from .favoritos import ajustar_totais, registrar_eventos
+from .models import Categoria, EventoFavorito, Produto
+
+
+# Qualquer gravação de produto ou categoria (criação, edição, troca de
+# imagem, soft delete via perform_destroy) muda a versão do catálogo e
+# invalida as respostas guardadas no cache.
+@receiver(post_save, sender=Produto)
+@receiver(post_delete, sender=Produto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def catalogo_alterado(sender, **kwargs):
+    invalidar_catalogo()
+
+
+# Favoritos alterados pelo ORM (usuario.favoritos.add/remove/clear, ou
+# produto.favoritados...) também atualizam Produto.total_favoritos e
+# geram os EventoFavorito.
+# No add, o pk_set já vem só com os que entraram; no remove e no clear,
+# os que existiam são lidos antes (pre_*) para não descontar a mais.
+@receiver(m2m_changed, sender=Usuario.favoritos.through)
+def favoritos_alterados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('pre_remove', 'pre_clear'):
+        existentes = sender.objects.filter(**{'produto_id' if reverse else 'usuario_id': instance.pk})
+        if pk_set is not None:
+            existentes = existentes.filter(**{'usuario_id__in' if reverse else 'produto_id__in': pk_set})
+        instance._favoritos_removidos = list(
+            existentes.values_list('usuario_id' if reverse else 'produto_id', flat=True)
+        )
+        return
+    if action == 'post_add':
+        alterados, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        alterados, delta = instance.__dict__.pop('_favoritos_removidos', ()), -1
+    else:
+        return
+
+    tipo = EventoFavorito.FAVORITOU if delta > 0 else EventoFavorito.DESFAVORITOU
+    if reverse:
+        # instance é o produto; alterados são os usuários
+        if alterados:
+            ajustar_totais([instance.pk], delta * len(alterados))
+        registrar_eventos([(id_usuario, instance.pk) for id_usuario in alterados], tipo)
+    else:
+        ajustar_totais(alterados, delta)
+        registrar_eventos([(instance.pk, id_produto) for id_produto in alterados], tipo)
+
+
+# Apagar um usuário apaga os favoritos dele sem m2m_changed
+@receiver(pre_delete, sender=Usuario)
+def usuario_apagado(sender, instance, **kwargs):
+    ids = list(instance.favoritos.values_list('id', flat=True))
+    ajustar_totais(ids, -1)
+    registrar_eventos([(instance.pk, id_produto) for id_produto in ids], EventoFavorito.DESFAVORITOU)
@@ -0,0 +1,162 @@
+"""
+Pontuação "em alta" dos produtos, a partir dos eventos de favorito.
+
+Cada evento vale +1 (favoritou) ou -1 (desfavoritou) e o peso cai pela
+metade a cada PRODUTOS_TENDENCIA_MEIA_VIDA horas:
+
+    pontuacao(agora) = soma(tipo * 2 ** -((agora - criado) / meia_vida))
+
+Para não reescrever todas as pontuações a cada execução, o valor gravado
+em TendenciaProduto é o da data de referência do Checkpoint (exp(λ·(criado -
+referencia)) por evento). Todas caem no mesmo ritmo, então a ordem entre
+elas não muda com o tempo; a pontuação atual é só uma multiplicação
+(pontuacao_atual). Quando a referência fica antiga demais, tudo é
+trazido para a data atual (rebase) para os números não crescerem sem fim.
+
+O comando calcular_tendencias soma só os eventos com id maior que o do
+checkpoint, em lotes, gravando o checkpoint na mesma transação. No
+PostgreSQL um id menor pode aparecer (commit) depois de um maior já
+processado, e ficaria de fora para sempre: por isso cada lote para no
+primeiro evento mais novo que o horizonte (agora - PRODUTOS_EVENTOS_MARGEM).
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+from itertools import takewhile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from .models import Checkpoint, EventoFavorito, TendenciaProduto
+
+CHECKPOINT = 'tendencias'
+MEIA_VIDA_PADRAO = 72  # horas
+# com a referência mais antiga que isso (em meias-vidas), faz o rebase
+REBASE_MEIAS_VIDAS = 32
+TAMANHO_LOTE = 5000
+MARGEM_PADRAO = 60  # segundos
+
+
+def taxa():
+    """
+    λ por segundo: ln(2) / meia-vida.
+    """
+    horas = getattr(settings, 'PRODUTOS_TENDENCIA_MEIA_VIDA', MEIA_VIDA_PADRAO)
+    return math.log(2) / (horas * 3600)
+
+
+def horizonte(agora=None):
+    """
+    Data até a qual os eventos de favorito já estão todos gravados.
+    """
+    margem = getattr(settings, 'PRODUTOS_EVENTOS_MARGEM', MARGEM_PADRAO)
+    return (agora or timezone.now()) - timedelta(seconds=margem)
+
+
+def ultimo_evento_consolidado(ultimo_id, agora=None):
+    """
+    Maior id de evento de favorito depois de `ultimo_id` que já pode ser
+    processado: o anterior ao primeiro evento mais novo que o horizonte
+    (`ultimo_id` se não houver nenhum).
+    """
+    eventos = EventoFavorito.objects.filter(id__gt=ultimo_id)
+    recente = eventos.filter(criado__gt=horizonte(agora)).aggregate(primeiro=Min('id'))['primeiro']
+    if recente is not None:
+        eventos = eventos.filter(id__lt=recente)
+    return eventos.aggregate(maximo=Max('id'))['maximo'] or ultimo_id
+
+
+def fator_atual(referencia, agora=None):
+    """
+    Multiplicador que leva a pontuação gravada (na referência) para agora.
+    """
+    agora = agora or timezone.now()
+    return math.exp(-taxa() * (agora - referencia).total_seconds())
+
+
+def _rebase(checkpoint, agora):
+    fator = fator_atual(checkpoint.referencia, agora)
+    TendenciaProduto.objects.update(pontuacao=F('pontuacao') * fator)
+    checkpoint.referencia = agora
+
+
+def processar_lote(tamanho_lote=TAMANHO_LOTE, agora=None):
+    """
+    Soma nas pontuações até `tamanho_lote` eventos posteriores ao
+    checkpoint e anteriores ao horizonte. Retorna quantos eventos foram
+    somados (0: nada pendente).
+    """
+    agora = agora or timezone.now()
+    limite = horizonte(agora)
+    lam = taxa()
+    with transaction.atomic():
+        # select_for_update: duas execuções ao mesmo tempo não somam o
+        # mesmo evento duas vezes
+        Checkpoint.objects.get_or_create(nome=CHECKPOINT, defaults={'referencia': agora})
+        checkpoint = Checkpoint.objects.select_for_update().get(nome=CHECKPOINT)
+        if checkpoint.referencia is None:
+            checkpoint.referencia = agora
+        elif lam * (agora - checkpoint.referencia).total_seconds() > REBASE_MEIAS_VIDAS * math.log(2):
+            _rebase(checkpoint, agora)
+
+        eventos = (
+            EventoFavorito.objects.filter(id__gt=checkpoint.ultimo_id).order_by('id')
+            .values_list('id', 'produto_id', 'tipo', 'criado')[:tamanho_lote]
+        )
+        # para no primeiro evento recente: um id menor que o dele ainda pode
+        # estar numa transação aberta
+        eventos = list(takewhile(lambda evento: evento[3] <= limite, eventos))
+        if not eventos:
+            checkpoint.save()
+            return 0
+
+        somas = defaultdict(float)
+        for _, produto_id, tipo, criado in eventos:
+            somas[produto_id] += tipo * math.exp(lam * (criado - checkpoint.referencia).total_seconds())
+
+        existentes = TendenciaProduto.objects.in_bulk(list(somas))
+        for produto_id, tendencia in existentes.items():
+            tendencia.pontuacao += somas[produto_id]
+        TendenciaProduto.objects.bulk_update(existentes.values(), ['pontuacao'], batch_size=500)
+        TendenciaProduto.objects.bulk_create(
+            [TendenciaProduto(produto_id=produto_id, pontuacao=soma)
+             for produto_id, soma in somas.items() if produto_id not in existentes],
+            batch_size=500,
+        )
+
+        checkpoint.ultimo_id = eventos[-1][0]
+        checkpoint.save()
+    return len(eventos)
+
+
+def processar_eventos(tamanho_lote=TAMANHO_LOTE, agora=None, progresso=None):
+    """
+    Processa todos os eventos pendentes, lote a lote. Retorna o total.
+    """
+    total = 0
+    while True:
+        processados = processar_lote(tamanho_lote, agora)
+        if not processados:
+            return total
+        total += processados
+        if progresso:
+            progresso(total)
+
+
+def reiniciar():
+    """
+    Apaga as pontuações e volta o checkpoint para o primeiro evento.
+    """
+    with transaction.atomic():
+        TendenciaProduto.objects.all().delete()
+        Checkpoint.objects.filter(nome=CHECKPOINT).delete()
+
+
+def referencia_atual():
+    """
+    Data de referência das pontuações gravadas, ou None se o comando
+    ainda não rodou.
+    """
+    return Checkpoint.objects.filter(nome=CHECKPOINT).values_list('referencia', flat=True).first()
@@ -1,13 +1,83 @@
-from django.test import TestCase
-from produtos.models import Produto, Categoria
+import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from produtos.models import (
+    Produto, Categoria, EventoFavorito, ProdutoRelacionado, TendenciaProduto, TermoConteudo,
+)
+from usuarios.models import Favorito, Usuario
 from produtos.serializers import ProdutoSerializer
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIRequestFactory
+from rest_framework.request import Request
 from rest_framework import status
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from docelar.parsers import JSONRapidoParser
+from docelar.renderers import JSONRapidoRenderer
+from docelar.middleware import (
+    CompressaoMiddleware, brotli, codificacoes_disponiveis, comprimir, escolher_codificacao,
+)
+from produtos.views import ProdutoViewSet
+from produtos.cache import cache_catalogo, estatisticas
+from produtos.normalizacao import normalizar
+from produtos.busca import buscar_no_nome
+from produtos.importacao import ImportadorProdutos
+from produtos.favoritos import desfavoritar, favoritar
+from produtos.leitura_rapida import LeituraRapida
+from produtos import conteudo, relacionados, tendencias
+from produtos.imagens import gerar_variantes
+from PIL import Image
 # usar os nomes das rotas
 from rest_framework.reverse import reverse
 # Create your tests here.
 
 
+def planos_de_consulta(queryset):
+    """
+    Roda EXPLAIN QUERY PLAN (SQLite) para o SQL do queryset e retorna
+    as linhas de detalhe do plano, ex.: 'SEARCH produtos USING INDEX ...'.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [linha[-1] for linha in cursor.fetchall()]
+
+
+def varreduras_de_tabela(planos):
+    """
+    Passos do plano que leem a tabela inteira ('SCAN produtos'), sem
+    índice. 'SCAN ... USING INDEX' percorre o índice já na ordem do
+    ORDER BY e para no LIMIT, então não conta como varredura.
+    """
+    return [plano for plano in planos if re.fullmatch(r'SCAN \w+', plano)]
+
+
 class ProdutoTesteUnitario(TestCase):
 
     def setUp(self):
@@ -191,4 +261,2091 @@ class ProdutoTesteFuncional(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(
             Produto.objects.filter(nome=payload['nome']).exists()
-    )
\ No newline at end of file
+    )
+
+class ProdutoFavoritosConsultasTeste(APITestCase):
+    """
+    O is_favorito não pode gerar uma consulta por produto da página.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(
+            nome='Usuario Teste',
+            email='usuario@teste.com',
+            cpf='12345678901',
+            senha='Senha@123'
+        )
+        self.client.force_authenticate(user=self.usuario)
+
+    def _criar_produtos(self, quantidade):
+        produtos = [
+            Produto.objects.create(
+                nome=f'Produto {i:03d}',
+                marca='Marca',
+                preco=10,
+                descricao='Descrição com mais de vinte caracteres'
+            )
+            for i in range(quantidade)
+        ]
+        # favorita metade dos produtos
+        self.usuario.favoritos.add(*produtos[::2])
+        return produtos
+
+    def _contar_consultas(self, url, **params):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(consultas), response
+
+    def test_is_favorito_correto_na_listagem(self):
+        produtos = self._criar_produtos(4)
+
+        _, response = self._contar_consultas(reverse('produtos-list'))
+
+        resultado = {p['id']: p['is_favorito'] for p in response.data['results']}
+        self.assertEqual(resultado, {p.id: i % 2 == 0 for i, p in enumerate(produtos)})
+
+    def test_listagem_consultas_nao_crescem_com_a_pagina(self):
+        self._criar_produtos(3)
+        pequena, _ = self._contar_consultas(reverse('produtos-list'))
+
+        self._criar_produtos(10)
+        cheia, _ = self._contar_consultas(reverse('produtos-list'))
+
+        self.assertEqual(pequena, cheia)
+
+    def test_meus_favoritos_consultas_nao_crescem_com_a_pagina(self):
+        self._criar_produtos(2)
+        pequena, response = self._contar_consultas(reverse('produtos-meus-favoritos'))
+        self.assertTrue(all(p['is_favorito'] for p in response.data['results']))
+
+        self._criar_produtos(20)
+        cheia, _ = self._contar_consultas(reverse('produtos-meus-favoritos'))
+
+        self.assertEqual(pequena, cheia)
+
+
+class ProdutoConsultasPorEndpointTeste(APITestCase):
+    """
+    Cada endpoint faz um número fixo de consultas, independente de
+    quantos produtos e categorias existem na página.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(
+            nome='Usuario Teste',
+            email='usuario@teste.com',
+            cpf='12345678901',
+            senha='Senha@123'
+        )
+        categorias = [
+            Categoria.objects.create(nome=f'Categoria {i}', descricao='Descrição longa')
+            for i in range(5)
+        ]
+        self.produtos = [
+            Produto.objects.create(
+                categoria=categorias[i % 5],
+                nome=f'Produto {i:03d}',
+                marca='Marca',
+                preco=10,
+                descricao='Descrição com mais de vinte caracteres'
+            )
+            for i in range(10)
+        ]
+        self.usuario.favoritos.add(*self.produtos)
+        cache_catalogo().clear()
+
+    def _get(self, url, consultas):
+        with self.assertNumQueries(consultas):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_listagem_anonima(self):
+        # agregado do ETag + COUNT da paginação + SELECT com JOIN na categoria
+        response = self._get(reverse('produtos-list'), 3)
+        self.assertEqual(response.data['results'][0]['categoria_nome'], 'Categoria 0')
+
+    def test_listagem_autenticada(self):
+        self.client.force_authenticate(user=self.usuario)
+        # + favoritos do usuário (ETag) + favoritos da página (is_favorito)
+        self._get(reverse('produtos-list'), 5)
+
+    def test_detalhe(self):
+        produto = self.produtos[0]
+        # agregado do ETag + SELECT do produto
+        self._get(reverse('produtos-detail', args=[produto.id]), 2)
+
+        # agregado já está no cache; + favoritos (ETag) + favoritos (is_favorito)
+        self.client.force_authenticate(user=self.usuario)
+        self._get(reverse('produtos-detail', args=[produto.id]), 3)
+
+    def test_meus_favoritos(self):
+        self.client.force_authenticate(user=self.usuario)
+        response = self._get(reverse('produtos-meus-favoritos'), 3)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_listagem_categorias(self):
+        # agregado do ETag + COUNT + SELECT
+        self._get(reverse('categorias-list'), 3)
+
+
+class ProdutoBuscaTextualTeste(APITestCase):
+    """
+    Busca ?q= em nome, marca e descrição, ordenada por relevância.
+    """
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nome='Informatica')
+        self.notebook = Produto.objects.create(
+            categoria=self.categoria,
+            nome='Notebook Gamer',
+            marca='Dell',
+            preco=5000,
+            descricao='Computador portátil para jogos pesados'
+        )
+        self.mochila = Produto.objects.create(
+            categoria=self.categoria,
+            nome='Mochila Executiva',
+            marca='Samsonite',
+            preco=300,
+            descricao='Mochila com compartimento acolchoado para notebook'
+        )
+        self.mouse = Produto.objects.create(
+            categoria=self.categoria,
+            nome='Mouse Sem Fio',
+            marca='Logitech',
+            preco=150,
+            descricao='Mouse ergonômico com pilha de longa duração'
+        )
+
+    def _buscar(self, termo):
+        response = self.client.get(reverse('produtos-list'), {'q': termo})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['id'] for p in response.data['results']]
+
+    def test_busca_em_nome_e_descricao_ordenada_por_relevancia(self):
+        # o produto com o termo no nome vem antes do que só cita na descrição
+        self.assertEqual(self._buscar('notebook'), [self.notebook.id, self.mochila.id])
+
+    def test_busca_por_marca_e_prefixo(self):
+        self.assertEqual(self._buscar('logi'), [self.mouse.id])
+
+    def test_busca_ignora_acentos(self):
+        self.assertEqual(self._buscar('ergonomico'), [self.mouse.id])
+
+    def test_todos_os_termos_precisam_aparecer(self):
+        self.assertEqual(self._buscar('mochila dell'), [])
+
+    def test_indice_acompanha_alteracoes(self):
+        self.mouse.nome = 'Teclado Mecânico'
+        self.mouse.save()
+        self.assertEqual(self._buscar('teclado'), [self.mouse.id])
+        self.assertEqual(self._buscar('sem fio'), [])
+
+        self.mouse.delete()
+        self.assertEqual(self._buscar('teclado'), [])
+
+    def test_produto_inativo_nao_aparece(self):
+        self.notebook.ativo = False
+        self.notebook.save()
+        self.assertEqual(self._buscar('notebook'), [self.mochila.id])
+
+    def test_busca_com_caracteres_especiais(self):
+        self.assertEqual(self._buscar('"notebook*'), [self.notebook.id, self.mochila.id])
+        self.assertEqual(self._buscar('***'), [])
+
+
+class ProdutoPaginacaoCursorTeste(APITestCase):
+    """
+    Paginação por cursor (?paginacao=cursor) e limite do ?page_size=.
+    """
+
+    def setUp(self):
+        # nomes repetidos para exercitar o desempate pelo id
+        self.produtos = [
+            Produto.objects.create(
+                nome=f'Produto {i // 3:02d}',
+                marca='Marca',
+                preco=10,
+                descricao='Descrição com mais de vinte caracteres'
+            )
+            for i in range(25)
+        ]
+
+    def _percorrer(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids += [p['id'] for p in response.data['results']]
+            if not response.data['next']:
+                return ids
+            response = self.client.get(response.data['next'])
+
+    def test_percorre_todos_os_produtos_sem_repetir(self):
+        ids = self._percorrer(reverse('produtos-list'), {'paginacao': 'cursor', 'page_size': 4})
+
+        esperado = [p.id for p in sorted(self.produtos, key=lambda p: (p.nome, p.id))]
+        self.assertEqual(ids, esperado)
+
+    def test_consultas_iguais_em_qualquer_pagina(self):
+        url = reverse('produtos-list')
+        with CaptureQueriesContext(connection) as primeira:
+            response = self.client.get(url, {'paginacao': 'cursor', 'page_size': 5})
+        with CaptureQueriesContext(connection) as seguinte:
+            self.client.get(response.data['next'])
+
+        # a página em si é um único SELECT com LIMIT, sem OFFSET
+        paginas = [c['sql'] for c in seguinte if 'LIMIT' in c['sql']]
+        self.assertEqual(len(primeira), len(seguinte))
+        self.assertEqual(len(paginas), 1)
+        self.assertNotIn('OFFSET', paginas[0])
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse('produtos-list'), {'cursor': 'nao-e-um-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_busca_nao_usa_cursor(self):
+        # a ordem por relevância do ?q= não cabe no cursor (nome, id)
+        for params in ({'paginacao': 'cursor'}, {'cursor': 'abc'}):
+            response = self.client.get(reverse('produtos-list'), {'q': 'produto', **params})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('q', response.data)
+        response = self.client.get(reverse('produtos-list'), {'q': 'produto'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_page_size_limitado(self):
+        Produto.objects.bulk_create([
+            Produto(nome=f'Extra {i}', marca='Marca', preco=10)
+            for i in range(120)
+        ])
+        url = reverse('produtos-list')
+
+        response = self.client.get(url, {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 100)
+
+        response = self.client.get(url, {'paginacao': 'cursor', 'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 100)
+
+    def test_meus_favoritos_com_cursor(self):
+        usuario = Usuario.objects.create(
+            nome='Usuario Teste',
+            email='usuario@teste.com',
+            cpf='12345678901',
+            senha='Senha@123'
+        )
+        usuario.favoritos.add(*self.produtos[:7])
+        self.client.force_authenticate(user=usuario)
+
+        ids = self._percorrer(reverse('produtos-meus-favoritos'), {'paginacao': 'cursor', 'page_size': 3})
+
+        self.assertEqual(sorted(ids), sorted(p.id for p in self.produtos[:7]))
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN é do SQLite')
+class ProdutoPlanoDeConsultaTeste(TestCase):
+    """
+    Nenhuma combinação de filtros do ProdutoViewSet.get_queryset pode cair
+    numa varredura completa da tabela de produtos.
+    """
+    filtros = {
+        'marca': 'Sony',
+        'nome': 'note',
+        'categoria': '1',
+        'categoria_nome': 'eletro',
+        'q': 'notebook',
+    }
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        categoria = Categoria.objects.create(nome='Eletronicos')
+        Produto.objects.bulk_create([
+            Produto(categoria=categoria, nome=f'Produto {i}', marca='Sony', preco=10)
+            for i in range(50)
+        ])
+
+    def _queryset(self, params):
+        view = ProdutoViewSet()
+        view.request = Request(self.factory.get('/produtos/', params))
+        view.format_kwarg = None
+        # fatia como a paginação faz (LIMIT)
+        return view.get_queryset()[:10]
+
+    def test_filtros_usam_indices(self):
+        for quantidade in range(len(self.filtros) + 1):
+            for combinacao in itertools.combinations(self.filtros, quantidade):
+                params = {campo: self.filtros[campo] for campo in combinacao}
+                with self.subTest(filtros=combinacao):
+                    planos = planos_de_consulta(self._queryset(params))
+                    self.assertEqual(varreduras_de_tabela(planos), [], planos)
+
+    def test_ordenacoes_e_faixa_de_preco_usam_indices(self):
+        for ordering in ProdutoViewSet.ordenacoes:
+            for params in ({}, {'preco_min': '10'}, {'preco_min': '10', 'preco_max': '500'}):
+                params = {'ordering': ordering, **params}
+                with self.subTest(params=params):
+                    planos = planos_de_consulta(self._queryset(params))
+                    self.assertEqual(varreduras_de_tabela(planos), [], planos)
+                    # sem filtro de faixa (ou ordenando pelo próprio preço), a
+                    # ordem vem do índice, sem ordenar os resultados em memória
+                    if len(params) == 1 or 'preco' in ordering:
+                        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', planos)
+
+    def test_favoritos_do_usuario_usam_indices(self):
+        usuario = Usuario.objects.create(
+            nome='Usuario Teste',
+            email='usuario@teste.com',
+            cpf='12345678901',
+            senha='Senha@123'
+        )
+        planos = planos_de_consulta(usuario.favoritos.ativos().para_listagem()[:10])
+        self.assertEqual(varreduras_de_tabela(planos), [], planos)
+
+        # busca reversa: quem favoritou o produto
+        produto = Produto.objects.first()
+        planos = planos_de_consulta(produto.favoritados.values('id'))
+        self.assertEqual(varreduras_de_tabela(planos), [], planos)
+
+
+class CatalogoCacheTeste(APITestCase):
+    """
+    Respostas anônimas de produtos e categorias vêm do cache até o
+    catálogo mudar.
+    """
+
+    def setUp(self):
+        cache_catalogo().clear()
+        self.categoria = Categoria.objects.create(nome='Eletronicos')
+        self.produto = Produto.objects.create(
+            categoria=self.categoria,
+            nome='Mouse Gamer',
+            marca='Logitech',
+            preco=150,
+            descricao='Mouse gamer com alta precisão e RGB'
+        )
+        self.usuario = Usuario.objects.create(
+            nome='Usuario Teste',
+            email='usuario@teste.com',
+            cpf='12345678901',
+            senha='Senha@123'
+        )
+
+    def test_segunda_leitura_vem_do_cache_sem_consultas(self):
+        url = reverse('produtos-list')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['results'][0]['nome'], 'Mouse Gamer')
+        self.assertEqual(estatisticas()['acertos'], 1)
+        self.assertEqual(estatisticas()['falhas'], 1)
+
+    def test_parametros_em_outra_ordem_usam_a_mesma_chave(self):
+        url = reverse('produtos-list')
+        self.client.get(url + '?marca=Logitech&nome=mouse')
+        response = self.client.get(url + '?nome=mouse&marca=Logitech&categoria=')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_alteracao_de_produto_invalida(self):
+        url = reverse('produtos-detail', args=[self.produto.id])
+        self.client.get(url)
+
+        self.produto.preco = 99
+        self.produto.save()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['preco'], '99.00')
+
+    def test_soft_delete_invalida(self):
+        url = reverse('produtos-list')
+        self.client.get(url)
+
+        self.client.force_authenticate(user=self.usuario)
+        response = self.client.delete(reverse('produtos-detail', args=[self.produto.id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'], [])
+
+    def test_alteracao_de_categoria_invalida_produtos_e_categorias(self):
+        self.client.get(reverse('produtos-list'))
+        self.client.get(reverse('categorias-list'))
+
+        self.categoria.nome = 'Informatica'
+        self.categoria.save()
+
+        response = self.client.get(reverse('produtos-list'))
+        self.assertEqual(response.data['results'][0]['categoria_nome'], 'Informatica')
+        self.assertEqual(self.client.get(reverse('categorias-list'))['X-Cache'], 'MISS')
+
+    def test_usuario_logado_nao_usa_cache(self):
+        self.client.force_authenticate(user=self.usuario)
+        self.client.get(reverse('produtos-list'))
+        response = self.client.get(reverse('produtos-list'))
+        self.assertNotIn('X-Cache', response)
+
+
+class CatalogoGetCondicionalTeste(APITestCase):
+    """
+    ETag / Last-Modified em produtos e categorias, com 304 quando nada mudou.
+    """
+
+    def setUp(self):
+        cache_catalogo().clear()
+        self.categoria = Categoria.objects.create(nome='Eletronicos')
+        self.produto = Produto.objects.create(
+            categoria=self.categoria,
+            nome='Mouse Gamer',
+            marca='Logitech',
+            preco=150,
+            descricao='Mouse gamer com alta precisão e RGB'
+        )
+
+    def test_listagem_responde_304_com_a_mesma_etag(self):
+        url = reverse('produtos-list')
+        response = self.client.get(url)
+        self.assertIn('ETag', response)
+        # lista não leva Last-Modified (ver condicional.py)
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since(self):
+        url = reverse('produtos-detail', args=[self.produto.id])
+        response = self.client.get(url)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_muda_quando_o_produto_muda(self):
+        url = reverse('produtos-detail', args=[self.produto.id])
+        etag = self.client.get(url)['ETag']
+
+        self.produto.preco = 99
+        self.produto.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depende_dos_filtros(self):
+        url = reverse('produtos-list')
+        self.assertNotEqual(
+            self.client.get(url, {'marca': 'Logitech'})['ETag'],
+            self.client.get(url, {'marca': 'Sony'})['ETag'],
+        )
+
+    def test_etag_muda_com_os_favoritos_do_usuario(self):
+        usuario = Usuario.objects.create(
+            nome='Usuario Teste',
+            email='usuario@teste.com',
+            cpf='12345678901',
+            senha='Senha@123'
+        )
+        self.client.force_authenticate(user=usuario)
+        url = reverse('produtos-list')
+        etag = self.client.get(url)['ETag']
+
+        usuario.favoritos.add(self.produto)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['results'][0]['is_favorito'])
+
+    def test_if_modified_since_na_lista_nao_esconde_produto_desativado(self):
+        antigo = Produto.objects.create(
+            categoria=self.categoria, nome='Teclado', marca='Logitech', preco=90,
+            descricao='Teclado mecânico com switches azuis'
+        )
+        Produto.objects.filter(id=antigo.id).update(atualizado=timezone.now() - timedelta(days=1))
+        url = reverse('produtos-list')
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 2)
+        data = http_date(time.time())
+
+        self.client.force_authenticate(user=Usuario.objects.create(
+            nome='Admin', email='admin@teste.com', cpf='12345678902', senha='Senha@123'))
+        self.client.delete(reverse('produtos-detail', args=[antigo.id]))
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_detalhe_do_usuario_sem_last_modified(self):
+        usuario = Usuario.objects.create(
+            nome='Usuario Teste', email='usuario@teste.com', cpf='12345678901', senha='Senha@123'
+        )
+        url = reverse('produtos-detail', args=[self.produto.id])
+        data = self.client.get(url)['Last-Modified']
+
+        self.client.force_authenticate(user=usuario)
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('Cookie', response['Vary'])
+        etag = response['ETag']
+
+        self.client.put(reverse('produtos-favorito', args=[self.produto.id]))
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_favorito'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_categorias(self):
+        url = reverse('categorias-detail', args=[self.categoria.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+
+        # renomear a categoria muda o categoria_nome dos produtos
+        etag_produtos = self.client.get(reverse('produtos-list'))['ETag']
+        self.categoria.nome = 'Informatica'
+        self.categoria.save()
+        response = self.client.get(reverse('produtos-list'), HTTP_IF_NONE_MATCH=etag_produtos)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_detalhe_inexistente_continua_404(self):
+        response = self.client.get(reverse('produtos-detail', args=[9999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/produtos/abc/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProdutoFacetasTeste(APITestCase):
+    """
+    GET /produtos/facetas/: contagens por marca, categoria e preço.
+    """
+
+    def setUp(self):
+        cache_catalogo().clear()
+        self.eletronicos = Categoria.objects.create(nome='Eletronicos')
+        self.casa = Categoria.objects.create(nome='Casa')
+        dados = [
+            ('Samsung', self.eletronicos, 50),
+            ('Samsung', self.eletronicos, 150),
+            ('Samsung', self.casa, 600),
+            ('Sony', self.eletronicos, 99.99),
+            ('Arno', self.casa, 7000),
+        ]
+        for i, (marca, categoria, preco) in enumerate(dados):
+            Produto.objects.create(
+                categoria=categoria,
+                nome=f'Produto {i}',
+                marca=marca,
+                preco=preco,
+                descricao='Descrição com mais de vinte caracteres'
+            )
+
+    def test_contagens(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('produtos-facetas'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(response.data['total'], 5)
+        self.assertEqual(response.data['marcas'][0], {'marca': 'Samsung', 'total': 3})
+        self.assertEqual(
+            response.data['categorias'],
+            [
+                {'id': self.eletronicos.id, 'nome': 'Eletronicos', 'total': 3},
+                {'id': self.casa.id, 'nome': 'Casa', 'total': 2},
+            ]
+        )
+        self.assertEqual(
+            [(f['min'], f['max'], f['total']) for f in response.data['precos']],
+            [
+                ('0.00', '100.00', 2),
+                ('100.00', '500.00', 1),
+                ('500.00', '1000.00', 1),
+                ('1000.00', '5000.00', 0),
+                ('5000.00', None, 1),
+            ]
+        )
+
+    def test_respeita_filtros_da_listagem(self):
+        response = self.client.get(reverse('produtos-facetas'), {'categoria': self.casa.id})
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(
+            {m['marca'] for m in response.data['marcas']}, {'Samsung', 'Arno'}
+        )
+
+        response = self.client.get(reverse('produtos-facetas'), {'q': 'samsung'})
+        self.assertEqual(response.data['marcas'], [{'marca': 'Samsung', 'total': 3}])
+
+    def test_faixas_personalizadas(self):
+        response = self.client.get(reverse('produtos-facetas'), {'faixas': '0,1000'})
+        self.assertEqual([f['total'] for f in response.data['precos']], [4, 1])
+
+        response = self.client.get(reverse('produtos-facetas'), {'faixas': '500,100'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_faixas_invalidas(self):
+        limites_demais = ','.join(str(i) for i in range(50))
+        for faixas in ('NaN,1', 'sNaN', '0,Infinity', '-inf,0', limites_demais):
+            response = self.client.get(reverse('produtos-facetas'), {'faixas': faixas})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, faixas)
+            self.assertIn('faixas', response.data)
+
+    def test_cache_e_invalidacao(self):
+        url = reverse('produtos-facetas')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        Produto.objects.create(nome='Novo', marca='Sony', preco=10)
+        self.assertEqual(self.client.get(url).data['total'], 6)
+
+
+class ProdutoPrecoOrdenacaoTeste(APITestCase):
+    """
+    Filtros ?preco_min/?preco_max e ?ordering= (lista permitida).
+    """
+
+    def setUp(self):
+        precos = [50, 10, 300, 10, 120, 50, 999]
+        self.produtos = [
+            Produto.objects.create(
+                nome=f'Produto {i}',
+                marca='Marca',
+                preco=preco,
+                descricao='Descrição com mais de vinte caracteres'
+            )
+            for i, preco in enumerate(precos)
+        ]
+
+    def _ids(self, **params):
+        response = self.client.get(reverse('produtos-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [p['id'] for p in response.data['results']]
+
+    def test_faixa_de_preco(self):
+        ids = self._ids(preco_min='50', preco_max='300')
+        esperado = [p.id for p in self.produtos if 50 <= p.preco <= 300]
+        self.assertEqual(sorted(ids), sorted(esperado))
+
+    def test_preco_invalido(self):
+        response = self.client.get(reverse('produtos-list'), {'preco_min': 'barato'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_preco_nao_finito(self):
+        for parametros in ({'preco_min': 'NaN'}, {'preco_min': 'sNaN'}, {'preco_max': 'Infinity'}):
+            response = self.client.get(reverse('produtos-list'), parametros)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, parametros)
+
+    def test_ordenacoes(self):
+        por_preco = sorted(self.produtos, key=lambda p: (p.preco, p.id))
+        self.assertEqual(self._ids(ordering='preco'), [p.id for p in por_preco])
+        self.assertEqual(self._ids(ordering='-preco'), [p.id for p in reversed(por_preco)])
+        self.assertEqual(self._ids(ordering='-criado'), [p.id for p in reversed(self.produtos)])
+
+    def test_ordenacao_fora_da_lista(self):
+        response = self.client.get(reverse('produtos-list'), {'ordering': 'descricao'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_com_ordenacao_por_preco(self):
+        ids = []
+        response = self.client.get(
+            reverse('produtos-list'),
+            {'paginacao': 'cursor', 'ordering': '-preco', 'page_size': 2}
+        )
+        while True:
+            ids += [p['id'] for p in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+
+        esperado = sorted(self.produtos, key=lambda p: (p.preco, p.id), reverse=True)
+        self.assertEqual(ids, [p.id for p in esperado])
+
+
+class ProdutoTextoNormalizadoTeste(APITestCase):
+    """
+    Filtros de texto sem diferenciar acentos e maiúsculas, usando as
+    colunas normalizadas.
+    """
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nome='Eletrônicos e Informática')
+        self.produto = Produto.objects.create(
+            categoria=self.categoria,
+            nome='Fone  Elétrico  SEM FIO',
+            marca='JBL Áudio',
+            preco=200,
+            descricao='Descrição com mais de vinte caracteres'
+        )
+
+    def _ids(self, **params):
+        response = self.client.get(reverse('produtos-list'), params)
+        return [p['id'] for p in response.data['results']]
+
+    def test_normalizar(self):
+        self.assertEqual(normalizar('  Eletrônico   ÇÃO ß '), 'eletronico cao ss')
+        self.assertEqual(self.produto.nome_normalizado, 'fone eletrico sem fio')
+        self.assertEqual(self.categoria.nome_normalizado, 'eletronicos e informatica')
+
+    def test_filtros_ignoram_acentos_e_maiusculas(self):
+        self.assertEqual(self._ids(nome='eletrico sem'), [self.produto.id])
+        self.assertEqual(self._ids(marca='jbl audio'), [self.produto.id])
+        self.assertEqual(self._ids(marca='JBL ÁUDIO'), [self.produto.id])
+        self.assertEqual(self._ids(categoria_nome='informatica'), [self.produto.id])
+        self.assertEqual(self._ids(marca='jbl'), [])
+
+    def test_nome_busca_prefixo_de_palavra(self):
+        self.assertEqual(self._ids(nome='ELETR fo'), [self.produto.id])
+        self.assertEqual(self._ids(nome='sem fio fone'), [self.produto.id])
+        # pedaço do meio de uma palavra não encontra
+        self.assertEqual(self._ids(nome='letrico'), [])
+        # só pontuação: nenhuma palavra para buscar
+        self.assertEqual(self._ids(nome='"*'), [])
+        # marca e descrição não entram no ?nome=
+        self.assertEqual(self._ids(nome='jbl'), [])
+
+    def test_nome_mesma_regra_sem_indice_de_busca(self):
+        # bancos sem FTS5/tsvector caem na expressão regular: mesmo resultado
+        buscas = ['ELETR fo', 'sem fio fone', 'letrico', 'Elétrico', 'jbl', 'fone sem-fio']
+        esperado = {nome: self._ids(nome=nome) for nome in buscas}
+        with mock.patch.object(connection, 'vendor', 'outro'):
+            obtido = {
+                nome: list(buscar_no_nome(Produto.objects.ativos(), nome).values_list('id', flat=True))
+                for nome in buscas
+            }
+        self.assertEqual(obtido, esperado)
+        self.assertEqual(esperado['Elétrico'], [self.produto.id])
+
+    def test_operacoes_em_lote_mantem_colunas(self):
+        novo, = Produto.objects.bulk_create([Produto(nome='Câmera', marca='Canon', preco=10)])
+        self.assertEqual(novo.nome_normalizado, 'camera')
+
+        Produto.objects.filter(id=self.produto.id).update(marca='Sônÿ')
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.marca_normalizada, 'sony')
+
+        self.produto.nome = 'Ótimo Fone'
+        Produto.objects.bulk_update([self.produto], ['nome'])
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.nome_normalizado, 'otimo fone')
+
+        self.produto.nome = 'Fone Três'
+        self.produto.save(update_fields=['nome'])
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.nome_normalizado, 'fone tres')
+
+    def test_colunas_internas_fora_da_resposta(self):
+        response = self.client.get(reverse('produtos-detail', args=[self.produto.id]))
+        self.assertNotIn('nome_normalizado', response.data)
+        self.assertNotIn('marca_normalizada', response.data)
+
+    def test_facetas_juntam_grafias_da_mesma_marca(self):
+        Produto.objects.create(nome='Outro Fone', marca='jbl audio', preco=10)
+        response = self.client.get(reverse('produtos-facetas'))
+        self.assertEqual(response.data['marcas'][0]['total'], 2)
+
+
+class ProdutoImportacaoTeste(APITestCase):
+    """
+    Importação em massa por CSV/JSON Lines (comando e endpoint).
+    """
+
+    def setUp(self):
+        cache_catalogo().clear()
+        self.usuario = Usuario.objects.create(email='importa@teste.com', nome='Importa', senha='123')
+        self.categoria = Categoria.objects.create(nome='Eletrônicos')
+        self.descricao = 'Descrição com mais de vinte caracteres'
+
+    def _csv(self, nome='produtos.csv'):
+        conteudo = (
+            'nome,marca,preco,descricao,categoria\n'
+            f'Notebook,Dell,3500.00,{self.descricao},eletronicos\n'
+            f'No,Dell,10,{self.descricao},\n'
+            f'Cafeteira,Oster,250,{self.descricao},Cozinha\n'
+            f'Fone,JBL,-1,{self.descricao},\n'
+        )
+        return SimpleUploadedFile(nome, conteudo.encode('utf-8'), content_type='text/csv')
+
+    def test_endpoint_csv(self):
+        self.client.force_authenticate(user=self.usuario)
+        response = self.client.post(reverse('produtos-importar'), {'arquivo': self._csv()}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['processadas'], 4)
+        self.assertEqual(response.data['importadas'], 2)
+        self.assertEqual(response.data['total_erros'], 2)
+        # o cabeçalho é a linha 1
+        self.assertEqual([erro['linha'] for erro in response.data['erros']], [3, 5])
+        self.assertIn('nome', response.data['erros'][0]['erros'])
+        self.assertIn('preco', response.data['erros'][1]['erros'])
+
+        # categoria encontrada pelo nome normalizado, ou criada
+        notebook = Produto.objects.get(nome='Notebook')
+        self.assertEqual(notebook.categoria, self.categoria)
+        self.assertEqual(Produto.objects.get(nome='Cafeteira').categoria.nome, 'Cozinha')
+
+    def test_endpoint_exige_login_e_formato(self):
+        response = self.client.post(reverse('produtos-importar'), {'arquivo': self._csv()}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=self.usuario)
+        response = self.client.post(
+            reverse('produtos-importar'), {'arquivo': self._csv('produtos.txt')}, format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_comando_jsonl_em_lotes(self):
+        linhas = [
+            json.dumps({'nome': f'Produto {i}', 'marca': 'Marca', 'preco': '9.90',
+                        'descricao': self.descricao, 'categoria': 'Eletrônicos'})
+            for i in range(5)
+        ]
+        linhas.insert(2, '{quebrado')
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as arquivo:
+            arquivo.write('\n'.join(linhas))
+        self.addCleanup(os.remove, arquivo.name)
+
+        # a listagem fica em cache antes da importação
+        self.client.get(reverse('produtos-list'))
+
+        saida = io.StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('import_produtos', arquivo.name, '--lote', '2', stdout=saida, stderr=io.StringIO())
+
+        inserts = [q for q in consultas.captured_queries if q['sql'].startswith('INSERT INTO "produtos"')]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(Produto.objects.filter(categoria=self.categoria).count(), 5)
+        self.assertIn('Importados 5 de 6 produtos (1 erros)', saida.getvalue())
+        self.assertIn('linhas/s', saida.getvalue())
+
+        # bulk_create não dispara signals: a importação invalida o cache
+        response = self.client.get(reverse('produtos-list'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 5)
+
+    def test_sem_criar_categorias(self):
+        importador = ImportadorProdutos(criar_categorias=False)
+        resultado = importador.importar(iter([
+            (2, {'nome': 'Panela', 'marca': 'Tramontina', 'preco': '80', 'categoria': 'Cozinha'}),
+        ]))
+        self.assertEqual(resultado['importadas'], 0)
+        self.assertIn('categoria', resultado['erros'][0]['erros'])
+        self.assertFalse(Categoria.objects.filter(nome='Cozinha').exists())
+
+    def test_lote_com_falha_nao_deixa_categoria_e_invalida_cache(self):
+        linhas = [
+            (2, {'nome': 'Panela', 'marca': 'Tramontina', 'preco': '80', 'categoria': 'Cozinha'}),
+            (3, {'nome': 'Vaso', 'marca': 'Casa', 'preco': '30', 'categoria': 'Jardim'}),
+        ]
+        self.client.get(reverse('produtos-list'))
+        bulk_create = Produto.objects.bulk_create
+        chamadas = []
+
+        def falha_no_segundo_lote(objs, *args, **kwargs):
+            chamadas.append(objs)
+            if len(chamadas) == 2:
+                raise RuntimeError('falha no lote')
+            return bulk_create(objs, *args, **kwargs)
+
+        importador = ImportadorProdutos(tamanho_lote=1)
+        with mock.patch.object(Produto.objects, 'bulk_create', side_effect=falha_no_segundo_lote):
+            with self.assertRaises(RuntimeError):
+                importador.importar(iter(linhas))
+
+        # a categoria do lote que falhou volta junto com ele
+        self.assertTrue(Categoria.objects.filter(nome='Cozinha').exists())
+        self.assertFalse(Categoria.objects.filter(nome='Jardim').exists())
+        # o primeiro lote ficou gravado e já aparece na listagem
+        response = self.client.get(reverse('produtos-list'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual([p['nome'] for p in response.data['results']], ['Panela'])
+
+
+class ProdutoLoteTeste(APITestCase):
+    """
+    Alteração e soft delete em lote (PATCH/DELETE /produtos/lote/).
+    """
+
+    def setUp(self):
+        cache_catalogo().clear()
+        self.usuario = Usuario.objects.create(email='lote@teste.com', nome='Lote', senha='123')
+        self.categoria = Categoria.objects.create(nome='Áudio')
+        self.produtos = Produto.objects.bulk_create([
+            Produto(nome=f'Produto {i}', marca='Marca', preco=10 + i,
+                    descricao='Descrição com mais de vinte caracteres')
+            for i in range(4)
+        ])
+        self.ids = [p.id for p in self.produtos]
+        self.client.force_authenticate(user=self.usuario)
+
+    def _updates(self, consultas):
+        return [q for q in consultas.captured_queries if q['sql'].startswith('UPDATE')]
+
+    def test_mesmas_alteracoes_num_unico_update(self):
+        antes = Produto.objects.get(id=self.ids[0]).atualizado
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.patch(reverse('produtos-lote'), {
+                'ids': self.ids[:3] + [999999],
+                'alteracoes': {'preco': '5.00', 'categoria': self.categoria.id, 'marca': 'Sônÿ'},
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(self._updates(consultas)), 1)
+        self.assertEqual(response.data['alterados'], 3)
+        self.assertEqual(response.data['resultados'][-1], {'id': 999999, 'resultado': 'nao_encontrado'})
+
+        produto = Produto.objects.get(id=self.ids[0])
+        self.assertEqual(produto.preco, 5)
+        self.assertEqual(produto.categoria, self.categoria)
+        self.assertEqual(produto.marca_normalizada, 'sony')
+        self.assertGreater(produto.atualizado, antes)
+        self.assertEqual(Produto.objects.get(id=self.ids[3]).preco, 13)
+
+    def test_itens_com_alteracoes_diferentes(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.patch(reverse('produtos-lote'), {'itens': [
+                {'id': self.ids[0], 'preco': '1.00'},
+                {'id': self.ids[1], 'preco': '1.00'},
+                {'id': self.ids[2], 'nome': 'Novo nome'},
+                {'id': self.ids[3], 'preco': '-1'},
+            ]}, format='json')
+
+        self.assertEqual(len(self._updates(consultas)), 2)
+        resultados = {r['id']: r for r in response.data['resultados']}
+        self.assertEqual(resultados[self.ids[2]]['resultado'], 'atualizado')
+        self.assertEqual(resultados[self.ids[3]]['resultado'], 'invalido')
+        self.assertIn('preco', resultados[self.ids[3]]['erros'])
+        self.assertEqual(Produto.objects.get(id=self.ids[2]).nome, 'Novo nome')
+
+    def test_desativar_por_filtro_e_invalidar_cache(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(reverse('produtos-list')).data['count'], 4)
+
+        self.client.force_authenticate(user=self.usuario)
+        response = self.client.delete(reverse('produtos-lote') + '?preco_max=11')
+        self.assertEqual(response.data['alterados'], 2)
+        self.assertEqual({r['resultado'] for r in response.data['resultados']}, {'desativado'})
+        self.assertEqual(Produto.objects.filter(ativo=False).count(), 2)
+
+        # já desativados não são encontrados de novo, como no DELETE de um produto
+        response = self.client.delete(reverse('produtos-lote'), {'ids': self.ids[:1]}, format='json')
+        self.assertEqual(response.data['resultados'], [{'id': self.ids[0], 'resultado': 'nao_encontrado'}])
+
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('produtos-list'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_erros_de_entrada(self):
+        url = reverse('produtos-lote')
+        # sem ids nem filtros: não altera o catálogo inteiro
+        response = self.client.patch(url, {'alteracoes': {'preco': '1.00'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(url, {'ids': self.ids, 'alteracoes': {'id': 5}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(url, {'ids': ['x']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_authenticate(user=None)
+        response = self.client.delete(url, {'ids': self.ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(Produto.objects.filter(ativo=True).count(), 4)
+
+
+class ProdutoExportacaoTeste(APITestCase):
+    """
+    Exportação em streaming (GET /produtos/exportar/).
+    """
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nome='Áudio')
+        self.produtos = Produto.objects.bulk_create([
+            Produto(nome=f'Produto {i}', marca='Marca', preco=f'{10 + i}.50', categoria=self.categoria,
+                    descricao='Descrição, com "aspas" e mais de vinte caracteres')
+            for i in range(5)
+        ])
+        Produto.objects.filter(id=self.produtos[4].id).update(ativo=False)
+
+    def _conteudo(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ndjson_em_streaming(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('produtos-exportar'))
+        # nada é lido do banco antes de a resposta começar a ser enviada
+        self.assertEqual(len(consultas), 0)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+
+        linhas = [json.loads(linha) for linha in self._conteudo(response).decode().splitlines()]
+        self.assertEqual([l['id'] for l in linhas], [p.id for p in self.produtos[:4]])
+        self.assertEqual(linhas[0]['preco'], '10.50')
+        self.assertEqual(linhas[0]['categoria_nome'], 'Áudio')
+
+    def test_csv_com_filtros_e_gzip(self):
+        response = self.client.get(
+            reverse('produtos-exportar'), {'formato': 'csv', 'preco_min': 12}, HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        texto = gzip.decompress(self._conteudo(response)).decode()
+        linhas = list(csv.DictReader(io.StringIO(texto)))
+        self.assertEqual([int(l['id']) for l in linhas], [p.id for p in self.produtos[2:4]])
+        self.assertEqual(linhas[0]['descricao'], 'Descrição, com "aspas" e mais de vinte caracteres')
+
+    def test_desde(self):
+        Produto.objects.filter(id=self.produtos[0].id).update(atualizado=timezone.now() + timedelta(days=1))
+        amanha = (timezone.now() + timedelta(hours=12)).isoformat()
+        response = self.client.get(reverse('produtos-exportar'), {'desde': amanha})
+        linhas = self._conteudo(response).decode().splitlines()
+        self.assertEqual([json.loads(l)['id'] for l in linhas], [self.produtos[0].id])
+
+        response = self.client.get(reverse('produtos-exportar'), {'desde': 'ontem'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('produtos-exportar'), {'formato': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProdutoCamposDinamicosTeste(APITestCase):
+    """
+    ?fields=, ?omit= e ?expand= em produtos e categorias.
+    """
+
+    def setUp(self):
+        cache_catalogo().clear()
+        self.usuario = Usuario.objects.create(email='campos@teste.com', nome='Campos', senha='123')
+        self.categoria = Categoria.objects.create(nome='Áudio', descricao='Fones e caixas')
+        self.produtos = [
+            Produto.objects.create(categoria=self.categoria, nome=f'Produto {i}', marca='Marca',
+                                   preco=10 + i, descricao='Descrição com mais de vinte caracteres')
+            for i in range(3)
+        ]
+        self.usuario.favoritos.add(self.produtos[0])
+
+    def _select_produtos(self, consultas):
+        return [q['sql'] for q in consultas.captured_queries
+                if q['sql'].startswith('SELECT "produtos"."id"')]
+
+    def test_fields_limita_resposta_e_select(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('produtos-list'), {'fields': 'id,nome,preco'})
+
+        self.assertEqual(set(response.data['results'][0]), {'id', 'nome', 'preco'})
+        sql, = self._select_produtos(consultas)
+        self.assertNotIn('descricao', sql)
+        self.assertNotIn('JOIN', sql)
+
+    def test_omit_is_favorito_nao_consulta_favoritos(self):
+        self.client.force_authenticate(user=self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('produtos-list'), {'omit': 'is_favorito,descricao'})
+        self.assertNotIn('is_favorito', response.data['results'][0])
+        self.assertNotIn('descricao', response.data['results'][0])
+        self.assertFalse([q for q in consultas.captured_queries if 'usuarios_favoritos' in q['sql']])
+
+        response = self.client.get(reverse('produtos-meus-favoritos'), {'fields': 'id,is_favorito'})
+        self.assertEqual(response.data['results'], [{'id': self.produtos[0].id, 'is_favorito': True}])
+
+    def test_expand_categoria_sem_consulta_extra(self):
+        with CaptureQueriesContext(connection) as normal:
+            self.client.get(reverse('produtos-list'))
+        cache_catalogo().clear()
+        with CaptureQueriesContext(connection) as expandido:
+            response = self.client.get(reverse('produtos-list'), {'expand': 'categoria'})
+
+        self.assertEqual(len(expandido), len(normal))
+        categoria = response.data['results'][0]['categoria']
+        self.assertEqual(categoria['nome'], 'Áudio')
+        self.assertEqual(categoria['descricao'], 'Fones e caixas')
+
+        response = self.client.get(reverse('produtos-detail', args=[self.produtos[1].id]),
+                                   {'fields': 'id,categoria', 'expand': 'categoria'})
+        self.assertEqual(response.data['categoria']['id'], self.categoria.id)
+
+    def test_cursor_com_fields_fora_da_ordenacao(self):
+        response = self.client.get(reverse('produtos-list'),
+                                   {'paginacao': 'cursor', 'page_size': 2, 'ordering': 'preco', 'fields': 'id'})
+        self.assertEqual(response.data['results'], [{'id': p.id} for p in self.produtos[:2]])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'id': self.produtos[2].id}])
+
+    def test_campos_invalidos_e_categorias(self):
+        response = self.client.get(reverse('produtos-list'), {'fields': 'id,nome_normalizado'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+        response = self.client.get(reverse('produtos-list'), {'expand': 'marca'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('categorias-list'), {'fields': 'nome'})
+        self.assertEqual(response.data['results'], [{'nome': 'Áudio'}])
+
+
+class ProdutoLeituraRapidaTeste(APITestCase):
+    """
+    A listagem via values() (leitura_rapida.py) gera o mesmo JSON do
+    ProdutoSerializer.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(email='rapida@teste.com', nome='Rápida', senha='123')
+        categoria = Categoria.objects.create(nome='Áudio')
+        self.produtos = [
+            Produto.objects.create(categoria=categoria if i % 2 else None, nome=f'Fone {i}', marca='Marca',
+                                   preco=f'{i}9.9', descricao='Descrição com mais de vinte caracteres')
+            for i in range(1, 5)
+        ]
+        Produto.objects.filter(id=self.produtos[0].id).update(imagem='produtos/fone 1.jpg')
+        self.usuario.favoritos.add(self.produtos[1])
+
+    def _comparar(self, **params):
+        cache_catalogo().clear()
+        with mock.patch.object(ProdutoViewSet, 'leitura_rapida', False):
+            normal = self.client.get(reverse('produtos-list'), params)
+        cache_catalogo().clear()
+        rapida = self.client.get(reverse('produtos-list'), params)
+        self.assertEqual(normal.status_code, status.HTTP_200_OK)
+        self.assertEqual(rapida.content, normal.content)
+        return rapida
+
+    def test_mesmo_json(self):
+        self._comparar()
+        self._comparar(fields='id,imagem,preco')
+        self._comparar(q='fone', omit='descricao')
+        response = self._comparar(paginacao='cursor', ordering='-preco', page_size=2)
+        self.assertIsNotNone(response.data['next'])
+        self.client.force_authenticate(user=self.usuario)
+        response = self._comparar()
+        self.assertTrue(response.data['results'][1]['is_favorito'])
+
+    def test_usa_values_e_volta_ao_serializer_quando_preciso(self):
+        with mock.patch.object(LeituraRapida, 'converter', autospec=True,
+                               side_effect=LeituraRapida.converter) as converter:
+            self.client.get(reverse('produtos-list'), {'page_size': 3})
+            self.assertEqual(converter.call_count, 1)
+            cache_catalogo().clear()
+            # o objeto da categoria ainda não tem conversor
+            response = self.client.get(reverse('produtos-list'), {'expand': 'categoria'})
+            self.assertEqual(converter.call_count, 1)
+        self.assertEqual(response.data['results'][0]['categoria']['nome'], 'Áudio')
+
+
+class JSONRapidoTeste(TestCase):
+    """
+    Renderer/parser com orjson (docelar/renderers.py e parsers.py) geram e
+    leem o mesmo JSON do DRF padrão.
+    """
+
+    def _dados(self):
+        return {
+            'preco': Decimal('1234.50'),
+            'texto': 'Ação\u2028linha\u2029 "aspas"',
+            'utc': datetime(2024, 5, 1, 10, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'sao_paulo': datetime(2024, 5, 1, 10, 30, tzinfo=dt_timezone(timedelta(hours=-3))),
+            'dia': date(2024, 5, 1),
+            'erro': ErrorDetail('Campo obrigatório.', code='required'),
+            'traduzido': gettext_lazy('Not found.'),
+            1: [None, True, 1.5, 0.25, -0.0, 2 ** 70],
+        }
+
+    def test_mesma_saida_do_json_renderer(self):
+        dados = self._dados()
+        esperado = JSONRenderer().render(dados)
+        self.assertEqual(JSONRapidoRenderer().render(dados), esperado)
+        # sem o inteiro de 70 bits, quem gera é o orjson
+        del dados[1][-1]
+        self.assertEqual(JSONRapidoRenderer().render(dados), JSONRenderer().render(dados))
+        self.assertIn(b'\\u2028', JSONRapidoRenderer().render(dados))
+
+        with mock.patch('docelar.renderers.orjson', None):
+            self.assertEqual(JSONRapidoRenderer().render(dados), JSONRenderer().render(dados))
+        self.assertEqual(
+            JSONRapidoRenderer().render(dados, 'application/json; indent=4'),
+            JSONRenderer().render(dados, 'application/json; indent=4'),
+        )
+
+        # floats que o orjson escreveria diferente (0.00001, 1e16)
+        for valor in (1e-05, 1e16, -2.5e-300):
+            dados[1].append(valor)
+            self.assertEqual(JSONRapidoRenderer().render(dados), JSONRenderer().render(dados))
+
+        # NaN/Infinity: com STRICT_JSON (padrão) os dois recusam, sem ele
+        # os dois escrevem NaN (o orjson sozinho escreveria null)
+        for valor in (float('nan'), float('inf')):
+            with self.assertRaises(ValueError):
+                JSONRenderer().render({'pontuacao': [valor]})
+            with self.assertRaises(ValueError):
+                JSONRapidoRenderer().render({'pontuacao': [valor]})
+            renderer, padrao = JSONRapidoRenderer(), JSONRenderer()
+            renderer.strict = padrao.strict = False
+            self.assertEqual(renderer.render({'pontuacao': valor}), padrao.render({'pontuacao': valor}))
+
+    def test_parser(self):
+        corpo = '{"nome": "Fone", "preco": 9.9, "ids": [1, 2], "grande": %d}' % 2 ** 70
+        for texto in (corpo, '{"nome": "Ação"}'):
+            self.assertEqual(
+                JSONRapidoParser().parse(io.BytesIO(texto.encode())),
+                JSONParser().parse(io.BytesIO(texto.encode())),
+            )
+        with self.assertRaises(ParseError):
+            JSONRapidoParser().parse(io.BytesIO(b'{"nome": '))
+
+    def test_api_usa_o_renderer(self):
+        response = self.client.get(reverse('produtos-list'))
+        self.assertIsInstance(response.accepted_renderer, JSONRapidoRenderer)
+
+
+class CompressaoMiddlewareTeste(APITestCase):
+    """
+    Compressão das respostas (docelar/middleware.py).
+    """
+
+    def setUp(self):
+        cache_catalogo().clear()
+        caches['compressao'].clear()
+        Produto.objects.bulk_create([
+            Produto(nome=f'Produto {i}', marca='Marca', preco=10 + i,
+                    descricao='Descrição com mais de vinte caracteres')
+            for i in range(10)
+        ])
+
+    def test_gzip_na_listagem(self):
+        normal = self.client.get(reverse('produtos-list'))
+        cache_catalogo().clear()
+        response = self.client.get(reverse('produtos-list'), HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), normal.content)
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(response['ETag'], 'W/' + normal['ETag'])
+
+        # a ETag fraca continua valendo no If-None-Match
+        response = self.client.get(reverse('produtos-list'), HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_negociacao(self):
+        disponiveis = codificacoes_disponiveis()
+        self.assertIsNone(escolher_codificacao('gzip;q=0, identity', disponiveis))
+        self.assertIsNone(escolher_codificacao('', disponiveis))
+        self.assertEqual(escolher_codificacao('*', disponiveis), next(iter(disponiveis)))
+        self.assertEqual(escolher_codificacao('br;q=0.5, gzip', disponiveis), 'gzip')
+
+    @unittest.skipUnless(brotli, 'brotli não instalado')
+    def test_brotli_preferido(self):
+        response = self.client.get(reverse('produtos-list'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(brotli.decompress(response.content))['count'], 10)
+
+    def test_respostas_que_nao_comprimem(self):
+        produto = Produto.objects.first()
+        # abaixo do tamanho mínimo
+        response = self.client.get(reverse('produtos-detail', args=[produto.id]), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        # imagem já é compactada
+        imagem = HttpResponse(b'\xff' * 5000, content_type='image/jpeg')
+        middleware = CompressaoMiddleware(lambda request: imagem)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(middleware(request).has_header('Content-Encoding'))
+
+        # a exportação já vem compactada: não comprime de novo
+        response = self.client.get(reverse('produtos-exportar'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(gzip.decompress(b''.join(response.streaming_content)).splitlines()), 10)
+
+    def test_streaming_comprime_aos_poucos(self):
+        lidos = []
+
+        def pedacos():
+            for i in range(3):
+                lidos.append(i)
+                yield f'linha {i}\n'.encode() * 200
+
+        middleware = CompressaoMiddleware(lambda request: StreamingHttpResponse(pedacos(), content_type='text/csv'))
+        with override_settings(COMPRESSAO_CACHE=None):
+            response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        conteudo = iter(response.streaming_content)
+        primeiro = next(conteudo)
+        # só o primeiro pedaço foi lido e já saiu comprimido
+        self.assertEqual(lidos, [0])
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        corpo = gzip.decompress(primeiro + b''.join(conteudo))
+        self.assertEqual(corpo.count(b'\n'), 600)
+
+    def test_corpo_comprimido_fica_no_cache(self):
+        with mock.patch('docelar.middleware.comprimir', wraps=comprimir) as comprimindo:
+            primeira = self.client.get(reverse('produtos-list'), HTTP_ACCEPT_ENCODING='gzip')
+            segunda = self.client.get(reverse('produtos-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual(segunda.content, primeira.content)
+        self.assertEqual(comprimindo.call_count, 1)
+        # num cache próprio, não no do catálogo
+        self.assertFalse(any(chave.startswith('compressao:') for chave in cache_catalogo()._cache))
+
+    def test_resposta_de_usuario_logado_nao_fica_no_cache(self):
+        usuario = Usuario.objects.create(email='comprime@teste.com', nome='Comprime', cpf='12345678901', senha='123')
+        self.client.force_authenticate(user=usuario)
+        with mock.patch('docelar.middleware.comprimir', wraps=comprimir) as comprimindo:
+            for _ in range(2):
+                response = self.client.get(reverse('produtos-list'), HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(comprimindo.call_count, 2)
+        self.assertEqual(caches['compressao']._cache, {})
+
+    def test_html_nao_comprime(self):
+        # BREACH: a página leva o token CSRF
+        pagina = HttpResponse(b'<html>' + b'x' * 5000, content_type='text/html; charset=utf-8')
+        middleware = CompressaoMiddleware(lambda request: pagina)
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProdutoVariantesImagemTeste(APITestCase):
+    """
+    Variantes thumb/card/full em WebP e JPEG geradas no upload e pelo
+    comando gerar_variantes_imagens.
+    """
+
+    def setUp(self):
+        cache_catalogo().clear()
+        self.usuario = Usuario.objects.create(email='imagem@teste.com', nome='Imagem', senha='123')
+        self.client.force_authenticate(user=self.usuario)
+
+    def _png(self, nome='foto.png', tamanho=(800, 600)):
+        buffer = io.BytesIO()
+        Image.new('RGBA', tamanho, (200, 30, 30, 128)).save(buffer, format='PNG')
+        return SimpleUploadedFile(nome, buffer.getvalue(), content_type='image/png')
+
+    def _arquivo(self, url):
+        return os.path.join(Produto._meta.get_field('imagem').storage.location, url.split('/media/', 1)[1])
+
+    def test_upload_gera_variantes(self):
+        response = self.client.post(reverse('produtos-list'), {
+            'nome': 'Abajur', 'marca': 'Luz', 'preco': '99.90',
+            'descricao': 'Descrição com mais de vinte caracteres', 'ativo': True, 'imagem': self._png(),
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        imagens = response.data['imagens']
+        self.assertEqual(set(imagens), {'thumb', 'card', 'full'})
+        self.assertEqual(set(imagens['thumb']), {'webp', 'jpeg'})
+
+        with Image.open(self._arquivo(imagens['thumb']['webp'])) as thumb:
+            self.assertEqual(thumb.size, (160, 120))
+        with Image.open(self._arquivo(imagens['full']['jpeg'])) as full:
+            # nunca amplia a imagem, e o JPEG não tem transparência
+            self.assertEqual((full.size, full.mode), ((800, 600), 'RGB'))
+
+        # trocar a imagem gera as variantes da nova
+        url = reverse('produtos-detail', args=[response.data['id']])
+        response = self.client.patch(url, {'imagem': self._png('outra.png', (100, 100))}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['imagens'], imagens)
+        with Image.open(self._arquivo(response.data['imagens']['card']['webp'])) as card:
+            self.assertEqual(card.size, (100, 100))
+
+        # a listagem via values() mostra as mesmas URLs
+        cache_catalogo().clear()
+        listagem = self.client.get(reverse('produtos-list'))
+        self.assertEqual(listagem.data['results'][0]['imagens'], response.data['imagens'])
+
+    def test_variantes_existentes_nao_sao_apagadas(self):
+        storage = Produto._meta.get_field('imagem').storage
+        nome = storage.save('produtos/abajur.png', self._png())
+        primeiras = gerar_variantes(nome)
+        with mock.patch.object(storage, 'delete') as apagando:
+            self.assertEqual(gerar_variantes(nome), primeiras)
+        apagando.assert_not_called()
+
+        # num storage comum, o arquivo com o nome da variante é reaproveitado
+        comum = FileSystemStorage(location=tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, comum.location)
+        nome = comum.save('produtos/abajur.png', self._png())
+        primeiras = gerar_variantes(nome, comum)
+        with mock.patch.object(comum, 'delete') as apagando, mock.patch.object(comum, 'save') as gravando:
+            self.assertEqual(gerar_variantes(nome, comum), primeiras)
+        apagando.assert_not_called()
+        gravando.assert_not_called()
+
+    def test_comando_gera_variantes_pendentes(self):
+        sem_imagem = Produto.objects.create(nome='Vaso', marca='Casa', preco='10.00',
+                                            descricao='Descrição com mais de vinte caracteres')
+        com_imagem = Produto.objects.create(nome='Quadro', marca='Casa', preco='20.00',
+                                            descricao='Descrição com mais de vinte caracteres')
+        com_imagem.imagem.save('quadro.png', self._png(), save=True)
+        self.assertEqual(com_imagem.imagem_variantes, {})
+
+        call_command('gerar_variantes_imagens', '--processos', '1', stdout=io.StringIO())
+        com_imagem.refresh_from_db()
+        sem_imagem.refresh_from_db()
+        self.assertEqual(com_imagem.imagem_variantes, gerar_variantes(com_imagem.imagem.name))
+        self.assertEqual(sem_imagem.imagem_variantes, {})
+
+        # sem --todos, quem já tem variantes não é processado de novo
+        saida = io.StringIO()
+        call_command('gerar_variantes_imagens', '--processos', '1', stdout=saida)
+        self.assertIn('Nenhuma imagem sem variantes', saida.getvalue())
+
+
+class ArmazenamentoPorConteudoTeste(APITestCase):
+    """
+    Imagens gravadas pelo hash do conteúdo (armazenamento.py) e limpeza
+    dos arquivos sem uso (comando limpar_midia).
+    """
+
+    def setUp(self):
+        cache_catalogo().clear()
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        self.enterContext(override_settings(MEDIA_ROOT=pasta))
+        self.storage = Produto._meta.get_field('imagem').storage
+        self.usuario = Usuario.objects.create(email='midia@teste.com', nome='Mídia', senha='123')
+        self.client.force_authenticate(user=self.usuario)
+
+    def _png(self, cor=(10, 120, 200), nome='foto.PNG'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 200), cor).save(buffer, format='PNG')
+        return SimpleUploadedFile(nome, buffer.getvalue(), content_type='image/png')
+
+    def _criar(self, imagem, nome='Luminária'):
+        response = self.client.post(reverse('produtos-list'), {
+            'nome': nome, 'marca': 'Luz', 'preco': '59.90', 'ativo': True,
+            'descricao': 'Descrição com mais de vinte caracteres', 'imagem': imagem,
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Produto.objects.get(id=response.data['id'])
+
+    def _arquivos(self):
+        return set(self.storage.arquivos('produtos'))
+
+    def test_mesma_foto_vira_um_arquivo(self):
+        png = self._png()
+        resumo = hashlib.sha256(png.read()).hexdigest()
+        png.seek(0)
+
+        primeiro = self._criar(png)
+        self.assertEqual(primeiro.imagem.name, f'produtos/{resumo[:2]}/{resumo}.png')
+        arquivos = self._arquivos()
+        # original + thumb e card em WebP/JPEG; a imagem é menor que o card,
+        # então o full sai idêntico ao card e não gera outro arquivo
+        self.assertEqual(len(arquivos), 5)
+
+        # a mesma foto com outro nome: mesmo arquivo, variantes reaproveitadas
+        with mock.patch('produtos.imagens.gerar_variantes') as gerando:
+            segundo = self._criar(self._png(nome='copia.png'), nome='Luminária 2')
+        gerando.assert_not_called()
+        self.assertEqual(segundo.imagem.name, primeiro.imagem.name)
+        self.assertEqual(segundo.imagem_variantes, primeiro.imagem_variantes)
+        self.assertEqual(self._arquivos(), arquivos)
+
+    def test_limpar_midia(self):
+        primeiro = self._criar(self._png())
+        segundo = self._criar(self._png(), nome='Luminária 2')
+        antigos = self._arquivos()
+
+        # o primeiro troca de foto: os arquivos antigos ainda são do segundo
+        url = reverse('produtos-detail', args=[primeiro.id])
+        self.client.patch(url, {'imagem': self._png((250, 250, 0))}, format='multipart')
+        call_command('limpar_midia', '--idade-minima', '0', stdout=io.StringIO())
+        self.assertTrue(antigos <= self._arquivos())
+
+        # produto desativado pode ser reativado: a imagem continua em uso
+        self.client.delete(reverse('produtos-detail', args=[segundo.id]))
+        call_command('limpar_midia', '--idade-minima', '0', stdout=io.StringIO())
+        self.assertTrue(antigos <= self._arquivos())
+        segundo.refresh_from_db()
+        self.assertTrue(segundo.imagem)
+
+        # recém-gravados ficam, mesmo sem uso
+        call_command('limpar_midia', '--apagar-imagens-de-inativos', stdout=io.StringIO())
+        self.assertTrue(antigos <= self._arquivos())
+
+        saida = io.StringIO()
+        call_command('limpar_midia', '--idade-minima', '0', '--apagar-imagens-de-inativos', '--simular', stdout=saida)
+        self.assertIn('5 arquivos seriam apagados', saida.getvalue())
+        self.assertTrue(antigos <= self._arquivos())
+
+        call_command('limpar_midia', '--idade-minima', '0', '--apagar-imagens-de-inativos', stdout=io.StringIO())
+        primeiro.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertFalse(segundo.imagem)
+        self.assertEqual(self._arquivos(), {primeiro.imagem.name, *(
+            nome for formatos in primeiro.imagem_variantes.values() for nome in formatos.values()
+        )})
+
+
+class MidiaTeste(TestCase):
+    """
+    Entrega dos arquivos de MEDIA_ROOT (docelar/midia.py).
+    """
+
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        self.enterContext(override_settings(MEDIA_ROOT=pasta, MIDIA_ENVIO=None))
+        self.conteudo = bytes(range(256)) * 40
+        self.resumo = hashlib.sha256(self.conteudo).hexdigest()
+        self.nome = f'produtos/{self.resumo[:2]}/{self.resumo}.jpg'
+        for nome in (self.nome, 'produtos/antiga.jpg'):
+            os.makedirs(os.path.join(pasta, os.path.dirname(nome)), exist_ok=True)
+            with open(os.path.join(pasta, nome), 'wb') as arquivo:
+                arquivo.write(self.conteudo)
+
+    def test_arquivo_inteiro_e_cache(self):
+        response = self.client.get('/media/' + self.nome)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        # nome pelo hash: nunca muda
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['ETag'], f'"{self.resumo}"')
+
+        response = self.client.get('/media/produtos/antiga.jpg')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+        response = self.client.get('/media/' + self.nome, HTTP_IF_NONE_MATCH=f'"{self.resumo}"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        ultima = self.client.get('/media/produtos/antiga.jpg')['Last-Modified']
+        response = self.client.get('/media/produtos/antiga.jpg', HTTP_IF_MODIFIED_SINCE=ultima)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range(self):
+        url = '/media/' + self.nome
+        response = self.client.get(url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.conteudo)}')
+        self.assertEqual(response['Content-Length'], '100')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[-10:])
+        response = self.client.get(url, HTTP_RANGE='bytes=10000-')
+        self.assertEqual(b''.join(response.streaming_content), self.conteudo[10000:])
+
+        response = self.client.get(url, HTTP_RANGE=f'bytes={len(self.conteudo)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.conteudo)}')
+
+        # If-Range de outra versão: manda o arquivo inteiro
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"outra"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # o middleware de compressão não mexe no 206
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_caminho_fora_de_media_root(self):
+        for caminho in ('../docelar/settings.py', 'produtos/../../manage.py', 'produtos', 'produtos/nao-existe.jpg'):
+            self.assertEqual(self.client.get('/media/' + caminho).status_code, status.HTTP_404_NOT_FOUND, caminho)
+        self.assertEqual(self.client.post('/media/' + self.nome).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_envio_pelo_servidor_web(self):
+        with override_settings(MIDIA_ENVIO='x-accel-redirect', MIDIA_PREFIXO_INTERNO='/_media/'):
+            response = self.client.get('/media/' + self.nome)
+        self.assertEqual(response['X-Accel-Redirect'], '/_media/' + self.nome)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        with override_settings(MIDIA_ENVIO='x-sendfile'):
+            response = self.client.get('/media/produtos/antiga.jpg')
+        self.assertEqual(response['X-Sendfile'], os.path.join(settings.MEDIA_ROOT, 'produtos', 'antiga.jpg'))
+
+
+class ProdutoFavoritoIdempotenteTeste(APITestCase):
+    """
+    PUT/DELETE /produtos/{id}/favorito/ e /produtos/favoritos/ com um
+    INSERT ou DELETE só (favoritos.py), e o toggle em cima deles.
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(email='favorito@teste.com', nome='Favorito', senha='123')
+        self.client.force_authenticate(user=self.usuario)
+        self.produtos = [
+            Produto.objects.create(nome=f'Caneca {i}', marca='Casa', preco=10,
+                                   descricao='Descrição com mais de vinte caracteres')
+            for i in range(4)
+        ]
+        self.inativo = Produto.objects.create(nome='Antigo', marca='Casa', preco=10, ativo=False,
+                                              descricao='Descrição com mais de vinte caracteres')
+
+    def _ids(self):
+        return set(self.usuario.favoritos.values_list('id', flat=True))
+
+    def _na_tabela(self, consultas):
+        tabela = Usuario.favoritos.through._meta.db_table
+        return [q for q in consultas.captured_queries if tabela in q['sql']]
+
+    def test_put_e_delete_idempotentes(self):
+        url = reverse('produtos-favorito', args=[self.produtos[0].id])
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.put(url)
+        self.assertEqual(len(self._na_tabela(consultas)), 1)
+        self.assertEqual(response.data, {'id': self.produtos[0].id, 'favoritado': True, 'alterado': True})
+
+        # repetir não inverte nem duplica
+        response = self.client.put(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['alterado'])
+        self.assertEqual(self._ids(), {self.produtos[0].id})
+
+        for alterado in (True, False):
+            response = self.client.delete(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual((response.data['favoritado'], response.data['alterado']), (False, alterado))
+        self.assertEqual(self._ids(), set())
+
+    def test_produto_inexistente_ou_inativo(self):
+        for produto_id in (self.inativo.id, 9999):
+            response = self.client.put(reverse('produtos-favorito', args=[produto_id]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self._ids(), set())
+
+        # tirar dos favoritos um produto desativado continua possível
+        self.usuario.favoritos.add(self.inativo)
+        response = self.client.delete(reverse('produtos-favorito', args=[self.inativo.id]))
+        self.assertTrue(response.data['alterado'])
+        self.assertEqual(self.client.delete(reverse('produtos-favorito', args=[9999])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.put(reverse('produtos-favorito', args=[self.produtos[0].id])).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_lote(self):
+        self.usuario.favoritos.add(self.produtos[0])
+        ids = [p.id for p in self.produtos[:3]] + [self.inativo.id, 9999]
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.put(reverse('produtos-favoritos-lote'), {'ids': ids}, format='json')
+        self.assertEqual(len(self._na_tabela(consultas)), 1)
+        self.assertEqual(response.data, {'total': 5, 'alterados': 2, 'ids': [self.produtos[1].id, self.produtos[2].id]})
+        self.assertEqual(self._ids(), {p.id for p in self.produtos[:3]})
+
+        response = self.client.delete(reverse('produtos-favoritos-lote'), {'ids': ids}, format='json')
+        self.assertEqual(response.data['alterados'], 3)
+        self.assertEqual(self._ids(), set())
+
+        response = self.client.put(reverse('produtos-favoritos-lote'), {'ids': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ids', response.data)
+
+    def test_toggle(self):
+        url = reverse('produtos-favoritar', args=[self.produtos[0].id])
+        self.assertTrue(self.client.post(url).data['favoritado'])
+        self.assertEqual(self._ids(), {self.produtos[0].id})
+        self.assertFalse(self.client.post(url).data['favoritado'])
+        self.assertEqual(self._ids(), set())
+        self.assertEqual(self.client.post(reverse('produtos-favoritar', args=[self.inativo.id])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_toggle_de_favorito_inativo_da_404(self):
+        favoritar(self.usuario, [self.produtos[0].id])
+        self.produtos[0].ativo = False
+        self.produtos[0].save()
+        response = self.client.post(reverse('produtos-favoritar', args=[self.produtos[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        # continua nos favoritos: nada foi invertido
+        self.assertTrue(Favorito.objects.filter(usuario=self.usuario, produto=self.produtos[0]).exists())
+
+
+class ProdutoTotalFavoritosTeste(APITestCase):
+    """
+    Produto.total_favoritos acompanha todas as formas de favoritar e
+    ordena GET /produtos/mais-favoritados/.
+    """
+
+    def setUp(self):
+        self.usuarios = [
+            Usuario.objects.create(email=f'fa{i}@teste.com', nome=f'Fã {i}', cpf=f'0000000000{i}', senha='123')
+            for i in range(3)
+        ]
+        self.produtos = [
+            Produto.objects.create(nome=f'Tapete {i}', marca='Casa', preco=10,
+                                   descricao='Descrição com mais de vinte caracteres')
+            for i in range(3)
+        ]
+
+    def _totais(self):
+        return list(Produto.objects.order_by('nome').values_list('total_favoritos', flat=True))
+
+    def test_contador_acompanha_orm_e_api(self):
+        primeiro, segundo, terceiro = self.produtos
+        self.usuarios[0].favoritos.add(primeiro, segundo)
+        self.usuarios[0].favoritos.add(primeiro)  # já estava: não conta de novo
+        primeiro.favoritados.add(self.usuarios[1], self.usuarios[2])
+        self.assertEqual(self._totais(), [3, 1, 0])
+
+        self.usuarios[1].favoritos.remove(primeiro, terceiro)  # terceiro não era favorito
+        self.assertEqual(self._totais(), [2, 1, 0])
+        segundo.favoritados.clear()
+        self.assertEqual(self._totais(), [2, 0, 0])
+
+        self.client.force_authenticate(user=self.usuarios[1])
+        self.client.put(reverse('produtos-favorito', args=[terceiro.id]))
+        self.client.put(reverse('produtos-favorito', args=[terceiro.id]))
+        ids = [p.id for p in self.produtos]
+        self.client.put(reverse('produtos-favoritos-lote'), {'ids': ids}, format='json')
+        self.assertEqual(self._totais(), [3, 1, 1])
+        self.client.post(reverse('produtos-favoritar', args=[segundo.id]))
+        self.assertEqual(self._totais(), [3, 0, 1])
+
+        self.usuarios[2].delete()
+        self.assertEqual(self._totais(), [2, 0, 1])
+
+    def test_save_nao_sobrescreve_o_contador(self):
+        produto = Produto.objects.get(id=self.produtos[0].id)
+        self.usuarios[0].favoritos.add(produto)
+        produto.preco = 20
+        produto.save()
+        self.assertEqual(Produto.objects.get(id=produto.id).total_favoritos, 1)
+
+        self.client.force_authenticate(user=self.usuarios[0])
+        response = self.client.patch(reverse('produtos-detail', args=[produto.id]), {'preco': '30'}, format='json')
+        self.assertNotIn('total_favoritos', response.data)
+        self.assertEqual(Produto.objects.get(id=produto.id).total_favoritos, 1)
+
+    def test_recontar(self):
+        self.usuarios[0].favoritos.add(*self.produtos[:2])
+        Produto.objects.update(total_favoritos=7)
+        saida = io.StringIO()
+        call_command('recontar_favoritos', stdout=saida)
+        self.assertIn('3 produtos', saida.getvalue())
+        self.assertEqual(self._totais(), [1, 1, 0])
+
+    def test_mais_favoritados(self):
+        for usuario in self.usuarios:
+            usuario.favoritos.add(self.produtos[1])
+        self.usuarios[0].favoritos.add(self.produtos[2])
+        self.usuarios[1].favoritos.add(self.produtos[2])
+        self.usuarios[2].favoritos.add(self.produtos[0])
+        Produto.objects.filter(id=self.produtos[0].id).update(ativo=False)
+
+        response = self.client.get(reverse('produtos-mais-favoritados'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ranking = [(p['id'], p['total_favoritos']) for p in response.data['results']]
+        self.assertEqual(ranking, [(self.produtos[1].id, 3), (self.produtos[2].id, 2)])
+
+        # a listagem normal não mostra o contador
+        self.assertNotIn('total_favoritos', self.client.get(reverse('produtos-list')).data['results'][0])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN é do SQLite')
+    def test_ranking_usa_indice(self):
+        ranking = Produto.objects.ativos().filter(total_favoritos__gt=0).order_by('-total_favoritos', 'id')[:10]
+        planos = planos_de_consulta(ranking)
+        self.assertEqual(varreduras_de_tabela(planos), [], planos)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', planos)
+        self.assertFalse([plano for plano in planos if 'favoritos' in plano and 'produtos_ativo' not in plano], planos)
+
+
+@override_settings(PRODUTOS_TENDENCIA_MEIA_VIDA=24, PRODUTOS_EVENTOS_MARGEM=0)
+class ProdutoTendenciasTeste(APITestCase):
+    """
+    Favoritos com data, eventos de favorito e GET /produtos/em-alta/ com
+    pontuação que cai pela metade a cada meia-vida (tendencias.py).
+    """
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create(email='alta@teste.com', nome='Alta', senha='123')
+        self.produtos = [
+            Produto.objects.create(nome=f'Vela {i}', marca='Casa', preco=10,
+                                   descricao='Descrição com mais de vinte caracteres')
+            for i in range(3)
+        ]
+        self.agora = timezone.now()
+
+    def _eventos(self):
+        return list(EventoFavorito.objects.order_by('id').values_list('produto_id', 'tipo'))
+
+    def test_favorito_com_data_e_eventos(self):
+        primeiro, segundo, _ = self.produtos
+        self.client.force_authenticate(user=self.usuario)
+        self.client.put(reverse('produtos-favorito', args=[primeiro.id]))
+        self.client.put(reverse('produtos-favorito', args=[primeiro.id]))  # sem mudança, sem evento
+        self.usuario.favoritos.add(segundo)
+        self.client.delete(reverse('produtos-favorito', args=[primeiro.id]))
+
+        self.assertEqual(self._eventos(), [
+            (primeiro.id, EventoFavorito.FAVORITOU),
+            (segundo.id, EventoFavorito.FAVORITOU),
+            (primeiro.id, EventoFavorito.DESFAVORITOU),
+        ])
+        favorito = Favorito.objects.get(usuario=self.usuario, produto=segundo)
+        self.assertLess(abs((favorito.criado - timezone.now()).total_seconds()), 60)
+
+        # os eventos ficam mesmo com o usuário apagado
+        self.usuario.delete()
+        self.assertEqual(self._eventos()[-1], (segundo.id, EventoFavorito.DESFAVORITOU))
+        self.assertFalse(EventoFavorito.objects.exclude(usuario=None).exists())
+
+    def _evento(self, produto, horas_atras, tipo=EventoFavorito.FAVORITOU):
+        EventoFavorito.objects.create(usuario=self.usuario, produto=produto, tipo=tipo,
+                                      criado=self.agora - timedelta(hours=horas_atras))
+
+    def test_pontuacao_cai_com_o_tempo(self):
+        primeiro, segundo, terceiro = self.produtos
+        self._evento(primeiro, 24)      # uma meia-vida: vale 0,5
+        self._evento(primeiro, 48)      # duas: 0,25
+        self._evento(segundo, 0)
+        self._evento(terceiro, 0)
+        self._evento(terceiro, 0, EventoFavorito.DESFAVORITOU)
+
+        self.assertEqual(tendencias.processar_eventos(tamanho_lote=2, agora=self.agora), 5)
+        pontuacoes = {
+            t.produto_id: t.pontuacao * tendencias.fator_atual(tendencias.referencia_atual(), self.agora)
+            for t in TendenciaProduto.objects.all()
+        }
+        self.assertAlmostEqual(pontuacoes[primeiro.id], 0.75)
+        self.assertAlmostEqual(pontuacoes[segundo.id], 1.0)
+        self.assertAlmostEqual(pontuacoes[terceiro.id], 0.0)
+
+        # a próxima execução só lê os eventos novos
+        self._evento(primeiro, 0)
+        self.assertEqual(tendencias.processar_eventos(agora=self.agora), 1)
+
+        with mock.patch('produtos.tendencias.timezone.now', return_value=self.agora):
+            response = self.client.get(reverse('produtos-em-alta'))
+        ranking = [(p['id'], p['pontuacao']) for p in response.data['results']]
+        self.assertEqual(ranking, [(primeiro.id, 1.75), (segundo.id, 1.0)])
+
+    def test_rebase_mantem_a_pontuacao(self):
+        self._evento(self.produtos[0], 0)
+        tendencias.processar_eventos(agora=self.agora)
+        # 40 meias-vidas depois: a referência é trazida para a data atual
+        depois = self.agora + timedelta(hours=24 * 40)
+        tendencias.processar_eventos(agora=depois)
+        self.assertEqual(tendencias.referencia_atual(), depois)
+        self.assertAlmostEqual(TendenciaProduto.objects.get().pontuacao, 2 ** -40)
+
+    @override_settings(PRODUTOS_EVENTOS_MARGEM=300)
+    def test_eventos_recentes_esperam_o_horizonte(self):
+        primeiro, segundo, _ = self.produtos
+        self._evento(primeiro, 1)
+        # id maior que o de um evento ainda recente (ex.: commit fora de ordem)
+        self._evento(segundo, 0)
+        self._evento(primeiro, 1)
+        self.assertEqual(tendencias.processar_eventos(agora=self.agora), 1)
+
+        # passada a margem, nenhum evento ficou para trás
+        self.assertEqual(tendencias.processar_eventos(agora=self.agora + timedelta(minutes=5)), 2)
+        self.assertEqual(TendenciaProduto.objects.count(), 2)
+
+    def test_comando_e_reiniciar(self):
+        self._evento(self.produtos[0], 1)
+        saida = io.StringIO()
+        call_command('calcular_tendencias', stdout=saida)
+        self.assertIn('1 eventos novos', saida.getvalue())
+        call_command('calcular_tendencias', stdout=saida)
+        self.assertIn('0 eventos novos', saida.getvalue())
+
+        saida = io.StringIO()
+        call_command('calcular_tendencias', '--reiniciar', stdout=saida)
+        self.assertIn('1 eventos novos', saida.getvalue())
+        self.assertEqual(TendenciaProduto.objects.count(), 1)
+
+    def test_em_alta_sem_calculo(self):
+        response = self.client.get(reverse('produtos-em-alta'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+
+@unittest.skipUnless(relacionados.dependencias_instaladas(), 'numpy/scipy não instalados')
+@override_settings(PRODUTOS_EVENTOS_MARGEM=0)
+class ProdutoRelacionadosTeste(APITestCase):
+    """
+    "Quem favoritou este também favoritou": cálculo pela matriz de
+    favoritos (relacionados.py), atualização incremental e
+    GET /produtos/{id}/relacionados/.
+    """
+
+    def setUp(self):
+        self.a, self.b, self.c = [
+            Produto.objects.create(nome=f'Caneca {i}', marca='Casa', preco=10,
+                                   descricao='Descrição com mais de vinte caracteres')
+            for i in range(3)
+        ]
+        self.usuarios = [
+            Usuario.objects.create(email=f'rel{i}@teste.com', nome=f'Rel {i}', senha='123', cpf=f'0000000000{i}')
+            for i in range(3)
+        ]
+        primeiro, segundo, terceiro = self.usuarios
+        primeiro.favoritos.add(self.a, self.b)
+        segundo.favoritos.add(self.a, self.b, self.c)
+        terceiro.favoritos.add(self.c)
+
+    def _relacionados(self, produto):
+        response = self.client.get(reverse('produtos-relacionados', args=[produto.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(p['id'], p['pontuacao']) for p in response.data]
+
+    def test_cosseno_dos_favoritos(self):
+        self.assertEqual(relacionados.atualizar(completo=True), 3)
+        # a e b: os 2 usuários em comum -> 2 / sqrt(2 * 2)
+        self.assertEqual(self._relacionados(self.a), [(self.b.id, 1.0), (self.c.id, 0.5)])
+        # empate: menor id primeiro
+        self.assertEqual(self._relacionados(self.c), [(self.a.id, 0.5), (self.b.id, 0.5)])
+
+        relacionados.atualizar(completo=True, k=1)
+        self.assertEqual(self._relacionados(self.a), [(self.b.id, 1.0)])
+        self.assertEqual(ProdutoRelacionado.objects.count(), 3)
+
+    def test_incremental_so_recalcula_os_alterados(self):
+        relacionados.atualizar(completo=True)
+        self.assertEqual(relacionados.atualizar(), 0)
+
+        favoritar(self.usuarios[2], [self.b.id])
+        self.assertEqual(relacionados.atualizar(), 1)
+        # b: 3 favoritos, 2 em comum com a (2 favoritos) e com c (2)
+        self.assertEqual(self._relacionados(self.b), [(self.a.id, 0.8165), (self.c.id, 0.8165)])
+        # a lista de a fica como estava até o próximo cálculo completo
+        self.assertEqual(self._relacionados(self.a), [(self.b.id, 1.0), (self.c.id, 0.5)])
+        self.assertEqual(relacionados.atualizar(), 0)
+
+        relacionados.atualizar(completo=True)
+        self.assertEqual(self._relacionados(self.a), [(self.b.id, 0.8165), (self.c.id, 0.5)])
+
+    @override_settings(PRODUTOS_EVENTOS_MARGEM=300)
+    def test_incremental_espera_o_horizonte(self):
+        EventoFavorito.objects.update(criado=timezone.now() - timedelta(hours=1))
+        relacionados.atualizar(completo=True)
+        favoritar(self.usuarios[2], [self.b.id])
+        # evento recente: um id menor ainda poderia estar em transação aberta
+        self.assertEqual(relacionados.atualizar(), 0)
+
+        depois = timezone.now() + timedelta(minutes=5)
+        with mock.patch('produtos.tendencias.timezone.now', return_value=depois):
+            with CaptureQueriesContext(connection) as consultas:
+                self.assertEqual(relacionados.atualizar(), 1)
+        self.assertEqual(self._relacionados(self.b), [(self.a.id, 0.8165), (self.c.id, 0.8165)])
+        # as contagens vêm de Produto.total_favoritos, sem agrupar os favoritos
+        self.assertFalse([q for q in consultas.captured_queries if 'GROUP BY' in q['sql']])
+
+    def test_produto_inativo(self):
+        relacionados.atualizar(completo=True)
+        self.c.ativo = False
+        self.c.save()
+        self.assertEqual(self._relacionados(self.a), [(self.b.id, 1.0)])
+
+        for produto_id in (self.c.id, 999999):
+            response = self.client.get(reverse('produtos-relacionados', args=[produto_id]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # desativado, c sai do cálculo e perde a própria lista
+        desfavoritar(self.usuarios[2], [self.c.id])
+        relacionados.atualizar()
+        self.assertFalse(ProdutoRelacionado.objects.filter(produto=self.c).exists())
+
+    def test_comandos(self):
+        saida = io.StringIO()
+        call_command('calcular_relacionados', '--completo', stdout=saida)
+        self.assertIn('3 produtos recalculados', saida.getvalue())
+
+        with mock.patch('produtos.relacionados.np', None):
+            with self.assertRaisesMessage(CommandError, 'numpy e scipy'):
+                call_command('calcular_relacionados', stdout=io.StringIO())
+
+        saida = io.StringIO()
+        call_command('benchmark_relacionados', '--usuarios', '300', '--produtos', '200',
+                     '--alterados', '10', stdout=saida)
+        self.assertIn('Incremental confere com o completo', saida.getvalue())
+
+
+@unittest.skipUnless(relacionados.dependencias_instaladas(), 'numpy/scipy não instalados')
+@override_settings(PRODUTOS_EVENTOS_MARGEM=0)
+class ProdutoRelacionadosConteudoTeste(APITestCase):
+    """
+    Produtos parecidos pelo texto (TF-IDF de nome, marca e descrição,
+    conteudo.py) em GET /produtos/{id}/relacionados/?modo=conteudo.
+    """
+
+    def setUp(self):
+        self.caneca = self._produto('Caneca de Cerâmica Azul', 'Tramontina',
+                                    'Caneca de cerâmica esmaltada para café, 350ml')
+        self.caneca_vermelha = self._produto('Caneca Ceramica Vermelha', 'Oxford',
+                                             'Caneca de ceramica para chá e café, 350ml')
+        self.panela = self._produto('Panela de Pressão', 'Tramontina',
+                                    'Panela de pressão em alumínio com válvula de segurança')
+        self.frigideira = self._produto('Panela Antiaderente', 'Rochedo',
+                                        'Panela antiaderente em alumínio para o dia a dia')
+
+    def _produto(self, nome, marca, descricao):
+        return Produto.objects.create(nome=nome, marca=marca, preco=10, descricao=descricao)
+
+    def _parecidos(self, produto):
+        response = self.client.get(reverse('produtos-relacionados', args=[produto.id]), {'modo': 'conteudo'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pontuacoes = [p['pontuacao'] for p in response.data]
+        self.assertEqual(pontuacoes, sorted(pontuacoes, reverse=True))
+        return [p['id'] for p in response.data]
+
+    def test_termos(self):
+        self.assertEqual(conteudo.termos('Caneca de Cerâmica 350ml, p/ CAFÉ'), ['caneca', 'ceramica', '350ml', 'cafe'])
+
+    def test_vizinhos_pelo_texto(self):
+        self.assertEqual(conteudo.atualizar(completo=True), 4)
+        self.assertEqual(self._parecidos(self.caneca)[0], self.caneca_vermelha.id)
+        self.assertEqual(self._parecidos(self.panela)[0], self.frigideira.id)
+        # sem termo em comum, não entra
+        self.assertNotIn(self.panela.id, self._parecidos(self.caneca_vermelha))
+
+        # só termos de 2 ou mais produtos, sem stopwords
+        vocabulario = set(TermoConteudo.objects.values_list('termo', flat=True))
+        self.assertTrue({'caneca', 'ceramica', 'tramontina', 'aluminio'} <= vocabulario)
+        self.assertFalse({'esmaltada', 'de', 'para'} & vocabulario)
+
+        # o modo favoritos é outra lista
+        response = self.client.get(reverse('produtos-relacionados', args=[self.caneca.id]))
+        self.assertEqual(response.data, [])
+        response = self.client.get(reverse('produtos-relacionados', args=[self.caneca.id]), {'modo': 'outro'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_incremental_com_o_vocabulario_salvo(self):
+        conteudo.atualizar(completo=True)
+        vocabulario = list(TermoConteudo.objects.order_by('termo').values_list('termo', 'idf'))
+        self.assertEqual(conteudo.atualizar(), 0)
+
+        termica = self._produto('Caneca Térmica', 'Novidade', 'Caneca térmica com tampa para café, 350ml')
+        self.assertEqual(conteudo.atualizar(), 1)
+        self.assertIn(self._parecidos(termica)[0], {self.caneca.id, self.caneca_vermelha.id})
+        # vocabulário e listas dos outros ficam como estavam até o --completo
+        self.assertEqual(list(TermoConteudo.objects.order_by('termo').values_list('termo', 'idf')), vocabulario)
+        self.assertNotIn(termica.id, self._parecidos(self.caneca))
+
+        # editado: recalcula só ele
+        self.frigideira.descricao = 'Caneca de cerâmica para café, 350ml, da linha de panelas'
+        self.frigideira.save()
+        self.assertEqual(conteudo.atualizar(), 1)
+        self.assertEqual(self._parecidos(self.frigideira)[0], self.caneca_vermelha.id)
+
+        # desativado: perde a própria lista e some das dos outros
+        self.frigideira.ativo = False
+        self.frigideira.save()
+        self.assertEqual(conteudo.atualizar(), 0)
+        self.assertFalse(ProdutoRelacionado.objects.filter(produto=self.frigideira).exists())
+        self.assertNotIn(self.frigideira.id, self._parecidos(self.panela))
+
+        conteudo.atualizar(completo=True)
+        self.assertIn(termica.id, self._parecidos(self.caneca))
+
+    @override_settings(PRODUTOS_EVENTOS_MARGEM=300)
+    def test_incremental_usa_o_horizonte(self):
+        Produto.objects.update(atualizado=timezone.now() - timedelta(hours=1))
+        conteudo.atualizar(completo=True)
+        # salvo antes da execução acima terminar, mas com commit depois dela
+        atrasada = self._produto('Caneca Térmica', 'Novidade', 'Caneca térmica com tampa para café, 350ml')
+        Produto.objects.filter(id=atrasada.id).update(atualizado=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(conteudo.atualizar(), 1)
+        self.assertIn(self._parecidos(atrasada)[0], {self.caneca.id, self.caneca_vermelha.id})
+        # ainda dentro da margem: recalculado de novo, não perdido
+        self.assertEqual(conteudo.atualizar(), 1)
+
+    def test_comando(self):
+        saida = io.StringIO()
+        call_command('calcular_relacionados_conteudo', '--completo', stdout=saida)
+        self.assertIn('4 produtos recalculados', saida.getvalue())
+        self.assertTrue(ProdutoRelacionado.objects.filter(modo=ProdutoRelacionado.CONTEUDO).exists())
@@ -1,47 +1,226 @@
-from rest_framework import viewsets, status
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, F, Max
+from rest_framework import serializers, viewsets, status
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
-from .models import Produto, Categoria
-from .serializers import ProdutoSerializer, CategoriaSerializer
+from .models import Produto, Categoria, ProdutoRelacionado
+from .serializers import (
+    ProdutoSerializer, CategoriaSerializer, FavoritosLoteSerializer, ProdutoRankingSerializer,
+    ProdutoTendenciaSerializer, ProdutoRelacionadoSerializer,
+)
+from .busca import buscar, buscar_no_nome
+from .normalizacao import normalizar
+from .paginacao import ProdutoCursorPagination, ProdutoPageNumberPagination
+from .cache import CacheCatalogoMixin, cache_catalogo, chave_resposta, parametros_normalizados
+from .facetas import calcular_facetas, faixas_preco
+from .condicional import RespostaCondicionalMixin
+from .favoritos import desfavoritar, favoritar
+from .imagens import atualizar_variantes
+from .importacao import FORMATOS, ImportadorProdutos, formato_do_arquivo, ler_linhas
+from . import exportacao
+from .leitura_rapida import LeituraRapidaMixin
+from .lote import atualizar_produtos, desativar_produtos
+from . import tendencias
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from docelar.campos import CamposDinamicosViewMixin
+from usuarios.models import Favorito
 
 # para alterar as permissoes, usar o permissions.py
 # from .permissions import IsAdminOrReadOnly
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(RespostaCondicionalMixin, CacheCatalogoMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
     serializer_class = CategoriaSerializer
     queryset = Categoria.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly]
 
-class ProdutoViewSet(viewsets.ModelViewSet):
+class ProdutoViewSet(RespostaCondicionalMixin, CacheCatalogoMixin, CamposDinamicosViewMixin,
+                     LeituraRapidaMixin, viewsets.ModelViewSet):
     serializer_class = ProdutoSerializer
+    # ?fields=, ?omit= e ?expand=categoria (ver docelar/campos.py)
+    acoes_campos_dinamicos = ('list', 'retrieve', 'meus_favoritos')
     # Qualquer um lê (GET), só logado altera (POST, PUT, DELETE)
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    # ETag/Last-Modified: a categoria entra porque aparece em categoria_nome
+    campos_atualizacao = ('atualizado', 'categoria__atualizado')
+
     # caso for só admin/staff
     # permission_classes = [IsAdminOrReadOnly]
 
+    # Ordenações aceitas em ?ordering=. Cada uma tem um índice parcial em
+    # Produto.Meta.indexes, e o id no fim desempata para a paginação por cursor
+    ordenacoes = {
+        'nome': ('nome', 'id'),
+        'preco': ('preco', 'id'),
+        '-preco': ('-preco', '-id'),
+        'criado': ('criado', 'id'),
+        '-criado': ('-criado', '-id'),
+    }
+
+    # Filtros da listagem que também escolhem os produtos em /produtos/lote/
+    filtros_lote = ('marca', 'nome', 'categoria', 'categoria_nome', 'preco_min', 'preco_max', 'q')
+
+    def ordenacao_pedida(self):
+        """
+        Valor de ?ordering= (validado contra a lista permitida) ou None.
+        """
+        ordering = self.request.query_params.get('ordering')
+        if not ordering:
+            return None
+        if ordering not in self.ordenacoes:
+            raise ValidationError({
+                'ordering': f'Use um destes valores: {", ".join(self.ordenacoes)}.'
+            })
+        return ordering
+
+    @property
+    def ordenacao_cursor(self):
+        """
+        Ordenação usada pela paginação por cursor.
+        """
+        return self.ordenacoes[self.ordenacao_pedida() or 'nome']
+
+    def campos_sempre_lidos(self):
+        # o cursor da próxima página é montado com os campos da ordenação
+        return [campo.lstrip('-') for campo in self.ordenacao_cursor]
+
+    def parametro_decimal(self, nome):
+        valor = self.request.query_params.get(nome)
+        if not valor:
+            return None
+        try:
+            numero = Decimal(valor)
+        except InvalidOperation:
+            raise ValidationError({nome: 'Informe um número válido.'})
+        # Decimal aceita NaN e Infinity
+        if not numero.is_finite():
+            raise ValidationError({nome: 'Informe um número válido.'})
+        return numero
+
+    @property
+    def pagination_class(self):
+        """
+        Escolhe o modo de paginação pela query string:
+        - ?paginacao=cursor (ou ?cursor=...): cursor/keyset, para rolagem
+          infinita (não combina com ?q=, que ordena por relevância)
+        - padrão: número de página (?page=), com total de itens
+
+        Nos dois modos o cliente pode pedir ?page_size= (máximo 100).
+        """
+        request = getattr(self, 'request', None)
+        if request is not None:
+            params = request.query_params
+            if params.get('paginacao') == 'cursor' or 'cursor' in params:
+                return ProdutoCursorPagination
+        return ProdutoPageNumberPagination
+
     def get_queryset(self):
         # Implementando o Soft Delete (Extra): Só traz os ativos
         # 10 pontos - soft delete
-        queryset = Produto.objects.filter(ativo=True)
+        queryset = Produto.objects.ativos().para_listagem()
         
         # Implementando Filtros/Lookups (Requisito de Produtos)
         marca = self.request.query_params.get('marca')
         nome = self.request.query_params.get('nome')
         categoria = self.request.query_params.get('categoria')
         categoria_nome = self.request.query_params.get('categoria_nome')
+        preco_min = self.parametro_decimal('preco_min')
+        preco_max = self.parametro_decimal('preco_max')
+        # Busca textual em nome, marca e descrição, ordenada por relevância
+        q = self.request.query_params.get('q')
+        ordering = self.ordenacao_pedida()
+        # Os filtros de texto não diferenciam acentos e maiúsculas, então
+        # ?nome=eletronico encontra "Eletrônico"
         if marca:
-            queryset = queryset.filter(marca__iexact=marca)
+            queryset = queryset.filter(marca_normalizada=normalizar(marca))
         if nome:
-            queryset = queryset.filter(nome__icontains=nome)
+            # prefixo de palavra, pelo índice de busca (ver busca.py)
+            queryset = buscar_no_nome(queryset, nome)
         if categoria:
             queryset = queryset.filter(categoria__id=categoria)
         if categoria_nome:
-            queryset = queryset.filter(categoria__nome__icontains=categoria_nome)
-            
+            # as categorias são poucas: acha os ids primeiro e os produtos
+            # saem pelo índice (categoria, nome, id), sem JOIN com LIKE
+            categorias = Categoria.objects.filter(
+                nome_normalizado__contains=normalizar(categoria_nome)).values('id')
+            queryset = queryset.filter(categoria_id__in=categorias)
+        if preco_min is not None:
+            queryset = queryset.filter(preco__gte=preco_min)
+        if preco_max is not None:
+            queryset = queryset.filter(preco__lte=preco_max)
+        if q:
+            # o cursor guarda a posição na ordem da listagem, não na da
+            # relevância: a busca sairia em outra ordem que a por página
+            if getattr(self, 'action', None) == 'list' and self.pagination_class is ProdutoCursorPagination:
+                raise ValidationError({'q': 'A busca (?q=) não usa paginacao=cursor; use ?page=.'})
+            queryset = buscar(queryset, q)
+        # ?ordering= tem prioridade sobre a relevância da busca
+        if ordering:
+            queryset = queryset.order_by(*self.ordenacoes[ordering])
+
         return queryset
 
+    def versao_do_usuario(self, request):
+        """
+        Os favoritos do usuário mudam o is_favorito, então entram na ETag.
+        Quantos são e a data do último bastam (favoritar sempre grava uma
+        data nova, desfavoritar muda o total), numa consulta só pelo índice
+        (usuario, criado), sem ler todos os IDs.
+        """
+        user = request.user
+        if not (user and user.is_authenticated) or not self.campo_na_resposta('is_favorito'):
+            return ''
+        favoritos = Favorito.objects.filter(usuario=user).aggregate(total=Count('id'), ultimo=Max('criado'))
+        ultimo = favoritos['ultimo'].isoformat() if favoritos['ultimo'] else ''
+        return f"{user.pk}:{favoritos['total']}:{ultimo}"
+
+    def get_serializer(self, *args, **kwargs):
+        """
+        Quando o serializer recebe produtos já carregados (lista, página ou
+        um único produto), busca de uma vez só quais deles são favoritos do
+        usuário logado. Assim o is_favorito não faz uma consulta por produto.
+        """
+        instancia = args[0] if args else kwargs.get('instance')
+        # com ?fields=/?omit= sem is_favorito, nem consulta os favoritos
+        if instancia is not None and self.campo_na_resposta('is_favorito'):
+            contexto = kwargs.setdefault('context', self.get_serializer_context())
+            contexto['favoritos_ids'] = self.favoritos_ids(instancia)
+        return super().get_serializer(*args, **kwargs)
+
+    def favoritos_ids(self, produtos):
+        """
+        Retorna o conjunto de IDs, entre os produtos informados, que estão
+        nos favoritos do usuário logado (uma única consulta).
+        """
+        user = self.request.user
+        if not (user and user.is_authenticated):
+            return set()
+        if isinstance(produtos, Produto):
+            produtos = [produtos]
+        # a leitura rápida passa linhas do values() (dicts)
+        ids = [produto['id'] if isinstance(produto, dict) else produto.id for produto in produtos]
+        if not ids:
+            return set()
+        return set(user.favoritos.filter(id__in=ids).values_list('id', flat=True))
+
+    def perform_create(self, serializer):
+        produto = serializer.save()
+        if produto.imagem:
+            atualizar_variantes(produto)
+
+    def perform_update(self, serializer):
+        """
+        Ao trocar (ou remover) a imagem, gera as variantes da nova e apaga
+        as da anterior.
+        """
+        produto = serializer.save()
+        if 'imagem' in serializer.validated_data:
+            atualizar_variantes(produto)
+
     #extra, soft delete, 10 pontos
     def perform_destroy(self, instance):
         """
@@ -57,22 +236,327 @@ class ProdutoViewSet(viewsets.ModelViewSet):
         """
         Adiciona ou remove o produto dos favoritos (Toggle).
         Se já curtiu, descurte. Se não curtiu, curte.
+
+        Para não inverter o estado em cliques repetidos, prefira
+        PUT/DELETE /produtos/{id}/favorito/.
         """
-        produto = self.get_object() # Pega o produto pelo ID da URL
+        id_produto = self.id_da_url(pk)
         user = request.user         # Pega o usuário logado pelo Token
 
-        if user.favoritos.filter(id=produto.id).exists():
-            user.favoritos.remove(produto)
+        # produto inativo dá 404 mesmo se já era favorito (como o
+        # get_object), sem inverter nada
+        if not Produto.objects.ativos().filter(id=id_produto).exists():
+            raise NotFound('Produto não encontrado.')
+        # tenta remover; se não estava nos favoritos, adiciona
+        if desfavoritar(user, [id_produto]):
             return Response({
                 'mensagem': 'Produto removido dos favoritos.', 
                 'favoritado': False}, 
                 status=status.HTTP_200_OK)
+        if not favoritar(user, [id_produto]):
+            raise NotFound('Produto não encontrado.')
+        return Response({
+            'mensagem': 'Produto adicionado aos favoritos!', 
+            'favoritado': True}, 
+            status=status.HTTP_200_OK)
+
+    # Rota: PUT/DELETE /produtos/{id}/favorito/
+    @action(detail=True, methods=['put', 'delete'], permission_classes=[IsAuthenticated])
+    def favorito(self, request, pk=None):
+        """
+        PUT coloca e DELETE tira o produto dos favoritos, com um INSERT ou
+        DELETE só (ver favoritos.py). Repetir a requisição dá o mesmo resultado.
+        """
+        id_produto = self.id_da_url(pk)
+        if request.method == 'PUT':
+            alterado = favoritar(request.user, [id_produto])
+            # nada inserido: já era favorito ou o produto não existe/está inativo
+            if not alterado and not request.user.favoritos.filter(id=id_produto, ativo=True).exists():
+                raise NotFound('Produto não encontrado.')
         else:
-            user.favoritos.add(produto)
-            return Response({
-                'mensagem': 'Produto adicionado aos favoritos!', 
-                'favoritado': True}, 
-                status=status.HTTP_200_OK)
+            alterado = desfavoritar(request.user, [id_produto])
+            # pode desfavoritar produto inativo, mas não um que não existe
+            if not alterado and not Produto.objects.filter(id=id_produto).exists():
+                raise NotFound('Produto não encontrado.')
+        return Response({
+            'id': id_produto,
+            'favoritado': request.method == 'PUT',
+            'alterado': bool(alterado),
+        })
+
+    # Rota: PUT/DELETE /produtos/favoritos/
+    @action(detail=False, methods=['put', 'delete'], permission_classes=[IsAuthenticated],
+            url_path='favoritos')
+    def favoritos_lote(self, request):
+        """
+        Coloca (PUT) ou tira (DELETE) vários produtos dos favoritos com um
+        INSERT ou DELETE só: {"ids": [1, 2, 3]}. IDs de produtos inexistentes ou
+        inativos são ignorados no PUT; 'alterados' são os que mudaram.
+        """
+        serializer = FavoritosLoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        operacao = favoritar if request.method == 'PUT' else desfavoritar
+        alterados = operacao(request.user, ids)
+        return Response({
+            'total': len(ids),
+            'alterados': len(alterados),
+            'ids': sorted(alterados),
+        })
+
+    def id_da_url(self, pk):
+        try:
+            return serializers.IntegerField(min_value=1).run_validation(pk)
+        except ValidationError:
+            raise NotFound('Produto não encontrado.')
+
+    # Rota: GET /produtos/mais-favoritados/
+    @action(detail=False, methods=['get'], url_path='mais-favoritados',
+            serializer_class=ProdutoRankingSerializer)
+    def mais_favoritados(self, request):
+        """
+        Produtos com mais favoritos, do maior para o menor (aceita os filtros
+        da listagem). Ordena pelo contador Produto.total_favoritos, com índice,
+        sem contar a tabela de favoritos.
+        """
+        ranking = (
+            self.get_queryset().filter(total_favoritos__gt=0)
+            .order_by('-total_favoritos', 'id')
+        )
+        # a paginação por cursor segue a ordenação da listagem; aqui é por página
+        paginador = ProdutoPageNumberPagination()
+        page = paginador.paginate_queryset(ranking, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginador.get_paginated_response(serializer.data)
+
+    # Rota: GET /produtos/em-alta/
+    @action(detail=False, methods=['get'], url_path='em-alta',
+            serializer_class=ProdutoTendenciaSerializer)
+    def em_alta(self, request):
+        """
+        Produtos mais favoritados recentemente: cada favorito conta menos
+        com o passar do tempo (ver tendencias.py). Lê as pontuações já
+        calculadas pelo comando calcular_tendencias (aceita os filtros da
+        listagem).
+        """
+        paginador = ProdutoPageNumberPagination()
+        referencia = tendencias.referencia_atual()
+        if referencia is None:
+            page = paginador.paginate_queryset(Produto.objects.none(), request, view=self)
+            return paginador.get_paginated_response([])
+
+        fator = tendencias.fator_atual(referencia)
+        # pontuações que já caíram abaixo de 0,01 não aparecem
+        em_alta = (
+            self.get_queryset().filter(tendencia__pontuacao__gt=0.01 / fator)
+            .annotate(pontuacao_tendencia=F('tendencia__pontuacao'))
+            .order_by('-tendencia__pontuacao', 'id')
+        )
+        page = paginador.paginate_queryset(em_alta, request, view=self)
+        contexto = {**self.get_serializer_context(), 'fator_tendencia': fator}
+        serializer = self.get_serializer(page, many=True, context=contexto)
+        return paginador.get_paginated_response(serializer.data)
+
+    # ?modo= de GET /produtos/{id}/relacionados/
+    modos_relacionados = {
+        'favoritos': ProdutoRelacionado.FAVORITOS,
+        'conteudo': ProdutoRelacionado.CONTEUDO,
+    }
+
+    # Rota: GET /produtos/{id}/relacionados/
+    @action(detail=True, methods=['get'], serializer_class=ProdutoRelacionadoSerializer)
+    def relacionados(self, request, pk=None):
+        """
+        Produtos parecidos com este, já calculados pelos comandos (inativos
+        ficam de fora):
+        - ?modo=favoritos (padrão): quem favoritou este também favoritou
+          (calcular_relacionados, ver relacionados.py)
+        - ?modo=conteudo: pelo texto de nome, marca e descrição
+          (calcular_relacionados_conteudo, ver conteudo.py)
+        """
+        modo = self.modos_relacionados.get(request.query_params.get('modo', 'favoritos'))
+        if modo is None:
+            raise ValidationError({'modo': f'Use: {", ".join(self.modos_relacionados)}.'})
+        id_produto = self.id_da_url(pk)
+        if not Produto.objects.ativos().filter(id=id_produto).exists():
+            raise NotFound('Produto não encontrado.')
+        # as duas condições no mesmo filter(): um JOIN só, usado também
+        # no annotate e no order_by
+        relacionados = (
+            Produto.objects.ativos().para_listagem()
+            .filter(relacionado_em__produto_id=id_produto, relacionado_em__modo=modo)
+            .annotate(pontuacao_relacionado=F('relacionado_em__pontuacao'))
+            .order_by('relacionado_em__posicao')
+        )
+        serializer = self.get_serializer(list(relacionados), many=True)
+        return Response(serializer.data)
+
+    # Rota: GET /produtos/facetas/
+    @action(detail=False, methods=['get'])
+    def facetas(self, request):
+        """
+        Contagens por marca, categoria e faixa de preço dos produtos que
+        atendem aos mesmos filtros da listagem (?marca=, ?categoria=, ?q=...).
+        As faixas de preço podem ser escolhidas com ?faixas=0,100,500.
+
+        O resultado fica no cache sob a versão do catálogo.
+        """
+        limites = faixas_preco(request.query_params.get('faixas'))
+        chave = chave_resposta('facetas', parametros_normalizados(request.query_params))
+
+        cache = cache_catalogo()
+        dados = cache.get(chave)
+        if dados is None:
+            dados = calcular_facetas(self.filter_queryset(self.get_queryset()), limites)
+            cache.set(chave, dados)
+        return Response(dados)
+
+    # Rota: POST /produtos/importar/ (multipart, campo "arquivo")
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def importar(self, request):
+        """
+        Importa produtos de um arquivo CSV ou JSON Lines enviado no campo
+        'arquivo'. O formato vem de ?formato= ou da extensão do arquivo.
+
+        Linhas inválidas não interrompem a importação: voltam em 'erros'
+        com o número da linha.
+        """
+        arquivo = request.FILES.get('arquivo')
+        if arquivo is None:
+            raise ValidationError({'arquivo': 'Envie o arquivo no campo "arquivo".'})
+
+        formato = request.query_params.get('formato') or formato_do_arquivo(arquivo.name)
+        if formato not in FORMATOS:
+            raise ValidationError({'formato': f'Use um destes valores: {", ".join(FORMATOS)}.'})
+
+        # lê o upload aos poucos, sem carregar tudo na memória
+        texto = io.TextIOWrapper(arquivo.file, encoding='utf-8-sig', newline='')
+        try:
+            resultado = ImportadorProdutos().importar(ler_linhas(texto, formato))
+        except UnicodeDecodeError:
+            raise ValidationError({'arquivo': 'O arquivo precisa estar em UTF-8.'})
+        finally:
+            texto.detach()
+
+        return Response(resultado, status=status.HTTP_200_OK)
+
+    # Rota: GET /produtos/exportar/?formato=ndjson|csv
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """
+        Exporta todos os produtos que atendem aos filtros da listagem, em
+        NDJSON (padrão) ou CSV, sem paginação. A resposta é enviada aos
+        poucos (streaming) e vai compactada com gzip se o cliente aceitar.
+
+        ?desde= exporta só o que foi alterado a partir dessa data.
+        """
+        formato = request.query_params.get('formato', 'ndjson')
+        if formato not in exportacao.FORMATOS:
+            raise ValidationError({'formato': f'Use um destes valores: {", ".join(exportacao.FORMATOS)}.'})
+
+        queryset = self.filter_queryset(self.get_queryset())
+        desde = exportacao.data_desde(request.query_params.get('desde'))
+        if desde is not None:
+            queryset = queryset.filter(atualizado__gte=desde)
+
+        aceita_gzip = re.search(r'\bgzip\b', request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        return exportacao.resposta_exportacao(queryset, formato, gzip=bool(aceita_gzip))
+
+    # Rota: PATCH/DELETE /produtos/lote/
+    @action(detail=False, methods=['patch', 'delete'], permission_classes=[IsAuthenticated])
+    def lote(self, request):
+        """
+        Altera (PATCH) ou desativa (DELETE, soft delete) vários produtos
+        com poucos UPDATEs. Os produtos são escolhidos por:
+        - {"ids": [1, 2], "alteracoes": {"preco": "9.90"}}
+        - {"itens": [{"id": 1, "preco": "9.90"}, {"id": 2, "marca": "Sony"}]}
+        - filtros da listagem na query string (?marca=, ?preco_max=...)
+          com {"alteracoes": {...}}
+        No DELETE basta "ids" ou os filtros.
+
+        Só produtos ativos são alterados, como no PATCH/DELETE de um
+        produto. A resposta traz o resultado de cada ID.
+        """
+        dados = request.data
+        erros = {}
+        if request.method == 'DELETE':
+            resultados = desativar_produtos(self.get_queryset(), self.ids_do_lote(dados))
+        elif 'itens' in dados:
+            alteracoes_por_id = {}
+            for item in self.itens_do_lote(dados['itens']):
+                try:
+                    alteracoes_por_id[item['id']] = self.validar_alteracoes(item['alteracoes'])
+                except ValidationError as erro:
+                    erros[item['id']] = erro.detail
+            resultados = atualizar_produtos(self.get_queryset(), alteracoes_por_id)
+        else:
+            alteracoes = self.validar_alteracoes(dados.get('alteracoes'))
+            ids = self.ids_do_lote(dados)
+            resultados = atualizar_produtos(self.get_queryset(), dict.fromkeys(ids, alteracoes))
+
+        resultados.update(dict.fromkeys(erros, 'invalido'))
+        lista = []
+        for id_produto, resultado in resultados.items():
+            item = {'id': id_produto, 'resultado': resultado}
+            if id_produto in erros:
+                item['erros'] = erros[id_produto]
+            lista.append(item)
+        return Response({
+            'total': len(lista),
+            'alterados': sum(r in ('atualizado', 'desativado') for r in resultados.values()),
+            'resultados': lista,
+        })
+
+    def ids_do_lote(self, dados):
+        """
+        IDs do corpo ("ids") ou, se não vierem, os produtos que atendem aos
+        filtros da query string. Sem nenhum dos dois é erro, para não
+        alterar o catálogo inteiro por engano.
+        """
+        if 'ids' in dados:
+            campo = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+            try:
+                ids = campo.run_validation(dados['ids'])
+            except ValidationError as erro:
+                raise ValidationError({'ids': erro.detail})
+            return list(dict.fromkeys(ids))
+        if any(self.request.query_params.get(filtro) for filtro in self.filtros_lote):
+            return list(self.get_queryset().order_by('id').values_list('id', flat=True))
+        raise ValidationError({'ids': 'Informe "ids" ou filtros na query string '
+                                      f'({", ".join(self.filtros_lote)}).'})
+
+    def itens_do_lote(self, itens):
+        """
+        Valida o formato de "itens" e separa o id das alterações.
+        """
+        if not isinstance(itens, list) or not itens:
+            raise ValidationError({'itens': 'Informe uma lista de objetos com "id".'})
+        vistos = {}
+        for item in itens:
+            if not isinstance(item, dict):
+                raise ValidationError({'itens': 'Informe uma lista de objetos com "id".'})
+            try:
+                id_produto = serializers.IntegerField(min_value=1).run_validation(item.get('id'))
+            except ValidationError:
+                raise ValidationError({'itens': 'Todo item precisa de um "id" válido.'})
+            alteracoes = {campo: valor for campo, valor in item.items() if campo != 'id'}
+            vistos[id_produto] = {'id': id_produto, 'alteracoes': alteracoes}
+        return vistos.values()
+
+    def validar_alteracoes(self, alteracoes):
+        """
+        Valida as alterações com as regras do ProdutoSerializer (como num
+        PATCH) e retorna os valores prontos para o update().
+        """
+        if not isinstance(alteracoes, dict) or not alteracoes:
+            raise ValidationError({'alteracoes': 'Informe os campos a alterar.'})
+        serializer = self.get_serializer(data=alteracoes, partial=True)
+        editaveis = {nome for nome, campo in serializer.fields.items() if not campo.read_only}
+        desconhecidos = sorted(set(alteracoes) - editaveis)
+        if desconhecidos:
+            raise ValidationError({campo: 'Campo não pode ser alterado em lote.' for campo in desconhecidos})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
 
     # Rota: GET /api/produtos/meus_favoritos/
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated], url_path='meus-favoritos')
@@ -81,7 +565,8 @@ class ProdutoViewSet(viewsets.ModelViewSet):
         Lista apenas os produtos favoritados pelo usuário logado.
         """
         user = request.user
-        favoritos = user.favoritos.filter(ativo=True) # Só mostra favoritos que ainda estão ativos no sistema
+        favoritos = user.favoritos.ativos().para_listagem() # Só mostra favoritos que ainda estão ativos no sistema
+        favoritos = self.aplicar_campos(favoritos.order_by(*self.ordenacao_cursor))
         
         # Paginação padrão do ViewSet
         page = self.paginate_queryset(favoritos)
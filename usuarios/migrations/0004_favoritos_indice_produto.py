@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Índice (produto_id, usuario_id) na tabela de favoritos para a busca
+    reversa "quem favoritou este produto", coberta só pelo índice.
+    A tabela é criada automaticamente pelo ManyToManyField, por isso o
+    índice é criado em SQL.
+    """
+
+    dependencies = [
+        ('usuarios', '0003_usuario_last_login'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX usuarios_favoritos_produto_usuario_idx '
+            'ON usuarios_favoritos (produto_id, usuario_id)',
+            'DROP INDEX usuarios_favoritos_produto_usuario_idx',
+        ),
+    ]
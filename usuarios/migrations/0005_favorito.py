@@ -0,0 +1,65 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Troca a tabela automática do M2M Usuario.favoritos pelo model Favorito,
+    sobre a mesma tabela (usuarios_favoritos), sem copiar os dados.
+
+    1. Só no estado das migrations: cria Favorito com os campos que a
+       tabela já tem e liga o M2M a ele.
+    2. No banco: o índice criado em SQL na 0004 passa a ser do model (com
+       um nome de até 30 caracteres), e entram a coluna criado e o índice
+       (usuario, -criado). Favoritos antigos ficam com a data da migration.
+    """
+
+    dependencies = [
+        ('produtos', '0009_total_favoritos'),
+        ('usuarios', '0004_favoritos_indice_produto'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Favorito',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='usuarios.usuario')),
+                        ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='produtos.produto')),
+                    ],
+                    options={
+                        'db_table': 'usuarios_favoritos',
+                        'unique_together': {('usuario', 'produto')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='usuario',
+                    name='favoritos',
+                    field=models.ManyToManyField(blank=True, related_name='favoritados', through='usuarios.Favorito', to='produtos.produto', verbose_name='Meus Favoritos'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX usuarios_favoritos_produto_usuario_idx',
+                    'CREATE INDEX usuarios_favoritos_produto_usuario_idx '
+                    'ON usuarios_favoritos (produto_id, usuario_id)',
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='favorito',
+            index=models.Index(fields=['produto', 'usuario'], name='usuarios_fav_prod_usu_idx'),
+        ),
+        migrations.AddField(
+            model_name='favorito',
+            name='criado',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Favoritado em'),
+        ),
+        migrations.AddIndex(
+            model_name='favorito',
+            index=models.Index(fields=['usuario', '-criado'], name='usuarios_fav_usu_criado_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.hashers import make_password, check_password
+from django.utils import timezone
 # Create your models here.
 
 class Usuario(models.Model):
@@ -37,6 +38,7 @@ class Usuario(models.Model):
     # 20 pontos - favoritos
     favoritos = models.ManyToManyField('produtos.Produto',
                                         blank=True,
+                                        through='Favorito',
                                         related_name='favoritados',
                                         verbose_name='Meus Favoritos')
     
@@ -133,6 +135,24 @@ class Usuario(models.Model):
         return False
 
 
+class Favorito(models.Model):
+    """
+    Tabela do M2M Usuario.favoritos, com a data em que o produto foi
+    favoritado (a mesma tabela de antes: usuarios_favoritos).
+    """
+    usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
+    produto = models.ForeignKey('produtos.Produto', on_delete=models.CASCADE)
+    criado = models.DateTimeField(default=timezone.now, verbose_name='Favoritado em')
 
+    class Meta:
+        db_table = 'usuarios_favoritos'
+        unique_together = [('usuario', 'produto')]
+        indexes = [
+            # "quem favoritou este produto", coberta só pelo índice
+            models.Index(fields=['produto', 'usuario'], name='usuarios_fav_prod_usu_idx'),
+            # favoritos do usuário, do mais recente para o mais antigo
+            models.Index(fields=['usuario', '-criado'], name='usuarios_fav_usu_criado_idx'),
+        ]
 
-
+    def __str__(self):
+        return f'{self.usuario_id} -> {self.produto_id}'
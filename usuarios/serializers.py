@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from docelar.campos import CamposDinamicosSerializerMixin
 from .models import Usuario
 
 # 10 pontos - reset de senha (ou 15 pontos com email)
@@ -159,7 +160,7 @@ class LoginSerializer(serializers.Serializer):
 # SERIALIZER DE USUÁRIO (para respostas)
 # ============================================
 
-class UsuarioSerializer(serializers.ModelSerializer):
+class UsuarioSerializer(CamposDinamicosSerializerMixin, serializers.ModelSerializer):
     """
     Serializer para retornar dados do usuário
     (SEM senha!)
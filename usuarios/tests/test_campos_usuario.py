@@ -0,0 +1,25 @@
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from usuarios.models import Usuario
+
+
+class UsuarioCamposDinamicosTeste(APITestCase):
+    """
+    ?fields= e ?omit= na listagem de usuários.
+    """
+
+    def test_listagem_com_fields(self):
+        Usuario.objects.create(nome='Fulano', email='fulano@teste.com', cpf='12345678901', senha='Senha@123')
+        url = reverse('usuarios-list')
+
+        response = self.client.get(url, {'fields': 'id,nome'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'nome'})
+
+        response = self.client.get(url, {'omit': 'email'})
+        self.assertNotIn('email', response.data['results'][0])
+
+        response = self.client.get(url, {'fields': 'senha'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
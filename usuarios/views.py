@@ -13,13 +13,16 @@ from django.contrib.auth.tokens import default_token_generator
 from django.conf import settings
 from .serializers import SolicitarResetSenhaSerializer, ConfirmarResetSenhaSerializer
 
+from docelar.campos import CamposDinamicosViewMixin
 from .models import Usuario
 from .serializers import UsuarioSerializer, CadastroSerializer, LoginSerializer
 
 
-class UsuarioViewSet(viewsets.ModelViewSet):
+class UsuarioViewSet(CamposDinamicosViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para usuários com cadastro e login
+
+    list e retrieve aceitam ?fields= e ?omit= (ver docelar/campos.py)
     """
 
     queryset = Usuario.objects.all()